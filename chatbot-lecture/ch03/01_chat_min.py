@@ -1,8 +1,12 @@
 # 01_chat_min.py
-import os
+import os, sys, pathlib
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.chat_memory import ConversationMemory
 
 # ── 환경 변수(.env) 로드 & OpenAI 클라이언트 준비 ─────────────────────────────
 load_dotenv(find_dotenv())  # 앱 시작 시 1회만 호출
@@ -17,7 +21,8 @@ if not OPENAI_API_KEY  or not OPENAI_API_KEY.startswith("sk-"):
     st.error("환경변수 OPENAI_API_KEY가 없습니다. .env 파일을 확인하세요.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
+MODEL = "gpt-4.1-nano"      # 예: 가성비 모델(환경에 맞게 변경 가능)
 
 st.write("키 로드됨:", bool(OPENAI_API_KEY), "길이:", len(OPENAI_API_KEY or ""))
 st.write("첫 3글자:", (OPENAI_API_KEY[:3] + "***") if OPENAI_API_KEY else "없음")
@@ -27,6 +32,9 @@ if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "system", "content": "You are a helpful assistant."}
     ]
+if "memory" not in st.session_state:
+    # 모델에 보내는 대화: 최근 몇 턴 원문 + 그 이전은 백그라운드 요약 (화면 표시는 messages 그대로)
+    st.session_state.memory = ConversationMemory(client, MODEL, system="You are a helpful assistant.")
 
 # ── 기존 대화 렌더 ─────────────────────────────────────────────────────────────
 for m in st.session_state.messages:
@@ -42,17 +50,16 @@ if prompt := st.chat_input("메시지를 입력하세요"):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # OpenAI 호출 (Responses API, 단문 입력)
-    user_text = "\n".join(
-        m["content"] for m in st.session_state.messages if m["role"] == "user"
-    )
+    # OpenAI 호출 (Responses API) — 전체 기록 대신 메모리(요약 + 최근 대화, 모델별 토큰 예산 이내)
+    memory = st.session_state.memory
+    memory.add("user", prompt)
 
     with st.chat_message("assistant"):
         thinking = st.status("생각 중...")
         try:
             resp = client.responses.create(
-                model="gpt-4.1-nano",    # 예: 가성비 모델(환경에 맞게 변경 가능)
-                input=user_text,
+                model=MODEL,
+                input=memory.messages(),
                 temperature=0.3,
             )
             # SDK 버전에 따라 안전하게 텍스트 추출
@@ -62,6 +69,9 @@ if prompt := st.chat_input("메시지를 입력하세요"):
             st.session_state.messages.append(
                 {"role": "assistant", "content": answer}
             )
+            memory.add("assistant", answer)
+            ms = memory.stats()
+            st.caption(f"프롬프트 {memory.prompt_tokens()} 토큰 · 최근 메시지 {ms['recent']}개 · 요약 {ms['compactions']}회")
         except Exception as e:
             thinking.update(label="오류 발생", state="error")
             st.error(f"OpenAI 호출 중 오류: {e}")
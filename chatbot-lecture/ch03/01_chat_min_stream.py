@@ -1,8 +1,12 @@
 # 01_chat_min_stream.py
-import os
+import os, sys, pathlib
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
 
 # ── .env 로드 & 클라이언트 준비 ───────────────────────────────────────────────
 load_dotenv()
@@ -15,7 +19,7 @@ if not OPENAI_API_KEY:
     st.error("환경변수 OPENAI_API_KEY가 없습니다. .env 파일을 확인하세요.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
 
 # ── 대화 상태 ─────────────────────────────────────────────────────────────────
 if "messages" not in st.session_state:
@@ -37,7 +41,7 @@ if prompt := st.chat_input("메시지를 입력하세요"):
 
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        collected_chunks = []
+        renderer = StreamRenderer(placeholder)   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
 
         try:
             # Responses API 스트리밍
@@ -46,15 +50,13 @@ if prompt := st.chat_input("메시지를 입력하세요"):
                 input=prompt,
                 temperature=0.3,
             ) as stream:
-                for event in stream:
-                    # 부분 토큰 델타 수신
-                    if event.type == "response.output_text.delta":
-                        collected_chunks.append(event.delta)
-                        placeholder.markdown("".join(collected_chunks))
+                # 부분 토큰 델타 수신 (버퍼에 모았다가 시간/크기 기준으로 화면 갱신)
+                renderer.consume(stream)
                 # 모든 이벤트 처리 완료까지 대기
                 stream.until_done()
 
-            answer = "".join(collected_chunks) or "(응답 없음)"
+            answer = renderer.text or "(응답 없음)"
+            st.caption(renderer.summary())
             st.session_state.messages.append({"role": "assistant", "content": answer})
         except Exception as e:
             placeholder.error(f"OpenAI 스트리밍 중 오류: {e}")
@@ -1,8 +1,11 @@
 # app_chat.py
 import streamlit as st
-from openai import OpenAI
-import os
+import os, sys, pathlib
 from dotenv import load_dotenv, find_dotenv
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
 
 # ── 환경 변수(.env) 로드 & OpenAI 클라이언트 준비 ─────────────────────────────
 load_dotenv(find_dotenv())  # 앱 시작 시 1회만 호출
@@ -14,7 +17,7 @@ st.set_page_config(page_title="OpenAI Chatbot", layout="wide")
 st.title("OpenAI Chatbot (Streamlit)")
 
 # client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
 
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role":"system", "content":"You are a helpful assistant."}]
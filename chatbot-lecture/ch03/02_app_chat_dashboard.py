@@ -1,19 +1,34 @@
 # app_chat_dashboard.py
 # 업로드 예제(01~05)의 포인트를 하나의 Streamlit 앱으로 통합한 실습 코드
 # - dotenv로 키 관리, Responses API(비-스트리밍), 탭/사이드바/차트/로그/다운로드 포함
+# - 답변 캐시(rag_cache.AnswerCache): 같은 조건의 반복 질문은 생성 없이 즉시 응답
 
-import os, time, io, textwrap, datetime as dt
+import os, time, io, textwrap, datetime as dt, pathlib, sys, uuid
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.chat_memory import count_tokens
+from common.turn_metrics import (breakdown_figure, percentile_table, response_fields, routing_figure, routing_table,
+                                 throughput_figure)
+from common.model_router import AUTO, LATENCY_SLO_MS, get_router
+from common.log_store import LOG_DB, LogStore
+
+from rag_cache import ANSWER_CACHE_FILE, AnswerCache, answer_scope
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경설정: dotenv → OPENAI_API_KEY
 # ──────────────────────────────────────────────────────────────────────────────
 load_dotenv(find_dotenv())
 OPENAI_API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
+EMBED_MODEL = "text-embedding-3-small"   # 유사 질문 답변 재사용 시 질문 임베딩용
+CACHE_DIR = pathlib.Path(".rag_cache")   # 04 앱과 같은 위치 (답변 캐시 파일 공유, 조건이 다르면 키가 다름)
+CACHE_DIR.mkdir(exist_ok=True)
 
 st.set_page_config(page_title="Chat + Logs + Charts", page_icon="💬", layout="wide")
 st.title("💬 Chat Dashboard (Streamlit x OpenAI)")
@@ -22,16 +37,32 @@ if not OPENAI_API_KEY or not OPENAI_API_KEY.startswith("sk-"):
     st.error("OPENAI_API_KEY가 설정되어 있지 않습니다. .env 파일을 확인하세요.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """답변 캐시(.rag_cache/answers.sqlite) — 모든 세션 공용, TTL + LRU 정리"""
+    return AnswerCache(CACHE_DIR / ANSWER_CACHE_FILE)
+
+APP_NAME = "02_chat"     # 로그 저장소에서 앱 구분
+
+@st.cache_resource
+def get_log_store() -> LogStore:
+    """대화 로그 저장소(.chat_logs/chat_logs.sqlite) — 모든 세션 공용, 백그라운드 일괄 기록"""
+    return LogStore(LOG_DB)
+
+def embed_question(q: str) -> np.ndarray:
+    v = client.embeddings.create(model=EMBED_MODEL, input=[q]).data[0].embedding
+    return np.array(v, dtype=np.float32)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 1) Session State 초기화
 # ──────────────────────────────────────────────────────────────────────────────
 if "messages" not in st.session_state:
     st.session_state.messages = []   # 채팅 말풍선 표시용(간단)
-if "logs" not in st.session_state:
-    # 대화/측정치 누적 로그(DataFrame용)
-    st.session_state.logs = []       # [{ts, model, domain, temp, chars_in, chars_out, t_ms, tok_in, tok_out, answer}]
+if "session_id" not in st.session_state:
+    # 대화/측정치 로그는 LogStore(SQLite)에 세션 id로 누적 — 세션이 끝나도 남음
+    st.session_state.session_id = uuid.uuid4().hex
 if "sys_prompt" not in st.session_state:
     st.session_state.sys_prompt = textwrap.dedent("""
     You are a helpful assistant.
@@ -48,11 +79,18 @@ with st.sidebar:
     # 모델은 실제 사용 가능한 것만 노출
     model = st.selectbox(
         "Model",
-        options=["gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
+        options=[AUTO, "gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
         index=0,
+        help="auto: 질문 난이도와 최근 모델별 지연/처리량을 보고 SLO 안에서 가장 싼 모델 선택, 실패 시 다음 모델로 폴백",
     )
+    slo_s = st.slider("지연 SLO(초, auto)", 2, 30, int(LATENCY_SLO_MS / 1000), disabled=model != AUTO)
     temperature = st.slider("Temperature", 0.0, 1.0, 0.3, 0.1)
     domain = st.radio("Domain(역할 프리셋)", ["일반", "여행추천", "식단코치", "학습튜터"], index=0, horizontal=False)
+    use_answer_cache = st.checkbox("답변 캐시", value=True,
+                                   help="같은 모델·temperature·시스템 프롬프트·(정규화) 질문이면 저장된 답변을 즉시 표시")
+    answer_sim = st.slider("유사 질문 재사용 임계값(코사인, 1.0=정확 일치만)", 0.80, 1.00, 1.00, 0.01,
+                           disabled=not use_answer_cache,
+                           help="1.0 미만이면 질문 임베딩이 이 값 이상 비슷한 이전 답변도 재사용 (임베딩 호출 1회 추가)")
     st.divider()
     st.caption("🔒 API Key: 환경변수(.env) 로드됨")
     st.caption("※ 키 값은 화면에 노출하지 않습니다.")
@@ -108,44 +146,76 @@ with tab_chat:
 
             # OpenAI 호출 (Responses API, 비-스트리밍)
             start = time.perf_counter()
+            cached = ans_scope = qvec = route = None
+            timing = {}                         # 단계별 지연/토큰 (common.turn_metrics)
             try:
-                # 간단 문자열 합성 입력(Responses는 문자열 input 허용)
-                composed = f"[SYSTEM]\n{sys_prompt}\n\n[USER]\n{prompt}"
-                resp = client.responses.create(
-                    model=model,
-                    input=composed,
-                    temperature=temperature,
-                )
-                # 텍스트/사용량 안전 추출
-                answer = getattr(resp, "output_text", None) or str(resp)
-                usage = getattr(resp, "usage", None)
+                # 답변 캐시 조회: 정확 일치 → (임계값 < 1.0이면) 유사 질문
+                if use_answer_cache:
+                    ans_scope = answer_scope(model, temperature, sys_prompt)
+                    if answer_sim < 1.0:
+                        qvec = embed_question(prompt)
+                    cached = get_answer_cache().get(ans_scope, prompt, qvec, answer_sim)
+                if cached:
+                    answer = cached["answer"]
+                else:
+                    # 간단 문자열 합성 입력(Responses는 문자열 input 허용)
+                    composed = f"[SYSTEM]\n{sys_prompt}\n\n[USER]\n{prompt}"
+                    # auto: 라우터가 모델 선택 (실패하면 route.chain 의 다음 모델로 폴백)
+                    route = get_router().route(prompt, prompt_tokens=count_tokens(composed),
+                                               slo_ms=slo_s * 1000) if model == AUTO else None
+
+                    def ask(m: str):
+                        return client.responses.create(
+                            model=m,
+                            input=composed,
+                            temperature=temperature,
+                        )
+
+                    t_request = time.perf_counter()
+                    resp = get_router().run(route, ask) if route else ask(model)
+                    # 텍스트/사용량(객체/딕셔너리 호환) 안전 추출
+                    answer = getattr(resp, "output_text", None) or str(resp)
+                    timing = response_fields(resp, t_request, time.perf_counter())
 
                 dur_ms = int((time.perf_counter() - start) * 1000)
-                tokens_in = tokens_out = None
-                if usage:
-                    # 객체/딕셔너리 호환 처리
-                    tokens_in = getattr(usage, "input_tokens", None) or (usage.get("input_tokens") if isinstance(usage, dict) else None)
-                    tokens_out = getattr(usage, "output_tokens", None) or (usage.get("output_tokens") if isinstance(usage, dict) else None)
+                if ans_scope is not None and not cached:
+                    get_answer_cache().put(ans_scope, prompt, answer, qvec, gen_ms=dur_ms,
+                                           model=route.model if route else model)
 
                 # 어시스턴트 말풍선
                 with st.chat_message("assistant"):
                     st.markdown(answer)
+                    if cached:
+                        st.caption(f"⚡ 캐시된 답변 ({'정확 일치' if cached['kind'] == 'exact' else '유사 질문, 유사도 ' + str(cached['similarity'])})"
+                                   f" · 원래 질문: {cached['question']}")
+                    if route:
+                        st.caption(f"🧭 auto → {route.model}"
+                                   + (f" (폴백: {', '.join(route.fallbacks)})" if route.fallbacks else "")
+                                   + f" · {route.reason}")
 
                 # 메시지/로그 적재
                 st.session_state.messages.append({"role": "assistant", "content": answer})
-                st.session_state.logs.append({
+                row = {
                     "ts": dt.datetime.now().isoformat(timespec="seconds"),
-                    "model": model,
+                    "model": route.model if route else (cached and cached["model"]) or model,   # 실제로 답한 모델
                     "domain": domain,
                     "temp": temperature,
                     "chars_in": len(prompt),
                     "chars_out": len(answer),
                     "t_ms": dur_ms,
-                    "tok_in": tokens_in,
-                    "tok_out": tokens_out,
+                    "ttft_ms": dur_ms,          # 비스트리밍: 답변 전체가 보이는 시점
+                    "t_call_ms": timing.get("t_call_ms"),
+                    "t_wait_ms": timing.get("t_wait_ms"),
+                    "tok_in": timing.get("tok_in"),
+                    "tok_out": timing.get("tok_out"),
+                    "tok_s": timing.get("tok_s"),
+                    "answer_cache": cached["kind"] if cached else ("miss" if ans_scope is not None else None),
+                    **(route.log_fields() if route else {}),     # route_class, route_model, route_est_ms, ...
                     "answer": answer,
                     "question": prompt,
-                })
+                }
+                get_log_store().append(st.session_state.session_id, APP_NAME, row)
+                get_router().observe(row)   # 모델별 롤링 지연/처리량 갱신 (캐시 적중 턴은 건너뜀)
 
             except Exception as e:
                 with st.chat_message("assistant"):
@@ -154,23 +224,26 @@ with tab_chat:
     with col_right:
         st.subheader("통계 / 원시 응답 보기")
         # KPI (02_data: metric)
-        df = pd.DataFrame(st.session_state.logs)
-        turns = len(df)
-        avg_ms = int(df["t_ms"].mean()) if turns else 0
-        total_chars = int(df["chars_out"].sum()) if turns else 0
+        # 누적 집계에서 바로 읽음 (기록이 쌓여도 DataFrame을 만들지 않음)
+        kpi = get_log_store().kpis(st.session_state.session_id)
+        last = get_log_store().last(st.session_state.session_id)
+        turns, avg_ms, total_chars = kpi["turns"], kpi["avg_ms"], kpi["chars_out"]
         c1, c2, c3 = st.columns(3)
         c1.metric("Turns", turns)
         c2.metric("Avg Latency(ms)", avg_ms)
         c3.metric("Out Chars", total_chars)
+        ans = get_answer_cache().stats()     # 프로세스 전역(모든 세션 합산)
+        st.caption(f"답변 캐시 적중률 {ans['hit_rate']:.0%} (정확 {ans['hits_exact']} / 유사 {ans['hits_semantic']} / "
+                   f"miss {ans['misses']}) · 생성 절약 {ans['saved_ms']:,.0f} ms · {ans['size']}개 보관")
 
         # 원시 응답 보기 (02_data: json)
-        if turns:
+        if last:
             st.caption("최근 응답 원문(JSON 비슷하게 보기)")
             st.json({
-                "answer": df.iloc[-1]["answer"],
-                "usage": {"tok_in": df.iloc[-1]["tok_in"], "tok_out": df.iloc[-1]["tok_out"]},
-                "elapsed_ms": df.iloc[-1]["t_ms"],
-                "model": df.iloc[-1]["model"],
+                "answer": last["answer"],
+                "usage": {"tok_in": last["tok_in"], "tok_out": last["tok_out"]},
+                "elapsed_ms": last["t_ms"],
+                "model": last["model"],
             })
 
         st.divider()
@@ -181,7 +254,7 @@ with tab_chat:
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_logs:
     st.subheader("대화 로그")
-    df = pd.DataFrame(st.session_state.logs)
+    df = pd.DataFrame(get_log_store().recent(st.session_state.session_id))   # 최근 RECENT_ROWS개만
     if df.empty:
         st.warning("아직 로그가 없습니다. Chat 탭에서 대화를 시작하세요.")
     else:
@@ -194,6 +267,12 @@ with tab_logs:
             file_name="chat_logs.csv",
             mime="text/csv",
         )
+        st.caption(f"최근 {len(df)}개 표시 (세션 전체 {get_log_store().kpis(st.session_state.session_id)['turns']}턴은 "
+                   f"{LOG_DB}에 보관)")
+        if st.button("세션 전체 기록 CSV 준비"):
+            full = pd.DataFrame(get_log_store().session_rows(st.session_state.session_id))
+            st.download_button("전체 CSV 다운로드", data=full.to_csv(index=False).encode("utf-8"),
+                               file_name="chat_logs_full.csv", mime="text/csv")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 4-3) Charts 탭 (03_chart: Plotly로 시각화)
@@ -202,7 +281,7 @@ with tab_logs:
 with tab_charts:
     st.subheader("세션 지표 시각화 (Plotly)")
 
-    df = pd.DataFrame(st.session_state.logs)
+    # Logs 탭에서 만든 최근 RECENT_ROWS개 DataFrame 재사용
     if df.empty:
         st.info("시각화할 로그가 없습니다.")
     else:
@@ -224,6 +303,24 @@ with tab_charts:
             fig3.update_layout(title="출력 토큰 수(있을 때)", xaxis_title="Turn", yaxis_title="tok_out")
             st.plotly_chart(fig3, use_container_width=True)
 
+        # 지연 분해 / 백분위 / 처리량 (캐시 적중 턴은 API 호출이 없어 분해 값 없음)
+        st.markdown("**지연 백분위(ms)**")
+        st.dataframe(percentile_table(df), use_container_width=True)
+        for fig in (breakdown_figure(df), throughput_figure(df)):
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+
+        # 모델 라우팅 (auto): 턴별 결정 · 난이도별 답변 모델
+        routed = routing_table(df)
+        if not routed.empty:
+            st.markdown("**모델 라우팅 결정 (auto)**")
+            st.dataframe(routed, use_container_width=True)
+            st.plotly_chart(routing_figure(df), use_container_width=True)
+
+    # 라우터가 보는 모델별 롤링 통계 (프로세스 전역 — 모든 세션 합산)
+    st.markdown("**모델별 최근 지연/처리량 (라우터 기준)**")
+    st.dataframe(pd.DataFrame(get_router().snapshot()).set_index("model"), use_container_width=True)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 5) 보안/배포 체크(메모)
 #  - 로컬: dotenv(.env) 사용
@@ -1,12 +1,21 @@
 # app_chat_dashboard_stream.py
 # Chat / Logs / Charts 대시보드 + Responses API 스트리밍(.stream) + 파일 업로드(텍스트 컨텍스트) 통합 예제
 
-import os, time, textwrap, datetime as dt
+import os, time, textwrap, datetime as dt, sys, pathlib, uuid
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
+from common.chat_memory import count_tokens
+from common.turn_metrics import (breakdown_figure, percentile_table, response_fields, routing_figure, routing_table,
+                                 stream_fields, throughput_figure)
+from common.model_router import AUTO, LATENCY_SLO_MS, get_router
+from common.log_store import LOG_DB, LogStore
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경설정: dotenv → OPENAI_API_KEY
@@ -21,15 +30,23 @@ if not OPENAI_API_KEY or not OPENAI_API_KEY.startswith("sk-"):
     st.error("OPENAI_API_KEY가 설정되어 있지 않습니다. .env 파일을 확인하세요.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
+
+APP_NAME = "03_stream"     # 로그 저장소에서 앱 구분
+
+@st.cache_resource
+def get_log_store() -> LogStore:
+    """대화 로그 저장소(.chat_logs/chat_logs.sqlite) — 모든 세션 공용, 백그라운드 일괄 기록"""
+    return LogStore(LOG_DB)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 1) Session State 초기화
 # ──────────────────────────────────────────────────────────────────────────────
 if "messages" not in st.session_state:
     st.session_state.messages = []   # 채팅 말풍선 표시용(간단)
-if "logs" not in st.session_state:
-    st.session_state.logs = []       # [{ts, model, domain, temp, chars_in, chars_out, t_ms, tok_in, tok_out, answer, question}]
+if "session_id" not in st.session_state:
+    # 대화/측정치 로그는 LogStore(SQLite)에 세션 id로 누적 — 세션이 끝나도 남음
+    st.session_state.session_id = uuid.uuid4().hex
 if "sys_prompt" not in st.session_state:
     st.session_state.sys_prompt = textwrap.dedent("""
     You are a helpful assistant.
@@ -47,9 +64,11 @@ with st.sidebar:
     st.subheader("⚙️ Settings")
     model = st.selectbox(
         "Model",
-        options=["gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
+        options=[AUTO, "gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
         index=0,
+        help="auto: 질문 난이도와 최근 모델별 지연/처리량을 보고 SLO 안에서 가장 싼 모델 선택, 실패 시 다음 모델로 폴백",
     )
+    slo_s = st.slider("지연 SLO(초, auto)", 2, 30, int(LATENCY_SLO_MS / 1000), disabled=model != AUTO)
     temperature = st.slider("Temperature", 0.0, 1.0, 0.3, 0.1)
     domain = st.radio("Domain(역할 프리셋)", ["일반", "여행추천", "식단코치", "학습튜터"], index=0)
     streaming = st.toggle("🔴 Streaming 모드", value=True, help="켜면 실시간으로 토큰이 표시됩니다.")
@@ -116,53 +135,71 @@ with tab_chat:
                     context_block = f"\n[CONTEXT]\n{ctx}\n"
 
                 composed = f"[SYSTEM]\n{sys_prompt}{context_block}\n[USER]\n{prompt}"
+                # auto: 라우터가 모델 선택 (실패하면 route.chain 의 다음 모델로 폴백)
+                route = get_router().route(prompt, prompt_tokens=count_tokens(composed),
+                                           slo_ms=slo_s * 1000) if model == AUTO else None
 
                 if streaming:
                     # ── 스트리밍 모드 ───────────────────────────────────────────
                     with st.chat_message("assistant"):
-                        placeholder = st.empty()
-                        chunks = []
-
-                        with client.responses.stream(
-                            model=model,
-                            input=composed,
-                            temperature=temperature,
-                        ) as stream:
-                            for event in stream:
-                                if event.type == "response.output_text.delta":
-                                    chunks.append(event.delta)
-                                    placeholder.markdown("".join(chunks))
-                            stream.until_done()
-
-                        answer = "".join(chunks) or "(응답 없음)"
+                        placeholder = st.empty()        # 폴백하면 같은 자리에 다시 그림
+
+                        def ask(m: str) -> StreamRenderer:
+                            renderer = StreamRenderer(placeholder)   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
+                            with client.responses.stream(
+                                model=m,
+                                input=composed,
+                                temperature=temperature,
+                            ) as stream:
+                                renderer.consume(stream)
+                                stream.until_done()
+                            return renderer
+
+                        renderer = get_router().run(route, ask) if route else ask(model)
+                        answer = renderer.text or "(응답 없음)"
+                        st.caption(renderer.summary())
+                    timing = stream_fields(renderer)    # 첫 델타/마지막 델타/종료 시각 + 완료 이벤트 usage
                 else:
                     # ── 비-스트리밍 모드 ───────────────────────────────────────
-                    resp = client.responses.create(
-                        model=model,
-                        input=composed,
-                        temperature=temperature,
-                    )
+                    def ask(m: str):
+                        return client.responses.create(
+                            model=m,
+                            input=composed,
+                            temperature=temperature,
+                        )
+
+                    t_request = time.perf_counter()
+                    resp = get_router().run(route, ask) if route else ask(model)
                     answer = getattr(resp, "output_text", None) or str(resp)
+                    timing = response_fields(resp, t_request, time.perf_counter())
                     with st.chat_message("assistant"):
                         st.markdown(answer)
+                if route:
+                    st.caption(f"🧭 auto → {route.model}" + (f" (폴백: {', '.join(route.fallbacks)})" if route.fallbacks else "")
+                               + f" · {route.reason}")
 
                 dur_ms = int((time.perf_counter() - start) * 1000)
+                # 사용자가 첫 글자를 본 시점: 스트리밍은 첫 델타, 비스트리밍은 응답 수신
+                ttft_ms = int(((renderer.t_first or time.perf_counter()) - start) * 1000) if streaming else dur_ms
 
                 # 메시지/로그 적재
                 st.session_state.messages.append({"role": "assistant", "content": answer})
-                st.session_state.logs.append({
+                row = {
                     "ts": dt.datetime.now().isoformat(timespec="seconds"),
-                    "model": model,
+                    "model": route.model if route else model,    # 실제로 답한 모델
                     "domain": domain,
                     "temp": temperature,
                     "chars_in": len(prompt),
                     "chars_out": len(answer),
                     "t_ms": dur_ms,
-                    "tok_in": None,
-                    "tok_out": None,
+                    "ttft_ms": ttft_ms,
+                    **timing,               # (t_call_ms |) t_wait_ms, t_gen_ms, t_close_ms, tok_in, tok_out, tok_s
+                    **(route.log_fields() if route else {}),     # route_class, route_model, route_est_ms, ...
                     "answer": answer,
                     "question": prompt,
-                })
+                }
+                get_log_store().append(st.session_state.session_id, APP_NAME, row)
+                get_router().observe(row)   # 모델별 롤링 지연/처리량 갱신 (수동 선택 턴도 반영)
 
             except Exception as e:
                 with st.chat_message("assistant"):
@@ -172,10 +209,10 @@ with tab_chat:
         st.subheader("통계 / 원시 응답 / 업로드")
 
         # ── KPI (02_data: metric)
-        df = pd.DataFrame(st.session_state.logs)
-        turns = len(df)
-        avg_ms = int(df["t_ms"].mean()) if turns else 0
-        total_chars = int(df["chars_out"].sum()) if turns else 0
+        # 누적 집계에서 바로 읽음 (기록이 쌓여도 DataFrame을 만들지 않음)
+        kpi = get_log_store().kpis(st.session_state.session_id)
+        last = get_log_store().last(st.session_state.session_id)
+        turns, avg_ms, total_chars = kpi["turns"], kpi["avg_ms"], kpi["chars_out"]
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Turns", turns)
@@ -183,13 +220,15 @@ with tab_chat:
         c3.metric("Out Chars", total_chars)
 
         # ── 최근 응답 원시(간단) (02_data: json)
-        if turns:
+        if last:
             st.caption("최근 응답 요약(JSON 느낌)")
             st.json({
-                "answer": df.iloc[-1]["answer"],
-                "elapsed_ms": df.iloc[-1]["t_ms"],
-                "model": df.iloc[-1]["model"],
-                "domain": df.iloc[-1]["domain"],
+                "answer": last["answer"],
+                "elapsed_ms": last["t_ms"],
+                "ttft_ms": last["ttft_ms"],
+                "usage": {"tok_in": last["tok_in"], "tok_out": last["tok_out"]},
+                "model": last["model"],
+                "domain": last["domain"],
             })
 
         st.divider()
@@ -225,20 +264,26 @@ with tab_chat:
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_logs:
     st.subheader("대화 로그")
-    df = pd.DataFrame(st.session_state.logs)
+    df = pd.DataFrame(get_log_store().recent(st.session_state.session_id))   # 최근 RECENT_ROWS개만
     if df.empty:
         st.warning("아직 로그가 없습니다. Chat 탭에서 대화를 시작하세요.")
     else:
         st.dataframe(df, use_container_width=True)
         csv = df.to_csv(index=False).encode("utf-8")
         st.download_button("CSV로 다운로드", data=csv, file_name="chat_logs.csv", mime="text/csv")
+        st.caption(f"최근 {len(df)}개 표시 (세션 전체 {get_log_store().kpis(st.session_state.session_id)['turns']}턴은 "
+                   f"{LOG_DB}에 보관)")
+        if st.button("세션 전체 기록 CSV 준비"):
+            full = pd.DataFrame(get_log_store().session_rows(st.session_state.session_id))
+            st.download_button("전체 CSV 다운로드", data=full.to_csv(index=False).encode("utf-8"),
+                               file_name="chat_logs_full.csv", mime="text/csv")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 4-3) Charts 탭: Plotly로 지표 시각화
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_charts:
     st.subheader("세션 지표 시각화 (Plotly)")
-    df = pd.DataFrame(st.session_state.logs)
+    # Logs 탭에서 만든 최근 RECENT_ROWS개 DataFrame 재사용
     if df.empty:
         st.info("시각화할 로그가 없습니다.")
     else:
@@ -257,6 +302,24 @@ with tab_charts:
             fig3.update_layout(title="출력 토큰 수(있을 때)", xaxis_title="Turn", yaxis_title="tok_out")
             st.plotly_chart(fig3, use_container_width=True)
 
+        # 지연 분해(첫 토큰 대기 / 생성 / 종료) · p50/p95 · 처리량
+        st.markdown("**지연 백분위(ms)**")
+        st.dataframe(percentile_table(df), use_container_width=True)
+        for fig in (breakdown_figure(df), throughput_figure(df)):
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+
+        # 모델 라우팅 (auto): 턴별 결정 · 난이도별 답변 모델
+        routed = routing_table(df)
+        if not routed.empty:
+            st.markdown("**모델 라우팅 결정 (auto)**")
+            st.dataframe(routed, use_container_width=True)
+            st.plotly_chart(routing_figure(df), use_container_width=True)
+
+    # 라우터가 보는 모델별 롤링 통계 (프로세스 전역 — 모든 세션 합산)
+    st.markdown("**모델별 최근 지연/처리량 (라우터 기준)**")
+    st.dataframe(pd.DataFrame(get_router().snapshot()).set_index("model"), use_container_width=True)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 5) 보안/배포 메모
 # ──────────────────────────────────────────────────────────────────────────────
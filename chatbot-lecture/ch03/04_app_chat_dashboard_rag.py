@@ -2,14 +2,35 @@
 # Chat / Logs / Charts 대시보드 + 업로드 컨텍스트
 # + PDF 제목/구역 Chunking → Embedding Index → Query-time Retrieval(RAG)
 # + 이미지 OCR, TXT/PDF 텍스트 추출 그대로도 사용 가능
-import os, io, time, textwrap, hashlib, json, datetime as dt, re, pathlib
-from typing import List, Dict, Any
+import os, time, textwrap, hashlib, datetime as dt, pathlib, sys, uuid
+from typing import List, Dict, Any, Optional
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
+from common.turn_metrics import (breakdown_figure, percentile_table, response_fields, routing_figure, routing_table,
+                                 stream_fields, throughput_figure)
+from common.model_router import AUTO, LATENCY_SLO_MS, ROUTE_MODELS, get_router
+from common.log_store import LOG_DB, LogStore
+from rag_index import (BACKENDS, STORE_DTYPES, EmbeddingStore, IndexRegistry, use_ann, build_ann, load_ann,
+                       make_index, search_index, self_recall, registry_key)
+from rag_embed import EMBED_WORKERS, SectionEmbeddingCache, embed_texts_cached
+from rag_extract import PageText, iter_pdf_pages, pdf_page_count
+from rag_chunk import CHUNK_OVERLAP, CHUNK_TOKENS, chunk_pages, page_label
+from rag_context import TRUNC_MARK, context_budget, count_tokens, pack_sections, tokenizer_name, trim_to_tokens
+from rag_lexical import CAND_MULT, HYBRID_ALPHA, RAG_MODES, fuse_scores
+from rag_cache import (ANSWER_CACHE_FILE, QUERY_CACHE_SIZE, RESULT_CACHE_SIZE, AnswerCache, LRUCache, answer_scope,
+                       normalize_query, query_hash, text_hash)
+from rag_corpus import (CorpusRegistry, delete_shard, has_shard, merge_shards, open_shard, prune_merged, save_shard,
+                        section_text, selection_key, shard_attrs)
+from rag_store import SectionTable
+from rag_jobs import BuildJob, JobManager
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 추가: PDF / 이미지 OCR 유틸
@@ -19,12 +40,9 @@ try:
 except Exception:
     pdfplumber = None
 
-try:
-    from PIL import Image
-    import pytesseract  # 이미지 OCR (시스템에 Tesseract 설치 필요)
-except Exception:
-    Image = None
-    pytesseract = None
+# 이미지 OCR (Pillow + pytesseract + 시스템 Tesseract) → rag_ocr.py: 전처리 / 띠 분할 / 병렬 OCR / 결과 캐시
+from rag_ocr import OCRCache, ocr_available, ocr_image, ocr_languages, ocr_pdf_pages, shared_pool
+OCR_LANG = ocr_languages()  # 시작 시 1번 결정: kor 데이터 있으면 "kor+eng", 없으면 "eng" (없으면 "")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경설정
@@ -41,15 +59,16 @@ if not OPENAI_API_KEY or not OPENAI_API_KEY.startswith("sk-"):
     st.error("OPENAI_API_KEY가 설정되어 있지 않습니다. .env 파일을 확인하세요.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_gateway(OPENAI_API_KEY)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 1) Session State
 # ──────────────────────────────────────────────────────────────────────────────
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "logs" not in st.session_state:
-    st.session_state.logs = []
+if "session_id" not in st.session_state:
+    # 대화/측정치 로그는 LogStore(SQLite)에 세션 id로 누적 — 세션이 끝나도 남음
+    st.session_state.session_id = uuid.uuid4().hex
 if "sys_prompt" not in st.session_state:
     st.session_state.sys_prompt = textwrap.dedent("""
     You are a helpful assistant.
@@ -59,34 +78,63 @@ if "sys_prompt" not in st.session_state:
     """)
 if "upload_text" not in st.session_state:
     st.session_state.upload_text = ""      # 일반 컨텍스트(텍스트/ocr/pdf full)
-if "rag_sections" not in st.session_state:
-    st.session_state.rag_sections = []     # [{title, content, page, section_id}]
+if "rag_docs" not in st.session_state:
+    st.session_state.rag_docs = []         # 검색 대상으로 선택한 코퍼스 문서 id(PDF 해시) 목록
 if "rag_index" not in st.session_state:
-    st.session_state.rag_index = None      # {"emb": np.ndarray, "meta": [...]}
-if "rag_file_sig" not in st.session_state:
-    st.session_state.rag_file_sig = None   # 업로드 PDF 파일 해시(캐시 무결성용)
+    st.session_state.rag_index = None      # 선택 문서 병합 색인 {"exact", "ann", "lexical", "meta": SectionTable}
+if "rag_corpus_key" not in st.session_state:
+    st.session_state.rag_corpus_key = None # 위 색인의 캐시 키(문서 1개면 PDF 해시, 여러 개면 corpus-{hash})
+if "rag_jobs" not in st.session_state:
+    st.session_state.rag_jobs = []         # 이 세션에서 시작한 백그라운드 빌드 작업 id
+    st.session_state.rag_jobs_applied = set()  # 완료 후 검색 대상에 반영한 작업 id
+if "pdf_pages" not in st.session_state:
+    st.session_state.pdf_pages = []        # [PageText(page, text)] 페이지별 추출 결과
+    st.session_state.pdf_pages_sig = None  # 위 결과가 어느 PDF의 것인지(재실행 시 재추출 방지)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 2) 사이드바
 # ──────────────────────────────────────────────────────────────────────────────
 with st.sidebar:
     st.subheader("⚙️ Settings")
-    model = st.selectbox("Model", options=GEN_MODELS, index=0)
+    model = st.selectbox("Model", options=[AUTO] + GEN_MODELS, index=0,
+                         help="auto: 질문 난이도·프롬프트 크기와 최근 모델별 지연/처리량을 보고 SLO 안에서 가장 싼 모델 선택, "
+                              "실패 시 다음 모델로 폴백")
+    slo_s = st.slider("지연 SLO(초, auto)", 2, 30, int(LATENCY_SLO_MS / 1000), disabled=model != AUTO)
+    # 컨텍스트 예산/토크나이저 기준 모델 (auto면 가장 싼 후보 — 후보 모두 같은 o200k 토크나이저)
+    plan_model = ROUTE_MODELS[0] if model == AUTO else model
     temperature = st.slider("Temperature", 0.0, 1.0, 0.3, 0.1)
     domain = st.radio("Domain(역할 프리셋)", ["일반", "여행추천", "식단코치", "학습튜터"], index=0)
     streaming = st.toggle("🔴 Streaming 모드", value=True)
+    use_answer_cache = st.checkbox("답변 캐시", value=True,
+                                   help="같은 모델·temperature·시스템 프롬프트·검색 섹션·(정규화) 질문이면 저장된 답변을 즉시 표시")
+    answer_sim = st.slider("유사 질문 재사용 임계값(코사인, 1.0=정확 일치만)", 0.80, 1.00, 1.00, 0.01,
+                           disabled=not use_answer_cache,
+                           help="1.0 미만이면 같은 조건에서 질문 임베딩이 이 값 이상 비슷한 이전 답변도 재사용")
     st.divider()
 
     st.markdown("**컨텍스트 옵션**")
     use_uploaded = st.checkbox("업로드 텍스트 단순 주입(원본)", value=True)
-    ctx_limit = st.number_input("단순 컨텍스트 최대 길이(문자)", min_value=500, max_value=20000, value=4000, step=500)
+    ctx_tok_budget = st.number_input("단순 컨텍스트 예산(토큰)", min_value=100, max_value=16000, value=1000, step=100)
 
     st.markdown("**RAG 옵션(PDF)**")
     use_rag = st.checkbox("PDF 섹션 RAG 사용", value=True)
     top_k = st.number_input("RAG Top-K", min_value=1, max_value=10, value=4, step=1)
-    rag_ctx_limit = st.number_input("RAG 컨텍스트 최대 길이(문자)", min_value=500, max_value=20000, value=5000, step=500)
-
-    st.caption("RAG와 단순 주입은 함께 사용할 수 있습니다. (프롬프트에 [RAG] 블록, [CONTEXT] 블록 순으로 추가)")
+    rag_mode = st.radio("검색 모드", RAG_MODES, index=1, horizontal=True,
+                        help="dense: 임베딩만 · hybrid: BM25+임베딩 결합 · lexical: BM25만(질의 임베딩 호출 없음 → 가장 빠름)")
+    hybrid_alpha = st.slider("hybrid 임베딩 비중(alpha)", 0.0, 1.0, HYBRID_ALPHA, 0.05, disabled=rag_mode != "hybrid")
+    use_result_cache = st.checkbox("검색 결과 캐시", value=True,
+                                   help="같은 문서·설정·(정규화) 질문·Top-K면 이전 검색 결과 재사용")
+    rag_tok_budget = st.number_input("RAG 컨텍스트 예산(토큰, 0=모델 기본)", min_value=0, max_value=32000, value=0, step=250,
+                                     help=f"모델 기본값: {context_budget(plan_model)} 토큰 · 토크나이저: {tokenizer_name(plan_model)}")
+    chunk_tokens = st.number_input("청크 크기(토큰)", min_value=100, max_value=2000, value=CHUNK_TOKENS, step=50)
+    chunk_overlap = st.number_input("청크 겹침(토큰)", min_value=0, max_value=500, value=CHUNK_OVERLAP, step=10)
+    rag_backend = st.selectbox("검색 백엔드", BACKENDS, index=0,
+                               help="auto: 섹션 수가 많으면 IVF(ANN), 적으면 exact 전체 스캔")
+    nprobe = st.number_input("IVF nprobe(탐색 군집 수, 0=자동)", min_value=0, max_value=256, value=0, step=1)
+    store_dtype = st.selectbox("임베딩 저장 형식", STORE_DTYPES, index=0,
+                               help="메모리 절약용: float16은 1/2, int8(행별 scale)은 약 1/4. 검색 속도는 float32가 가장 빠름(변환 비용)")
+
+    st.caption("RAG와 단순 주입은 함께 사용할 수 있습니다. (프롬프트에 [RAG] 블록, [CONTEXT] 블록 순으로 추가, 각 예산은 토큰 기준)")
 
 DOMAIN_GUIDE = {
     "일반": "",
@@ -103,8 +151,8 @@ def extract_text_from_upload(uploaded_file) -> str:
     """
     업로드된 파일에서 텍스트 추출
     - text/plain: UTF-8 디코드
-    - application/pdf: pdfplumber로 텍스트 추출
-    - image/*: pytesseract로 OCR (기본 en, 한국어 kor 옵션)
+    - application/pdf: pdfplumber로 페이지 병렬 텍스트 추출 (extract_pdf_pages), 텍스트 없는 스캔 페이지는 RAG 빌드 작업에서 OCR
+    - image/*: rag_ocr.ocr_image (이진화 → 띠 분할 → 병렬 OCR, 이미지 해시로 결과 캐시)
     """
     if uploaded_file is None:
         return ""
@@ -122,28 +170,16 @@ def extract_text_from_upload(uploaded_file) -> str:
                 st.warning("pdfplumber가 설치되어 있지 않아 PDF 텍스트를 추출하지 못했습니다.")
                 return ""
             uploaded_file.seek(0)
-            text_chunks = []
-            with pdfplumber.open(uploaded_file) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text() or ""
-                    if text.strip():
-                        text_chunks.append(text)
-            return "\n\n".join(text_chunks).strip()
+            pages = extract_pdf_pages(uploaded_file.read())
+            return "\n\n".join(p.text for p in pages if p.text.strip()).strip()
 
         if mime in ("image/png", "image/jpeg"):
-            if not (Image and pytesseract):
-                st.warning("Pillow/pytesseract가 없어서 이미지 OCR을 수행할 수 없습니다.")
+            if not (ocr_available() and OCR_LANG):
+                st.warning("Pillow/pytesseract/Tesseract가 없어서 이미지 OCR을 수행할 수 없습니다.")
                 return ""
             uploaded_file.seek(0)
-            img = Image.open(uploaded_file)
-
-            # OCR 언어 선택
-            # 한국어 데이터(kor.traineddata)가 설치되어 있으면 한국어 OCR 시도
-            try:
-                text = pytesseract.image_to_string(img, lang="kor+eng")
-            except Exception:
-                text = pytesseract.image_to_string(img)  # fallback: 영어만
-            return text
+            with st.spinner(f"이미지 OCR 중... ({OCR_LANG})"):
+                return ocr_image(uploaded_file.read(), cache=get_ocr_cache(), pool=shared_pool())
 
     except Exception as e:
         st.warning(f"파일 텍스트 추출 중 오류: {e}")
@@ -151,67 +187,33 @@ def extract_text_from_upload(uploaded_file) -> str:
     st.info(f"미지원 파일 형식 또는 텍스트를 찾지 못함: {name} ({mime})")
     return ""
 
-# ──────────────────────────────────────────────────────────────────────────────
-# 4) PDF → 섹션 Chunking (제목/구역 단위)
-#    - 단순 텍스트 기반 규칙: 번호형 제목, 대문자/Title Case, 빈줄 기준 등
-#    - 실패 시 문장 단위 슬라이딩 윈도우로 보수적으로 분할
-# ──────────────────────────────────────────────────────────────────────────────
-HEADING_PATTERNS = [
-    r"^\s*\d+(\.\d+)*\s+.+",          # 1 / 1.1 / 2.3.4 형태
-    r"^\s*[IVXLCM]+\.\s+.+",          # 로마숫자. Title
-    r"^\s*[A-Z][A-Z\s\-:]{4,}$",      # 전부 대문자 계열 제목
-]
-
-def naive_split_sections(full_text: str) -> List[Dict[str, Any]]:
-    lines = full_text.splitlines()
-    sections = []
-    cur_title = "Introduction"
-    cur_buf = []
-    cur_start_page = None  # 텍스트 추출 방식에선 정확 페이지 매핑 어려움 → None 처리
-
-    def flush():
-        if cur_buf:
-            sections.append({
-                "title": cur_title.strip(),
-                "content": "\n".join(cur_buf).strip(),
-                "page": cur_start_page,
-            })
-
-    heading_regex = re.compile("|".join(HEADING_PATTERNS), flags=re.IGNORECASE)
-
-    for ln in lines:
-        if heading_regex.match(ln.strip()):
-            # 새 섹션 시작
-            if cur_buf:
-                flush()
-                cur_buf = []
-            cur_title = ln.strip()
-        else:
-            cur_buf.append(ln)
-    # 마지막 섹션 flush
-    flush()
-
-    # 섹션이 너무 적거나 제목 감지가 실패하면, 문장 슬라이딩 윈도우로 분할
-    if len(sections) <= 1:
-        sections = []
-        sents = re.split(r"(?<=[\.\?\!])\s+", full_text)
-        win = 8              # 문장 8개 정도씩
-        stride = 6           # 겹치게
-        for i in range(0, len(sents), stride):
-            chunk = " ".join(sents[i:i+win]).strip()
-            if len(chunk) > 100:
-                sections.append({
-                    "title": f"Chunk {i//stride+1}",
-                    "content": chunk,
-                    "page": None,
-                })
-    # section_id 부여
-    for idx, s in enumerate(sections, start=1):
-        s["section_id"] = idx
-    return sections
+def extract_pdf_pages(pdf_bytes: bytes) -> List[PageText]:
+    """
+    페이지 범위를 여러 프로세스로 나눠 추출하고, 도착하는 페이지 순서대로 진행률 표시
+    - 텍스트 없는 페이지(스캔본)는 여기서 OCR하지 않음 → RAG 빌드(백그라운드 작업)에서 렌더링 + OCR
+    - 같은 PDF는 세션 내 재실행(위젯 조작/채팅) 시 다시 추출하지 않음
+    """
+    sig = file_signature(pdf_bytes)
+    if st.session_state.pdf_pages_sig == sig:
+        return st.session_state.pdf_pages
+    n_pages = pdf_page_count(pdf_bytes)
+    bar = st.progress(0.0, text=f"PDF 텍스트 추출 중... (0/{n_pages}쪽)")
+    pages = []
+    for pt in iter_pdf_pages(pdf_bytes):
+        pages.append(pt)
+        bar.progress(pt.page / max(1, n_pages), text=f"PDF 텍스트 추출 중... ({pt.page}/{n_pages}쪽)")
+    bar.empty()
+    n_scanned = sum(1 for pt in pages if pt.digest)
+    if n_scanned and ocr_available() and OCR_LANG:
+        st.caption(f"텍스트 없는 페이지 {n_scanned}쪽 — RAG 빌드 시 백그라운드에서 OCR")
+    elif n_scanned:
+        st.caption(f"텍스트 없는 페이지 {n_scanned}쪽 — OCR 미설치로 제외됨")
+    st.session_state.pdf_pages = pages
+    st.session_state.pdf_pages_sig = sig
+    return pages
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 5) Embedding Index (로컬 캐시)
+# 4) Embedding Index (로컬 캐시)
 # ──────────────────────────────────────────────────────────────────────────────
 CACHE_DIR = pathlib.Path(".rag_cache")
 CACHE_DIR.mkdir(exist_ok=True)
@@ -219,86 +221,269 @@ CACHE_DIR.mkdir(exist_ok=True)
 def file_signature(file_bytes: bytes) -> str:
     return hashlib.sha256(file_bytes).hexdigest()
 
-def build_rag_index(sections: List[Dict[str, Any]], cache_key: str):
-    """sections → 임베딩 배열(np.float32) + 메타데이터 리스트"""
-    texts = [f"{s['title']}\n{s['content']}" for s in sections]
-    # 임베딩 호출
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    emb = np.array([e.embedding for e in resp.data], dtype=np.float32)
-    meta = [{"title": s["title"], "page": s["page"], "section_id": s["section_id"], "n_chars": len(s["content"])} for s in sections]
-
-    # 캐시 저장
-    np.save(CACHE_DIR / f"{cache_key}.npy", emb)
-    with open(CACHE_DIR / f"{cache_key}.json", "w", encoding="utf-8") as f:
-        json.dump({"meta": meta}, f, ensure_ascii=False)
-    return {"emb": emb, "meta": meta}
+@st.cache_resource
+def get_index_registry() -> IndexRegistry:
+    """프로세스 전역 색인 레지스트리 (스크립트 재실행/세션과 무관하게 1개)"""
+    return IndexRegistry()
+
+@st.cache_resource
+def get_section_cache() -> SectionEmbeddingCache:
+    """섹션 단위 임베딩 캐시(.rag_cache/sections.sqlite) — 문서 일부만 바뀌면 바뀐 섹션만 재임베딩"""
+    return SectionEmbeddingCache(CACHE_DIR / "sections.sqlite")
+
+@st.cache_resource
+def get_ocr_cache() -> OCRCache:
+    """OCR 결과 캐시(.rag_cache/ocr.sqlite) — 같은 이미지는 다시 OCR하지 않음"""
+    return OCRCache(CACHE_DIR / "ocr.sqlite")
+
+@st.cache_resource
+def get_corpus() -> CorpusRegistry:
+    """문서 코퍼스 레지스트리(.rag_cache/corpus.json) — 모든 세션 공용"""
+    return CorpusRegistry(CACHE_DIR)
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """백그라운드 빌드 작업 관리자 — 스크립트 재실행/세션과 무관하게 작업 스레드 유지"""
+    return JobManager()
+
+def build_document_job(job: BuildJob, pdf_bytes: bytes, name: str, pages: Optional[List[PageText]],
+                       chunk_tokens: int, chunk_overlap: int, section_cache: SectionEmbeddingCache,
+                       corpus: CorpusRegistry, registry: IndexRegistry, ocr_cache: OCRCache) -> Dict[str, Any]:
+    """
+    작업 스레드에서 실행: (추출) → 스캔 페이지 OCR → 청킹 → 임베딩 → .rag 번들 기록 → 코퍼스 등록
+    - st.* 호출 금지 (필요한 캐시 객체/설정값은 제출 시점에 인자로 받음), 진행률/취소는 job으로
+    - 이미 같은 청크 설정으로 만든 번들이 있는 문서(같은 PDF)는 청킹/임베딩 없이 재사용
+      (설정이 다르면 다시 청킹 — 바뀌지 않은 섹션은 섹션 임베딩 캐시에서 재사용)
+    """
+    doc_id = file_signature(pdf_bytes)
+    chunking = {"chunk_tokens": chunk_tokens, "chunk_overlap": chunk_overlap}
+    ocr_stats: Dict[str, int] = {}
+    attrs = shard_attrs(CACHE_DIR, doc_id)
+    if attrs is not None and all(attrs.get(k) == v for k, v in chunking.items()):
+        job.set_stage("재사용", 1)
+        n = len(open_shard(CACHE_DIR, doc_id).sections)
+        stats = {"hits": n, "misses": 0}
+        job.progress(1)
+    else:
+        if not pages:
+            job.set_stage("추출", pdf_page_count(pdf_bytes))
+            pages = []
+            for pt in iter_pdf_pages(pdf_bytes):
+                pages.append(pt)
+                job.progress(pt.page)
+        n_scanned = sum(1 for pt in pages if pt.digest)
+        if n_scanned and ocr_available() and OCR_LANG:
+            # 텍스트 없는 페이지만 렌더링 → OCR (페이지 내용 해시로 캐시, 실패한 페이지는 빈 텍스트로 두고 계속)
+            job.set_stage("OCR", n_scanned)
+            ocr_pages = []
+            for pt in ocr_pdf_pages(pdf_bytes, pages, ocr_cache, shared_pool(), ocr_stats):
+                ocr_pages.append(pt)
+                job.progress(sum(ocr_stats.values()))
+            pages = ocr_pages
+        job.set_stage("청킹", 1)
+        sections = chunk_pages(pages, chunk_tokens, chunk_overlap)
+        if not sections:
+            raise ValueError("섹션을 생성하지 못했습니다.")
+        job.progress(1)
+        # 섹션 캐시 조회 → 없는 것만 토큰 기준 배치 분할 → 병렬 전송, 배치 완료마다 취소 확인
+        # (429/5xx 재시도·속도 조절은 게이트웨이가 담당 → rag_embed 쪽 재시도는 끔)
+        job.set_stage("임베딩", len(sections))
+        emb, stats = embed_texts_cached(client, [section_text(s) for s in sections], EMBED_MODEL, section_cache,
+                                        max_workers=EMBED_WORKERS, max_retries=0, on_progress=job.progress)
+        job.set_stage("색인 기록", 1)
+        for key in [doc_id] + corpus.drop_merged(doc_id):     # 이 문서의 이전 섹션을 담은 색인은 모두 무효
+            registry.evict_sig(key)
+        delete_shard(CACHE_DIR, doc_id)     # 이전 형식/파생 캐시(양자화본, IVF)가 남아 있으면 정리
+        save_shard(CACHE_DIR, doc_id, emb, SectionTable.from_sections(sections, doc_id, name), attrs=chunking)
+        job.progress(1)
+        n = len(sections)
+    corpus.add(doc_id, name, n, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap)
+    return {"doc_id": doc_id, "n_sections": n, "ocr": ocr_stats, **stats}
 
 def load_rag_index(cache_key: str):
-    npy = CACHE_DIR / f"{cache_key}.npy"
-    jsn = CACHE_DIR / f"{cache_key}.json"
-    if npy.exists() and jsn.exists():
-        emb = np.load(npy)
-        meta = json.loads(jsn.read_text(encoding="utf-8"))["meta"]
-        return {"emb": emb, "meta": meta}
-    return None
-
-def ensure_rag_index(pdf_bytes: bytes, sections: List[Dict[str, Any]]):
-    sig = file_signature(pdf_bytes)
-    cached = load_rag_index(sig)
-    if cached:
-        return sig, cached
-    built = build_rag_index(sections, sig)
-    return sig, built
-
-def embed_query(q: str) -> np.ndarray:
-    v = client.embeddings.create(model=EMBED_MODEL, input=[q]).data[0].embedding
-    return np.array(v, dtype=np.float32)
-
-def cosine_sim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
-    a_n = a / (np.linalg.norm(a, axis=-1, keepdims=True) + 1e-8)
-    b_n = b / (np.linalg.norm(b, axis=-1, keepdims=True) + 1e-8)
-    return np.dot(a_n, b_n.T)
-
-def retrieve_sections(query: str, index: Dict[str, Any], sections: List[Dict[str, Any]], k: int = 4):
-    if not index or "emb" not in index:
+    """캐시 파일을 mmap(읽기 전용)으로 열어 색인 구성 (문서 샤드 / 병합 색인 공통)"""
+    shard = open_shard(CACHE_DIR, cache_key)       # 번들 없으면(이전 형식 포함) None → 다시 빌드
+    if shard is None:
+        return None
+    store = EmbeddingStore.load(CACHE_DIR, cache_key, store_dtype, mmap=True, base=shard.emb)
+    ann = load_ann(store, CACHE_DIR, cache_key, mmap=True)
+    if ann is None and use_ann(len(store), rag_backend):
+        build_ann(store, CACHE_DIR, cache_key)
+        ann = load_ann(store, CACHE_DIR, cache_key, mmap=True)
+    index = make_index(store, ann, shard.sections)
+    index["lexical"] = shard.lexical
+    index["built"] = shard.attrs.get("built")      # 같은 키로 다시 기록되면 바뀜 → 검색 결과 캐시 키에 포함
+    return index
+
+def merge_corpus_job(job: BuildJob, doc_ids: List[str], names: Dict[str, str],
+                     registry: IndexRegistry) -> Dict[str, Any]:
+    """작업 스레드에서 실행: 선택 문서 병합 색인 기록 → 지금 열려 있지 않은 이전 병합본 정리"""
+    job.set_stage("병합", 1)
+    key = merge_shards(CACHE_DIR, doc_ids, names)
+    job.progress(1)
+    job.set_stage("정리", 1)
+    removed = prune_merged(CACHE_DIR, keep={key} | registry.sigs())
+    job.progress(1)
+    return {"key": key, "n_docs": len(doc_ids), "removed": len(removed)}
+
+def open_corpus_index(doc_ids: List[str]):
+    """
+    선택 문서들의 병합 색인(공유 레지스트리) → (선택 키, index)
+    - 여러 문서 병합본이 아직 없으면 백그라운드 작업으로 병합하고, 끝날 때까지 이전 색인을 그대로 사용
+    """
+    corpus = get_corpus()
+    doc_ids = sorted({d for d in doc_ids if d in corpus})
+    if not doc_ids:
+        return None, None
+    key = selection_key(doc_ids)
+    if len(doc_ids) > 1 and not has_shard(CACHE_DIR, key):
+        manager = get_job_manager()
+        jobs = [j for j in (manager.get(i) for i in st.session_state.rag_jobs) if j is not None and j.key == key]
+        if any(j.status in ("failed", "cancelled") for j in jobs):     # 실패/취소한 병합은 선택을 바꿀 때까지 재시도 안 함
+            return None, None
+        job = manager.submit(f"병합: {len(doc_ids)}개 문서", key, merge_corpus_job,
+                                       doc_ids, corpus.names(), get_index_registry())
+        if job.id not in st.session_state.rag_jobs:
+            st.session_state.rag_jobs.append(job.id)
+            st.rerun()      # 진행률 패널(폴링)부터 다시 그림 → 병합이 끝나면 전체 재실행
+        return st.session_state.rag_corpus_key, st.session_state.rag_index
+    index = get_index_registry().get_or_load(registry_key(key, store_dtype, rag_backend), lambda: load_rag_index(key))
+    return key, index
+
+def remove_document(doc_id: str):
+    """코퍼스에서 문서 삭제 — 그 문서 샤드와 그 문서를 포함한 병합 색인만 지움 (다른 문서는 그대로)"""
+    registry = get_index_registry()
+    for key in get_corpus().remove(doc_id):
+        registry.evict_sig(key)
+
+@st.cache_resource
+def get_query_cache() -> LRUCache:
+    """질의 임베딩 LRU — (모델, 정규화 질의) → 벡터, 프로세스 전역(재실행/세션 간 유지)"""
+    return LRUCache(QUERY_CACHE_SIZE)
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """답변 캐시(.rag_cache/answers.sqlite) — 모든 세션 공용, TTL + LRU 정리"""
+    return AnswerCache(CACHE_DIR / ANSWER_CACHE_FILE)
+
+@st.cache_resource
+def get_result_cache() -> LRUCache:
+    """검색 결과 LRU — (파일 서명, 검색 설정, 질의 해시, top_k) → 섹션 목록"""
+    return LRUCache(RESULT_CACHE_SIZE)
+
+APP_NAME = "04_rag"     # 로그 저장소에서 앱 구분
+
+@st.cache_resource
+def get_log_store() -> LogStore:
+    """대화 로그 저장소(.chat_logs/chat_logs.sqlite) — 모든 세션 공용, 백그라운드 일괄 기록"""
+    return LogStore(LOG_DB)
+
+def embed_query(q: str, info: Dict[str, Any] = None) -> np.ndarray:
+    def call():
+        v = client.embeddings.create(model=EMBED_MODEL, input=[q]).data[0].embedding
+        return np.array(v, dtype=np.float32)
+    v, hit = get_query_cache().get_or_compute((EMBED_MODEL, normalize_query(q)), call)
+    if info is not None:
+        info["embed_hit"] = hit
+    return v
+
+def retrieve_cached(query: str, index: Dict[str, Any], k: int, mode: str, info: Dict[str, Any]):
+    """검색 결과 캐시를 거쳐 retrieve_sections 호출 (키에 결과를 바꾸는 설정 모두 포함)"""
+    if not use_result_cache:
+        return retrieve_sections(query, index, k=k, mode=mode, info=info)
+    key = (st.session_state.rag_corpus_key, index.get("built"), mode, round(hybrid_alpha, 2), rag_backend, int(nprobe), store_dtype,
+           query_hash(query), int(k))
+    items, hit = get_result_cache().get_or_compute(
+        key, lambda: retrieve_sections(query, index, k=k, mode=mode, info=info))
+    info["result_hit"] = hit
+    return [dict(it) for it in items]
+
+def retrieve_sections(query: str, index: Dict[str, Any], k: int = 4, mode: str = "dense",
+                      info: Dict[str, Any] = None):
+    """
+    mode: dense(임베딩) / hybrid(BM25 + 임베딩 점수 결합) / lexical(BM25만, embed_query 호출 없음)
+    BM25 역색인이 없으면 dense로 동작
+    """
+    if not index or "exact" not in index:
         return []
-    qv = embed_query(query)
-    sims = cosine_sim(qv.reshape(1, -1), index["emb"]).ravel()
-    top_idx = np.argsort(-sims)[:k]
-    items = []
-    for i in top_idx:
-        meta = index["meta"][i]
-        sec = next((s for s in sections if s["section_id"] == meta["section_id"]), None)
-        if not sec:
-            continue
-        items.append({
-            "score": float(sims[i]),
-            "title": meta["title"],
-            "page": meta["page"],
-            "content": sec["content"],
-            "section_id": meta["section_id"],
-        })
-    return items
+    bm25 = index.get("lexical")
+    if mode == "lexical" and bm25 is not None:
+        top_idx, scores = bm25.search(query, k)
+    else:
+        qv = embed_query(query, info)
+        n_cand = k * CAND_MULT if mode == "hybrid" and bm25 is not None else k
+        # ANN(IVF) 색인이 있으면 근사 탐색, 없거나 exact 선택 시 전체 스캔(폴백)
+        top_idx, scores = search_index(index, qv, n_cand, backend=rag_backend, nprobe=int(nprobe) or None)
+        if n_cand != k:
+            top_idx, scores = fuse_scores((top_idx, scores), bm25.search(query, n_cand), k, alpha=hybrid_alpha)
+    # 행 번호 → 섹션 열 저장소에서 바로 꺼냄 (상위 k개 제목/본문만 디코드)
+    table: SectionTable = index["meta"]
+    return [{"score": float(score), **table.row(int(i))} for i, score in zip(top_idx, scores)]
+
+# 빌드 작업 패널: 진행 중 작업이 있을 때만 1초마다 이 부분만 다시 그림(st.fragment), 모두 끝나면 전체 재실행
+def _build_jobs_panel(live: bool = False):
+    manager = get_job_manager()
+    jobs = [j for j in (manager.get(i) for i in st.session_state.rag_jobs) if j is not None]
+    if not jobs:
+        return
+    st.markdown("**🔧 빌드 작업**")
+    for job in reversed(jobs[-5:]):
+        snap = job.snapshot()
+        icon = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌", "cancelled": "🚫"}[snap["status"]]
+        line = f"{icon} {snap['name']} · {snap['status']} · {snap['elapsed_s']}s"
+        if job.status == "done":
+            r = job.result
+            if "doc_id" in r:
+                line += f" · {r['n_sections']}개 섹션, 섹션 캐시 hit {r['hits']} / miss {r['misses']}"
+                if r["ocr"]:
+                    line += (f" · OCR {r['ocr'].get('ocr', 0)}쪽 (캐시 {r['ocr'].get('cached', 0)}쪽"
+                             f", 실패 {r['ocr'].get('failed', 0)}쪽)")
+            else:
+                line += f" · 병합 색인 기록, 이전 병합본 {r['removed']}개 정리"
+        st.caption(line)
+        if snap["error"]:
+            st.error(snap["error"])
+        if job.active:
+            for stage, (done, total) in snap["stages"].items():
+                st.progress(min(1.0, done / total) if total else 0.0, text=f"{stage} {done}/{total}")
+            if st.button("취소", key=f"cancel_job_{job.id}", disabled=job.cancel_requested):
+                job.cancel()
+    finished = [j.id for j in jobs if not j.active and j.status == "done" and j.id not in st.session_state.rag_jobs_applied]
+    if live and (finished or not any(j.active for j in jobs)):
+        st.rerun()      # 새 문서를 검색 대상에 반영하고, 폴링 없는 패널로 전환하도록 전체 재실행
+
+def render_build_jobs():
+    active = any(j is not None and j.active for j in (get_job_manager().get(i) for i in st.session_state.rag_jobs))
+    if active and hasattr(st, "fragment"):
+        _build_jobs_live(live=True)
+    else:   # 진행 중 작업 없음 / 구버전 Streamlit: 위젯 조작/대화 시 재실행될 때만 갱신
+        _build_jobs_panel()
+
+if hasattr(st, "fragment"):
+    _build_jobs_live = st.fragment(run_every=1.0)(_build_jobs_panel)
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 6) 상단 가이드
+# 5) 상단 가이드
 # ──────────────────────────────────────────────────────────────────────────────
 with st.expander("📘 시스템 가이드 & 샘플 표시", expanded=False):
     st.markdown("""
-- **PDF 업로드 후 [RAG 빌드]** 버튼을 누르면 *제목/구역* 단위로 분할→임베딩 색인합니다.
+- **PDF 업로드 후 [RAG 빌드]** 버튼을 누르면 *제목/구역* 단위로 분할→임베딩 색인하고 문서 코퍼스에 추가합니다.
+  빌드는 백그라운드에서 진행되며(단계별 진행률/취소), 그동안에도 기존 색인으로 대화할 수 있습니다.
+  여러 PDF를 차례로 빌드한 뒤 **검색 대상 문서**를 골라 한꺼번에 검색할 수 있습니다.
 - 질문 시 Top-K 유사 섹션을 찾아 **[RAG]** 블록으로 프롬프트에 자동 삽입합니다.
-- 동시에 TXT/PDF/이미지에서 추출한 **원본 텍스트 전체**를 **[CONTEXT]** 블록으로 일부(문자 한도) 덧붙일 수도 있습니다.
+  (검색 모드: 임베딩 / BM25+임베딩 결합 / BM25만 — BM25만 쓰면 질의 임베딩 호출이 없어 첫 토큰이 빨라집니다)
+- 동시에 TXT/PDF/이미지에서 추출한 **원본 텍스트 전체**를 **[CONTEXT]** 블록으로 일부(토큰 예산 안에서) 덧붙일 수도 있습니다.
 """)
     st.code("def few_shot_rule():\n    return '간결하게, 단계별로, 예시와 함께 설명'\n", language="python")
     st.latex(r"x=\frac{-b\pm\sqrt{b^2-4ac}}{2a}")
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 7) 탭: Chat / Logs / Charts
+# 6) 탭: Chat / Logs / Charts
 # ──────────────────────────────────────────────────────────────────────────────
 tab_chat, tab_logs, tab_charts = st.tabs(["💬 Chat", "🧾 Logs", "📈 Charts"])
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 7-1) Chat 탭
+# 6-1) Chat 탭
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_chat:
     col_left, col_right = st.columns([2, 1])
@@ -321,52 +506,91 @@ with tab_chat:
             if (uploaded_file.type or "") == "application/pdf":
                 uploaded_file.seek(0)
                 pdf_bytes = uploaded_file.read()
-                # 섹션 상태 초기화
-                st.session_state.rag_sections = []
-                st.session_state.rag_index = None
-                st.session_state.rag_file_sig = None
-
-                if st.button("🧩 RAG 빌드 (PDF 섹션 분할 → 임베딩 색인)"):
-                    # 텍스트 기반 섹션 분할
-                    if not extracted:
+                if file_signature(pdf_bytes) in get_corpus():
+                    st.caption("이미 코퍼스에 있는 문서입니다. (다시 빌드해도 재임베딩 없음)")
+
+                if st.button("🧩 RAG 빌드 (PDF 섹션 분할 → 임베딩 색인 → 코퍼스 추가)"):
+                    if not (extracted or any(pt.digest for pt in st.session_state.pdf_pages)):
                         st.error("PDF 텍스트 추출에 실패했습니다.")
                     else:
-                        sections = naive_split_sections(extracted)
-                        if not sections:
-                            st.error("섹션을 생성하지 못했습니다.")
-                        else:
-                            sig, index = ensure_rag_index(pdf_bytes, sections)
-                            st.session_state.rag_sections = sections
-                            st.session_state.rag_index = index
-                            st.session_state.rag_file_sig = sig
-                            st.success(f"RAG 빌드 완료: {len(sections)}개 섹션, 임베딩 {index['emb'].shape}")
+                        # 백그라운드 작업으로 제출 → 페이지는 멈추지 않고, 빌드 중에도 기존 색인으로 대화 가능
+                        # (업로드 시 이미 추출한 페이지가 있으면 그대로 넘겨 재추출 생략)
+                        sig = file_signature(pdf_bytes)
+                        pages = st.session_state.pdf_pages if st.session_state.pdf_pages_sig == sig else None
+                        job = get_job_manager().submit(
+                            uploaded_file.name, sig, build_document_job, pdf_bytes, uploaded_file.name, pages,
+                            int(chunk_tokens), int(chunk_overlap), get_section_cache(), get_corpus(), get_index_registry(),
+                            get_ocr_cache())
+                        if job.id not in st.session_state.rag_jobs:
+                            st.session_state.rag_jobs.append(job.id)
+                        st.info("백그라운드 빌드를 시작했습니다. 완료되면 검색 대상에 자동으로 추가됩니다.")
 
             # 가이드
             if pdfplumber is None:
                 st.info("PDF 텍스트 추출을 사용하려면 `pip install pdfplumber` 후 앱을 재시작하세요.")
-            if pytesseract is None or Image is None:
+            if not (ocr_available() and OCR_LANG):
                 st.info("이미지 OCR을 사용하려면 `pip install pillow pytesseract` + Tesseract 설치 필요")
 
+        # 3) 백그라운드 빌드 작업: 완료된 문서를 검색 대상에 반영(multiselect 위젯 생성 전) → 진행률/취소 패널
+        for job_id in st.session_state.rag_jobs:
+            job = get_job_manager().get(job_id)
+            if job is not None and job.status == "done" and job_id not in st.session_state.rag_jobs_applied:
+                st.session_state.rag_jobs_applied.add(job_id)
+                if "doc_id" in job.result and job.result["doc_id"] not in st.session_state.rag_docs:
+                    st.session_state.rag_docs = st.session_state.rag_docs + [job.result["doc_id"]]
+        render_build_jobs()
+
+        # 4) 문서 코퍼스: 여러 PDF 중 검색 대상 선택 / 삭제 (업로드와 무관하게 유지)
+        corpus = get_corpus()
+        if len(corpus):
+            st.markdown(f"**📚 문서 코퍼스** ({len(corpus)}개)")
+            names = corpus.names()
+            st.session_state.rag_docs = [d for d in st.session_state.rag_docs if d in corpus]
+            st.multiselect("검색 대상 문서", options=list(names), key="rag_docs",
+                           format_func=lambda d: f"{names[d]} ({corpus.docs[d]['n_sections']}섹션)")
+            with st.spinner("선택 문서 색인 준비 중..."):
+                st.session_state.rag_corpus_key, st.session_state.rag_index = open_corpus_index(st.session_state.rag_docs)
+            index = st.session_state.rag_index
+            if index is not None:
+                store = index["exact"].store
+                registry = get_index_registry()
+                if st.session_state.rag_corpus_key != selection_key(st.session_state.rag_docs):
+                    st.caption("선택 문서 병합 중 — 완료될 때까지 이전 선택의 색인으로 검색합니다.")
+                st.caption(f"검색 색인: {len(st.session_state.rag_docs)}개 문서, 임베딩 {store.shape} {store.dtype} "
+                           f"({store.nbytes/1e6:.1f} MB) · 공유 색인 {len(registry)}개 · mmap {registry.mapped_bytes()/1e6:.1f} MB")
+                if index.get("ann") is not None:
+                    ann = index["ann"]
+                    # 재실행마다 재측정하지 않도록 공유 색인 dict에 (k, nprobe)별로 보관
+                    rec = index.setdefault("recall", {}).get((int(top_k), int(nprobe)))
+                    if rec is None:
+                        rec = index["recall"][(int(top_k), int(nprobe))] = self_recall(ann, k=int(top_k), nprobe=int(nprobe) or None)
+                    st.caption(f"IVF 색인: 군집 {ann.nlist}개, nprobe {int(nprobe) or ann.nprobe} · recall@{int(top_k)} vs exact ≈ {rec:.3f}")
+            with st.expander("문서 삭제"):
+                victim = st.selectbox("삭제할 문서", options=list(names), format_func=lambda d: names[d])
+                if st.button("🗑️ 코퍼스에서 삭제", disabled=victim is None):
+                    remove_document(victim)
+                    st.rerun()
+
         st.divider()
 
         # 최근 응답 KPI/원시 요약
-        df = pd.DataFrame(st.session_state.logs)
-        turns = len(df)
-        avg_ms = int(df["t_ms"].mean()) if turns else 0
-        total_chars = int(df["chars_out"].sum()) if turns else 0
+        # 누적 집계에서 바로 읽음 (기록이 쌓여도 DataFrame을 만들지 않음)
+        kpi = get_log_store().kpis(st.session_state.session_id)
+        last = get_log_store().last(st.session_state.session_id)
+        turns, avg_ms, total_chars = kpi["turns"], kpi["avg_ms"], kpi["chars_out"]
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Turns", turns)
         c2.metric("Avg Latency(ms)", avg_ms)
         c3.metric("Out Chars", total_chars)
 
-        if turns:
+        if last:
             st.caption("최근 응답 요약")
             st.json({
-                "answer": df.iloc[-1]["answer"],
-                "elapsed_ms": df.iloc[-1]["t_ms"],
-                "model": df.iloc[-1]["model"],
-                "domain": df.iloc[-1]["domain"],
+                "answer": last["answer"],
+                "elapsed_ms": last["t_ms"],
+                "model": last["model"],
+                "domain": last["domain"],
             })
 
     with col_left:
@@ -387,85 +611,152 @@ with tab_chat:
             # ── 프롬프트 합성: [SYSTEM] + [RAG] + [CONTEXT] + [USER] ───────────
             rag_block = ""
             retrieved_items = []
-            if use_rag and st.session_state.rag_index is not None and st.session_state.rag_sections:
-                retrieved_items = retrieve_sections(prompt, st.session_state.rag_index, st.session_state.rag_sections, k=top_k)
+            packed_items = []
+            rag_tok = ctx_tok = 0
+            t_submit = time.perf_counter()          # 첫 토큰까지 시간(TTFT)은 검색 포함, 질문 입력 시점부터
+            t_retrieve_ms = None
+            qinfo: Dict[str, Any] = {}              # 캐시 적중 여부 (embed_hit / result_hit)
+            if use_rag and st.session_state.rag_index is not None:
+                retrieved_items = retrieve_cached(prompt, st.session_state.rag_index, k=top_k, mode=rag_mode, info=qinfo)
+                t_retrieve_ms = round((time.perf_counter() - t_submit) * 1000, 1)
                 if retrieved_items:
-                    # 길이 제한 내에서 정리
-                    pieces = []
-                    acc_len = 0
-                    limit = int(rag_ctx_limit)
-                    for it in retrieved_items:
-                        head = f"### {it['title']} (sec:{it['section_id']}{', p.'+str(it['page']) if it['page'] else ''})\n"
-                        body = it["content"].strip()
-                        chunk_text = head + body + "\n"
-                        if acc_len + len(chunk_text) > limit:
-                            chunk_text = (head + body)[: max(0, limit-acc_len)] + "\n...[truncated]"
-                            pieces.append(chunk_text)
-                            break
-                        pieces.append(chunk_text)
-                        acc_len += len(chunk_text)
-                    rag_block = "\n[RAG]\n" + "\n---\n".join(pieces) + "\n"
+                    # 토큰 예산 내에서 점수순으로 채움 (겹침 줄 제거, 문장 경계 절단)
+                    body, rag_tok, packed_items = pack_sections(
+                        retrieved_items, int(rag_tok_budget) or context_budget(plan_model), plan_model,
+                        header_fn=lambda it: f"### {it['title']} ({it['doc_name'] + ', ' if it.get('doc_name') else ''}"
+                                             f"sec:{it['section_id']}{', ' + page_label(it) if it['page'] else ''})\n",
+                    )
+                    if body:
+                        rag_block = "\n[RAG]\n" + body + "\n"
 
             context_block = ""
             if use_uploaded and st.session_state.upload_text.strip():
-                ctx = st.session_state.upload_text.strip()
-                if len(ctx) > ctx_limit:
-                    ctx = ctx[:ctx_limit] + "\n...[truncated]"
+                full_ctx = st.session_state.upload_text.strip()
+                ctx, ctx_tok = trim_to_tokens(full_ctx, int(ctx_tok_budget), plan_model)
+                if ctx != full_ctx:
+                    ctx += TRUNC_MARK
                 context_block = f"\n[CONTEXT]\n{ctx}\n"
 
             composed = f"[SYSTEM]\n{sys_prompt}{rag_block}{context_block}\n[USER]\n{prompt}"
+            prompt_tok = count_tokens(composed, plan_model)   # 로컬 토크나이저 기준 입력 토큰
+            # 프롬프트 조립 = 섹션 패킹 + 컨텍스트 절단 + 토큰 계산 (검색 시간 제외)
+            t_prompt_ms = round((time.perf_counter() - t_submit) * 1000 - (t_retrieve_ms or 0), 1)
 
             # ── 호출
             start = time.perf_counter()
+            t_first = None
+            cached = ans_scope = qvec = None
+            timing = {}                         # API 호출 구간 지연/토큰 (캐시 적중이면 비어 있음)
             try:
-                if streaming:
+                if use_answer_cache:
+                    # 답변을 바꾸는 조건: 모델/temperature/시스템 프롬프트 + 실제로 넣은 섹션(잘린 길이 포함) + [CONTEXT]
+                    ctx_ids = [[it["doc_id"], it["section_id"], it["tokens"], text_hash(it["content"])] for it in packed_items]
+                    if context_block:
+                        ctx_ids.append(text_hash(context_block))
+                    ans_scope = answer_scope(model, temperature, sys_prompt, ctx_ids)
+                    if answer_sim < 1.0:
+                        qvec = embed_query(prompt)      # dense/hybrid 검색에서 이미 계산했으면 LRU 적중
+                    cached = get_answer_cache().get(ans_scope, prompt, qvec, answer_sim)
+                # auto: 캐시에 없을 때만 라우터가 모델 선택 (질문 + RAG/CONTEXT 포함 프롬프트 크기 기준)
+                route = (get_router().route(prompt, prompt_tokens=prompt_tok, slo_ms=slo_s * 1000)
+                         if model == AUTO and not cached else None)
+                if cached:
+                    answer = cached["answer"]
                     with st.chat_message("assistant"):
-                        placeholder = st.empty()
-                        chunks = []
-                        with client.responses.stream(
-                            model=model,
-                            input=composed,
-                            temperature=temperature,
-                        ) as stream:
-                            for event in stream:
-                                if event.type == "response.output_text.delta":
-                                    chunks.append(event.delta)
-                                    placeholder.markdown("".join(chunks))
-                            stream.until_done()
-                        answer = "".join(chunks) or "(응답 없음)"
+                        t_first = time.perf_counter()
+                        st.markdown(answer)
+                        st.caption(f"⚡ 캐시된 답변 ({'정확 일치' if cached['kind'] == 'exact' else '유사 질문'}"
+                                   f"{'' if cached['kind'] == 'exact' else ', 유사도 ' + str(cached['similarity'])}) · "
+                                   f"원래 질문: {cached['question']}")
+                elif streaming:
+                    with st.chat_message("assistant"):
+                        placeholder = st.empty()        # 폴백하면 같은 자리에 다시 그림
+
+                        def ask(m: str) -> StreamRenderer:
+                            renderer = StreamRenderer(placeholder)   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
+                            with client.responses.stream(
+                                model=m,
+                                input=composed,
+                                temperature=temperature,
+                            ) as stream:
+                                renderer.consume(stream)
+                                stream.until_done()
+                            return renderer
+
+                        renderer = get_router().run(route, ask) if route else ask(model)
+                        t_first = renderer.t_first
+                        answer = renderer.text or "(응답 없음)"
+                        st.caption(renderer.summary())
+                    timing = stream_fields(renderer)
                 else:
-                    resp = client.responses.create(model=model, input=composed, temperature=temperature)
+                    def ask(m: str):
+                        return client.responses.create(model=m, input=composed, temperature=temperature)
+
+                    t_request = time.perf_counter()
+                    resp = get_router().run(route, ask) if route else ask(model)
                     answer = getattr(resp, "output_text", None) or str(resp)
+                    timing = response_fields(resp, t_request, time.perf_counter())
                     with st.chat_message("assistant"):
                         st.markdown(answer)
+                if route:
+                    st.caption(f"🧭 auto → {route.model}" + (f" (폴백: {', '.join(route.fallbacks)})" if route.fallbacks else "")
+                               + f" · {route.reason}")
 
                 dur_ms = int((time.perf_counter() - start) * 1000)
+                ttft_ms = int(((t_first or time.perf_counter()) - t_submit) * 1000)   # 비스트리밍은 전체 응답 시점
+                if ans_scope is not None and not cached and answer != "(응답 없음)":
+                    get_answer_cache().put(ans_scope, prompt, answer, qvec, gen_ms=dur_ms,
+                                           model=route.model if route else model)
                 st.session_state.messages.append({"role": "assistant", "content": answer})
-                st.session_state.logs.append({
+                row = {
                     "ts": dt.datetime.now().isoformat(timespec="seconds"),
-                    "model": model,
+                    "model": route.model if route else (cached and cached["model"]) or model,   # 실제로 답한 모델
                     "domain": domain,
                     "temp": temperature,
                     "chars_in": len(prompt),
                     "chars_out": len(answer),
                     "t_ms": dur_ms,
-                    "tok_in": None,
-                    "tok_out": None,
+                    "tok_prompt": prompt_tok,
+                    "tok_rag": rag_tok,
+                    "tok_ctx": ctx_tok,
+                    "rag_mode": rag_mode if t_retrieve_ms is not None else "off",
+                    "t_retrieve_ms": t_retrieve_ms,
+                    "t_prompt_ms": t_prompt_ms,
+                    "ttft_ms": ttft_ms,
+                    "t_call_ms": timing.get("t_call_ms"),
+                    "t_wait_ms": timing.get("t_wait_ms"),
+                    "t_gen_ms": timing.get("t_gen_ms"),
+                    "t_close_ms": timing.get("t_close_ms"),
+                    "tok_in": timing.get("tok_in"),
+                    "tok_out": timing.get("tok_out"),
+                    "tok_s": timing.get("tok_s"),
+                    "qcache": "result" if qinfo.get("result_hit") else "embed" if qinfo.get("embed_hit") else
+                              ("miss" if t_retrieve_ms is not None else None),
+                    "answer_cache": cached["kind"] if cached else ("miss" if ans_scope is not None else None),
+                    **(route.log_fields() if route else {}),     # route_class, route_model, route_est_ms, ...
                     "answer": answer,
                     "question": prompt,
-                })
+                }
+                get_log_store().append(st.session_state.session_id, APP_NAME, row)
+                get_router().observe(row)   # 모델별 롤링 지연/처리량 갱신 (캐시 적중 턴은 건너뜀)
 
                 # RAG 매칭 결과 표로 표시
                 if retrieved_items:
-                    st.markdown("**🔎 RAG 매칭 섹션 (유사도 높은 순)**")
+                    st.markdown(f"**🔎 RAG 매칭 섹션 ({rag_mode}, 점수 높은 순)** · 검색 {t_retrieve_ms} ms · 첫 토큰 {ttft_ms} ms · "
+                                f"프롬프트 {prompt_tok} 토큰 (RAG {rag_tok} / CONTEXT {ctx_tok})")
+                    packed = {(it["doc_id"], it["section_id"]): it for it in packed_items}   # 섹션 id는 문서마다 겹칠 수 있음
                     show = []
                     for it in retrieved_items:
+                        p = packed.get((it["doc_id"], it["section_id"]))
                         show.append({
                             "score": round(it["score"], 4),
                             "section_id": it["section_id"],
                             "title": it["title"],
-                            "page": it["page"],
+                            "doc": it.get("doc_name") or "",
+                            "page": page_label(it),
                             "chars": len(it["content"]),
+                            "tokens": p["tokens"] if p else 0,
+                            "packed": ("일부" if p["truncated"] else "포함") if p else "제외",
                         })
                     st.dataframe(pd.DataFrame(show), use_container_width=True)
 
@@ -474,24 +765,30 @@ with tab_chat:
                     st.error(f"OpenAI 호출 실패: {e}")
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 7-2) Logs
+# 6-2) Logs
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_logs:
     st.subheader("대화 로그")
-    df = pd.DataFrame(st.session_state.logs)
+    df = pd.DataFrame(get_log_store().recent(st.session_state.session_id))   # 최근 RECENT_ROWS개만
     if df.empty:
         st.warning("아직 로그가 없습니다. Chat 탭에서 대화를 시작하세요.")
     else:
         st.dataframe(df, use_container_width=True)
         csv = df.to_csv(index=False).encode("utf-8")
         st.download_button("CSV로 다운로드", data=csv, file_name="chat_logs.csv", mime="text/csv")
+        st.caption(f"최근 {len(df)}개 표시 (세션 전체 {get_log_store().kpis(st.session_state.session_id)['turns']}턴은 "
+                   f"{LOG_DB}에 보관)")
+        if st.button("세션 전체 기록 CSV 준비"):
+            full = pd.DataFrame(get_log_store().session_rows(st.session_state.session_id))
+            st.download_button("전체 CSV 다운로드", data=full.to_csv(index=False).encode("utf-8"),
+                               file_name="chat_logs_full.csv", mime="text/csv")
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 7-3) Charts
+# 6-3) Charts
 # ──────────────────────────────────────────────────────────────────────────────
 with tab_charts:
     st.subheader("세션 지표 시각화 (Plotly)")
-    df = pd.DataFrame(st.session_state.logs)
+    # Logs 탭에서 만든 최근 RECENT_ROWS개 DataFrame 재사용
     if df.empty:
         st.info("시각화할 로그가 없습니다.")
     else:
@@ -504,8 +801,54 @@ with tab_charts:
         fig2.update_layout(title="출력 길이(문자 수)", xaxis_title="Turn", yaxis_title="chars_out")
         st.plotly_chart(fig2, use_container_width=True)
 
+        # 검색 모드별 첫 토큰까지 시간(TTFT) / 검색 시간 평균
+        if "ttft_ms" in df:
+            by_mode = df.groupby("rag_mode")[["ttft_ms", "t_retrieve_ms"]].mean().reset_index()
+            fig3 = go.Figure([
+                go.Bar(name="TTFT(ms)", x=by_mode["rag_mode"], y=by_mode["ttft_ms"]),
+                go.Bar(name="검색(ms)", x=by_mode["rag_mode"], y=by_mode["t_retrieve_ms"]),
+            ])
+            fig3.update_layout(title="검색 모드별 평균 첫 토큰 시간 / 검색 시간", barmode="group", yaxis_title="ms")
+            st.plotly_chart(fig3, use_container_width=True)
+
+        # 지연 분해(검색 / 프롬프트 조립 / 첫 토큰 대기 / 생성 / 종료) · p50/p95 · 처리량
+        st.markdown("**지연 백분위(ms)**")
+        st.dataframe(percentile_table(df), use_container_width=True)
+        for fig in (breakdown_figure(df), throughput_figure(df)):
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+
+        # 모델 라우팅 (auto): 턴별 결정 · 난이도별 답변 모델
+        routed = routing_table(df)
+        if not routed.empty:
+            st.markdown("**모델 라우팅 결정 (auto)**")
+            st.dataframe(routed, use_container_width=True)
+            st.plotly_chart(routing_figure(df), use_container_width=True)
+
+    # 라우터가 보는 모델별 롤링 통계 (프로세스 전역 — 모든 세션 합산)
+    st.markdown("**모델별 최근 지연/처리량 (라우터 기준)**")
+    st.dataframe(pd.DataFrame(get_router().snapshot()).set_index("model"), use_container_width=True)
+
+    # 질의 캐시 적중률 / 절약 시간 (프로세스 전역 — 모든 세션 합산)
+    st.markdown("**질의 캐시**")
+    qs, rs = get_query_cache().stats(), get_result_cache().stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("임베딩 캐시 적중률", f"{qs['hit_rate']:.0%}", help=f"hit {qs['hits']} / miss {qs['misses']} · {qs['size']}개 보관")
+    c2.metric("임베딩 절약(ms)", f"{qs['saved_ms']:,.0f}")
+    c3.metric("검색 결과 캐시 적중률", f"{rs['hit_rate']:.0%}", help=f"hit {rs['hits']} / miss {rs['misses']} · {rs['size']}개 보관")
+    c4.metric("검색 절약(ms)", f"{rs['saved_ms']:,.0f}")
+
+    st.markdown("**답변 캐시**")
+    ans = get_answer_cache().stats()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("답변 캐시 적중률", f"{ans['hit_rate']:.0%}",
+              help=f"정확 {ans['hits_exact']} / 유사 {ans['hits_semantic']} / miss {ans['misses']} · {ans['size']}개 보관")
+    c2.metric("생성 절약(ms)", f"{ans['saved_ms']:,.0f}")
+    if c3.button("답변 캐시 비우기"):
+        get_answer_cache().clear()
+
 # ──────────────────────────────────────────────────────────────────────────────
-# 8) 보안/배포 메모
+# 7) 보안/배포 메모
 # ──────────────────────────────────────────────────────────────────────────────
 with st.expander("🔒 보안/배포 체크리스트", expanded=False):
     st.markdown("""
@@ -0,0 +1,125 @@
+# 06_app_analytics_dashboard.py
+# 전체 세션 대화 로그 분석 대시보드
+# - 02/03/04 대시보드가 LogStore(.chat_logs/chat_logs.sqlite)에 남긴 모든 세션 기록을 읽음
+# - 시간 구간별 지연 p50/p95(이동 평균), 모델/도메인별 처리량, 비용 추정
+# - 기록은 TurnFrame(st.cache_resource)에 1번 읽어 두고, 재실행 때는 새로 추가된 행만 읽음
+# 실행: streamlit run 06_app_analytics_dashboard.py
+
+import sys, pathlib
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.log_store import LOG_DB
+from common.log_analytics import (BUCKETS, PRICES_PER_1M, TurnFrame, add_cost, cost_by_period, group_summary,
+                                  latency_percentiles, pick_bucket, rolling_percentiles)
+
+st.set_page_config(page_title="Chat Analytics", page_icon="📊", layout="wide")
+st.title("📊 Chat Analytics (전체 세션 로그)")
+
+@st.cache_resource
+def get_turn_frame(path: str) -> TurnFrame:
+    """전체 기록 DataFrame — 프로세스 전역, 재실행마다 증분 갱신"""
+    return TurnFrame(pathlib.Path(path))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 사이드바: 데이터 위치 / 기간 / 필터
+# ──────────────────────────────────────────────────────────────────────────────
+PERIODS = {"최근 1시간": "1h", "최근 24시간": "1D", "최근 7일": "7D", "최근 30일": "30D", "전체": None}
+
+with st.sidebar:
+    st.header("⚙️ 설정")
+    db_path = st.text_input("로그 DB 경로", value=str(LOG_DB), help="02/03/04 대시보드를 실행한 폴더 기준")
+    period = st.selectbox("기간", list(PERIODS), index=2)
+    bucket_opt = st.selectbox("시간 구간", ["자동"] + BUCKETS, help="자동: 그래프 점이 너무 많지 않도록 기간에 맞춰 선택")
+    smooth = st.slider("이동 평균(구간 수)", 1, 24, 3)
+    if st.button("🔄 새로 읽기"):
+        st.cache_resource.clear()       # 증분이 아니라 처음부터 다시 읽기 (DB 교체/삭제 후)
+
+tf = get_turn_frame(db_path)
+if not pathlib.Path(db_path).exists():
+    st.info(f"로그 DB가 없습니다: {db_path} — 02/03/04 대시보드에서 대화를 먼저 진행하세요.")
+    st.stop()
+
+all_df = tf.refresh()
+if all_df.empty:
+    st.info("아직 기록이 없습니다.")
+    st.stop()
+
+# ── 필터 (벡터 마스크)
+mask = pd.Series(True, index=all_df.index)
+if PERIODS[period]:
+    mask &= all_df["ts"] >= all_df["ts"].max() - pd.Timedelta(PERIODS[period])
+with st.sidebar:
+    apps = st.multiselect("앱", list(all_df["app"].cat.categories), default=list(all_df["app"].cat.categories))
+    models = st.multiselect("모델", list(all_df["model"].cat.categories), default=list(all_df["model"].cat.categories))
+mask &= all_df["app"].isin(apps) & all_df["model"].isin(models)
+df = add_cost(all_df[mask])
+if df.empty:
+    st.warning("선택한 조건에 맞는 기록이 없습니다.")
+    st.stop()
+
+bucket = pick_bucket(df["ts"].min(), df["ts"].max()) if bucket_opt == "자동" else bucket_opt
+st.caption(f"전체 {len(all_df):,}행 중 {len(df):,}행 · 메모리 {tf.memory_mb():.1f} MB · "
+           f"마지막 읽기 {tf.load_s * 1000:.0f} ms · 구간 {bucket}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) KPI
+# ──────────────────────────────────────────────────────────────────────────────
+c1, c2, c3, c4, c5 = st.columns(5)
+c1.metric("Turns", f"{len(df):,}")
+c2.metric("Sessions", f"{df['session'].nunique():,}")
+c3.metric("Latency p50 / p95 (ms)", f"{df['t_ms'].median():,.0f} / {df['t_ms'].quantile(0.95):,.0f}")
+c4.metric("TTFT p50 (ms)", f"{df['ttft_ms'].median():,.0f}" if df["ttft_ms"].notna().any() else "-")
+c5.metric("비용 추정 (USD)", f"{df['cost_usd'].sum():,.2f}",
+          help="usage(토큰)가 기록된 턴만, 단가: common/model_router.py PRICES_PER_1M")
+
+tab_latency, tab_models, tab_cost = st.tabs(["⏱️ 지연", "🤖 모델/도메인", "💰 비용"])
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 지연: 구간별 p50/p95 (이동 평균)
+# ──────────────────────────────────────────────────────────────────────────────
+with tab_latency:
+    pct = rolling_percentiles(latency_percentiles(df, bucket), smooth)
+    fig = go.Figure([go.Scatter(x=pct.index, y=pct[c], mode="lines", name=c)
+                     for c in pct.columns if c != "turns"])
+    fig.update_layout(title=f"지연 백분위 ({bucket} 구간, {smooth}구간 이동 평균)", yaxis_title="ms")
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = go.Figure(go.Bar(x=pct.index, y=pct["turns"]))
+    fig.update_layout(title=f"구간별 턴 수 ({bucket})", yaxis_title="turns")
+    st.plotly_chart(fig, use_container_width=True)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 4) 모델 / 도메인별 처리량
+# ──────────────────────────────────────────────────────────────────────────────
+with tab_models:
+    by_model = group_summary(df, "model")
+    st.markdown("**모델별**")
+    st.dataframe(by_model, use_container_width=True)
+    fig = go.Figure([
+        go.Bar(name="tok/s p50", x=by_model.index.astype(str), y=by_model["tok/s p50"], yaxis="y"),
+        go.Scatter(name="t_ms p95", x=by_model.index.astype(str), y=by_model["t_ms p95"], yaxis="y2", mode="markers"),
+    ])
+    fig.update_layout(title="모델별 처리량(tok/s) / 지연 p95", yaxis_title="tok/s",
+                      yaxis2=dict(title="ms", overlaying="y", side="right"))
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("**도메인별**")
+    st.dataframe(group_summary(df, "domain"), use_container_width=True)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 5) 비용 추정
+# ──────────────────────────────────────────────────────────────────────────────
+with tab_cost:
+    cost_bucket = bucket if bucket in ("1D", "7D") else "1h" if bucket in ("1min", "5min", "15min") else "1D"
+    cost = cost_by_period(df, cost_bucket)
+    fig = go.Figure([go.Bar(name=str(m), x=cost.index, y=cost[m]) for m in cost.columns])
+    fig.update_layout(title=f"모델별 비용 추정 ({cost_bucket} 구간)", barmode="stack", yaxis_title="USD")
+    st.plotly_chart(fig, use_container_width=True)
+    unknown = sorted(set(df["model"].unique()) - set(PRICES_PER_1M))
+    if unknown:
+        st.caption(f"단가표에 없는 모델(비용 제외): {', '.join(unknown)}")
+    st.dataframe(pd.DataFrame(PRICES_PER_1M, index=["입력 $/1M", "출력 $/1M"]).T, use_container_width=True)
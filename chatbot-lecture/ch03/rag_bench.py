@@ -0,0 +1,512 @@
+# rag_bench.py
+# RAG 검색 구성요소 오프라인 벤치마크 (OpenAI 호출 없이 합성 임베딩 사용)
+# 사용 예)
+#   python rag_bench.py ann --n 20000 --dim 1536 --k 4
+#   python rag_bench.py store --n 20000 --dim 1536 --k 4
+#   python rag_bench.py registry --n 20000 --sessions 50
+#   python rag_bench.py embed --sections 5000 --workers 1 4 8 --rate-429 0.05
+#   python rag_bench.py extract manual.pdf --workers 1 2 4 8   (스캔 PDF: --ocr)
+#   python rag_bench.py chunk --pages 3000            (또는 --pdf manual.pdf)
+#   python rag_bench.py lexical --sections 5000 --embed-latency-ms 150
+#   python rag_bench.py corpus --docs 1 10 100 --sections-per-doc 200
+#   python rag_bench.py lookup --pages 3000
+#   python rag_bench.py ocr scans/ --workers 1 2 4
+import argparse, os, pathlib, sys, tempfile, time
+import numpy as np
+from rag_index import (STORE_DTYPES, EmbeddingStore, ExactIndex, IVFIndex, IndexRegistry,
+                       make_index, normalize, recall_at_k, registry_key, search_index, use_ann)
+from rag_embed import embed_texts, pack_batches
+from rag_extract import PageText, iter_pdf_pages
+from rag_chunk import CHUNK_OVERLAP, CHUNK_TOKENS, chunk_pages, naive_split_sections
+from rag_lexical import RAG_MODES, BM25Index, CAND_MULT, fuse_scores
+from rag_corpus import merge_shards, open_shard, save_shard
+from rag_store import SectionTable
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))   # chatbot-lecture/common
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 합성 데이터: 실제 문서 임베딩처럼 몇 개의 주제(군집) 주변에 모인 벡터
+# ──────────────────────────────────────────────────────────────────────────────
+def synthetic_embeddings(n: int, dim: int, n_topics: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, size=n)
+    return topics[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+
+def synthetic_queries(emb: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    base = emb[rng.choice(len(emb), size=n_queries, replace=n_queries > len(emb))]  # 문서보다 질의가 많으면 중복 허용
+    return base + 0.3 * rng.normal(size=base.shape).astype(np.float32)
+
+class LegacyIndex:
+    """기존 retrieve_sections 경로: 질의마다 전체 행렬 재정규화 + 전체 argsort"""
+    def __init__(self, emb: np.ndarray):
+        self.emb = emb
+
+    def search(self, qv: np.ndarray, k: int):
+        sims = np.dot(normalize(qv.reshape(1, -1)), normalize(self.emb).T).ravel()
+        top = np.argsort(-sims)[:k]
+        return top, sims[top]
+
+def time_queries(index, queries: np.ndarray, k: int, **kw) -> float:
+    """질의당 평균 ms"""
+    t0 = time.perf_counter()
+    for q in queries:
+        index.search(q, k, **kw)
+    return (time.perf_counter() - t0) * 1000 / len(queries)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ann: exact 전체 스캔 vs IVF 지연시간 / recall@k
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_ann(args):
+    emb = synthetic_embeddings(args.n, args.dim)
+    queries = synthetic_queries(emb, args.queries)
+    exact = ExactIndex(EmbeddingStore.from_embeddings(emb))
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(exact.store)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"N={args.n} dim={args.dim} k={args.k} nlist={ivf.nlist} (IVF build {build_ms:.0f} ms)")
+    print(f"{'backend':<16}{'ms/query':>10}{'recall@k':>10}")
+    print(f"{'exact':<16}{time_queries(exact, queries, args.k):>10.2f}{1.0:>10.3f}")
+    for nprobe in sorted({1, ivf.nprobe // 2 or 1, ivf.nprobe, ivf.nprobe * 2}):
+        ms = time_queries(ivf, queries, args.k, nprobe=nprobe)
+        rec = recall_at_k(ivf, exact, queries, args.k, nprobe=nprobe)
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{ms:>10.2f}{rec:>10.3f}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# store: 기존 경로 vs 사전 정규화 store(float32/float16/int8) + argpartition
+#   - 메모리(MB), 질의당 ms, Top-K 집합 일치율(기존 경로 기준), Top-1 일치율
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_store(args):
+    emb = synthetic_embeddings(args.n, args.dim)
+    queries = synthetic_queries(emb, args.queries)
+    legacy = LegacyIndex(emb)
+    truth = [legacy.search(q, args.k)[0] for q in queries]
+
+    print(f"N={args.n} dim={args.dim} k={args.k}")
+    print(f"{'path':<16}{'MB':>8}{'ms/query':>10}{'top-k agree':>13}{'top-1 agree':>13}")
+    print(f"{'legacy':<16}{emb.nbytes/1e6:>8.1f}{time_queries(legacy, queries, args.k):>10.2f}{1.0:>13.3f}{1.0:>13.3f}")
+    for dtype in STORE_DTYPES:
+        index = ExactIndex(EmbeddingStore.from_embeddings(emb, dtype))
+        ms = time_queries(index, queries, args.k)
+        agree = top1 = 0
+        for q, t in zip(queries, truth):
+            got = index.search(q, args.k)[0]
+            agree += len(set(got.tolist()) & set(t.tolist())) / len(t)
+            top1 += int(got[0] == t[0])
+        n = len(queries)
+        print(f"{dtype:<16}{index.store.nbytes/1e6:>8.1f}{ms:>10.2f}{agree/n:>13.3f}{top1/n:>13.3f}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# registry: 세션 수 증가에 따른 RSS — 세션별 np.load 복사 vs 레지스트리(mmap 공유)
+# ──────────────────────────────────────────────────────────────────────────────
+def rss_mb() -> float:
+    """현재 프로세스 RSS(MB), Linux /proc 기준"""
+    try:
+        pages = int(pathlib.Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except Exception:
+        return float("nan")
+
+def bench_registry(args):
+    emb = synthetic_embeddings(args.n, args.dim)
+    q = synthetic_queries(emb, 1)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = pathlib.Path(tmp)
+        EmbeddingStore.from_embeddings(emb).save(cache_dir, "doc")
+        del emb
+
+        print(f"N={args.n} dim={args.dim} ({args.n * args.dim * 4 / 1e6:.1f} MB float32)")
+        print(f"{'mode':<12}{'sessions':>10}{'RSS MB':>10}")
+        base = rss_mb()
+        sessions = []
+        for i in range(1, args.sessions + 1):
+            store = EmbeddingStore.load(cache_dir, "doc")          # 세션마다 자기 복사본
+            sessions.append(make_index(store, None, []))
+            sessions[-1]["exact"].search(q, 4)
+            if i in (1, args.sessions // 2, args.sessions):
+                print(f"{'np.load':<12}{i:>10}{rss_mb() - base:>10.1f}")
+        sessions.clear()
+
+        registry = IndexRegistry()
+        key = registry_key("doc", "float32", "exact")
+        base = rss_mb()
+        for i in range(1, args.sessions + 1):
+            index = registry.get_or_load(
+                key, lambda: make_index(EmbeddingStore.load(cache_dir, "doc", mmap=True), None, []))
+            sessions.append(index)
+            index["exact"].search(q, 4)
+            if i in (1, args.sessions // 2, args.sessions):
+                print(f"{'registry':<12}{i:>10}{rss_mb() - base:>10.1f}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# embed: 로컬 가짜 임베딩 서버 상대로 워커 수별 빌드 시간 (429 주입 시 재시도 포함)
+#   - 500쪽 PDF ≈ 섹션 5000개 x 약 800자 가정
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_embed(args):
+    from openai import OpenAI
+    from common.mock_openai_server import hash_embedding, start_mock_server
+
+    server, base_url = start_mock_server(latency_ms=args.latency_ms, ms_per_1k_tok=args.ms_per_1k_tok,
+                                         rate_429=args.rate_429)
+    client = OpenAI(api_key="sk-mock", base_url=base_url, max_retries=0)   # 재시도는 rag_embed가 담당
+    rng = np.random.default_rng(0)
+    words = ["계약", "조항", "section", "payment", "보증", "liability", "기간", "notice", "해지", "data"]
+    texts = [f"Section {i}\n" + " ".join(rng.choice(words, size=args.chars // 6)) for i in range(args.sections)]
+    n_batches = len(pack_batches(texts))
+
+    print(f"sections={args.sections} batches={n_batches} latency={args.latency_ms}ms "
+          f"+{args.ms_per_1k_tok}ms/1k tok, 429 rate={args.rate_429}")
+    print(f"{'workers':>8}{'seconds':>10}{'requests':>10}{'429s':>8}{'order ok':>10}")
+    for w in args.workers:
+        server.stats.update({"requests": 0, "429": 0})
+        t0 = time.perf_counter()
+        emb = embed_texts(client, texts, "mock-embed", max_workers=w)
+        sec = time.perf_counter() - t0
+        ok = all(np.allclose(emb[i], hash_embedding(texts[i], emb.shape[1]), atol=1e-5)
+                 for i in range(0, len(texts), max(1, len(texts) // 50)))
+        print(f"{w:>8}{sec:>10.2f}{server.stats['requests']:>10}{server.stats['429']:>8}{str(ok):>10}")
+    server.shutdown()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# extract: 워커(프로세스) 수별 PDF 페이지 추출 시간 / 첫 페이지 도착 시간
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_extract(args):
+    pdf_bytes = pathlib.Path(args.pdf).read_bytes()
+    print(f"{args.pdf} ({len(pdf_bytes)/1e6:.1f} MB)")
+    print(f"{'workers':>8}{'pages':>8}{'first page s':>14}{'total s':>10}{'chars':>12}{'ocr':>6}{'cached':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for w in args.workers:
+            pool = cache = None
+            if args.ocr:     # 텍스트 없는 페이지 OCR (워커 수별 새 캐시 → 두 번째 실행은 캐시 적중)
+                from concurrent.futures import ProcessPoolExecutor
+                from rag_ocr import OCRCache, ocr_pdf_pages
+                pool = ProcessPoolExecutor(max_workers=w) if w > 1 else None
+                cache = OCRCache(pathlib.Path(tmp) / f"ocr-{w}.sqlite")
+            for _ in range(2 if args.ocr else 1):
+                stats = {}
+                t0 = time.perf_counter()
+                first = None
+                n_pages = n_chars = 0
+                stream = iter_pdf_pages(pdf_bytes, workers=w)
+                if args.ocr:
+                    stream = ocr_pdf_pages(pdf_bytes, stream, cache, pool, stats)
+                for pt in stream:
+                    if first is None:
+                        first = time.perf_counter() - t0
+                    n_pages += 1
+                    n_chars += len(pt.text)
+                total = time.perf_counter() - t0
+                print(f"{w:>8}{n_pages:>8}{first or 0:>14.2f}{total:>10.2f}{n_chars:>12}"
+                      f"{stats.get('ocr', 0):>6}{stats.get('cached', 0):>8}")
+            if pool is not None:
+                pool.shutdown()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# chunk: 기존 평문 청커 vs 페이지 인식 청커 처리량 / 청크 크기 분포
+# ──────────────────────────────────────────────────────────────────────────────
+def synthetic_pages(n_pages: int, seed: int = 0):
+    """매뉴얼 비슷한 페이지: 가끔 번호 제목, 한/영 혼합 문장, 제목 없는 긴 구간도 포함"""
+    rng = np.random.default_rng(seed)
+    words = ["설치", "절차", "the", "device", "must", "be", "전원", "확인", "config", "settings", "오류", "발생 시"]
+    pages, h = [], 0
+    for p in range(1, n_pages + 1):
+        lines = []
+        for _ in range(40):
+            if rng.random() < 0.02:
+                h += 1
+                lines.append(f"{h // 10 + 1}.{h % 10} Heading {h}")
+            else:
+                lines.append(" ".join(rng.choice(words, size=12)) + ".")
+        pages.append(PageText(p, "\n".join(lines)))
+    return pages
+
+def size_stats(sections) -> str:
+    from rag_embed import estimate_tokens
+    toks = np.array([estimate_tokens(s["content"]) for s in sections]) if sections else np.zeros(1)
+    paged = sum(1 for s in sections if s.get("page"))
+    return (f"{len(sections):>8}{int(np.percentile(toks, 50)):>7}{int(np.percentile(toks, 95)):>7}"
+            f"{int(toks.max()):>8}{paged / max(1, len(sections)):>8.0%}")
+
+def bench_chunk(args):
+    pages = list(iter_pdf_pages(pathlib.Path(args.pdf).read_bytes())) if args.pdf else synthetic_pages(args.pages)
+    full_text = "\n\n".join(p.text for p in pages if p.text.strip())
+    mb = len(full_text.encode("utf-8")) / 1e6
+    print(f"pages={len(pages)} text={mb:.1f} MB target={args.tokens} overlap={args.overlap} (토큰=추정치)")
+    print(f"{'chunker':<14}{'MB/s':>8}{'chunks':>8}{'p50':>7}{'p95':>7}{'max':>8}{'paged':>8}")
+    runs = [
+        ("naive", lambda: naive_split_sections(full_text)),
+        ("page-aware", lambda: chunk_pages(pages, args.tokens, args.overlap)),
+    ]
+    for name, fn in runs:
+        t0 = time.perf_counter()
+        sections = fn()
+        sec = time.perf_counter() - t0
+        print(f"{name:<14}{mb / sec:>8.1f}{size_stats(sections)}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# lexical: 검색 모드별(dense / hybrid / lexical) 검색 시간(=첫 토큰 전 대기) / hit@k
+#   - 질의 임베딩은 가짜 서버(지연 주입) 호출 → dense/hybrid는 네트워크 왕복 포함
+#   - 질의: 임의 섹션 본문의 연속 단어 몇 개 (정답 = 그 섹션)
+# ──────────────────────────────────────────────────────────────────────────────
+def synthetic_corpus(n_sections: int, words_per_section: int = 120, vocab_size: int = 3000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    syll = [chr(0xAC00 + int(i)) for i in rng.integers(0, 11172, size=vocab_size * 2)]
+    vocab = [syll[2 * i] + syll[2 * i + 1] + ("를" if i % 3 == 0 else "") for i in range(vocab_size // 2)]
+    vocab += [f"term{i}" for i in range(vocab_size - len(vocab))]
+    p = 1.0 / np.arange(1, vocab_size + 1)              # Zipf 비슷한 단어 빈도
+    p /= p.sum()
+    return [" ".join(rng.choice(vocab, size=words_per_section, p=p)) for _ in range(n_sections)]
+
+def bench_lexical(args):
+    from openai import OpenAI
+    from common.mock_openai_server import hash_embedding, start_mock_server
+
+    texts = synthetic_corpus(args.sections)
+    rng = np.random.default_rng(1)
+    truth = rng.choice(len(texts), size=args.queries, replace=False)
+    queries = []
+    for t in truth:
+        words = texts[t].split()
+        s = int(rng.integers(0, len(words) - args.query_words))
+        queries.append(" ".join(words[s:s + args.query_words]))
+
+    t0 = time.perf_counter()
+    bm25 = BM25Index.build(texts)
+    bm25_s = time.perf_counter() - t0
+    store = EmbeddingStore.from_embeddings(np.stack([hash_embedding(t) for t in texts]))
+    index = make_index(store, None, [])
+    print(f"sections={len(texts)} BM25 build {bm25_s:.2f}s, {len(bm25.vocab)} terms, "
+          f"{bm25.nbytes/1e6:.1f} MB · query embed latency {args.embed_latency_ms}ms (mock)")
+
+    server, base_url = start_mock_server(latency_ms=args.embed_latency_ms)
+    client = OpenAI(api_key="sk-mock", base_url=base_url, max_retries=0)
+
+    def embed(q):
+        v = client.embeddings.create(model="mock-embed", input=[q]).data[0].embedding
+        return np.array(v, dtype=np.float32)
+
+    def run(mode, q):
+        if mode == "lexical":
+            return bm25.search(q, args.k)[0]
+        qv = embed(q)
+        if mode == "dense":
+            return index["exact"].search(qv, args.k)[0]
+        n = args.k * CAND_MULT
+        return fuse_scores(index["exact"].search(qv, n), bm25.search(q, n), args.k)[0]
+
+    print(f"{'mode':<10}{'mean ms':>10}{'p95 ms':>10}{f'hit@{args.k}':>10}")
+    for mode in RAG_MODES:
+        lat, hits = [], 0
+        for q, t in zip(queries, truth):
+            t0 = time.perf_counter()
+            rows = run(mode, q)
+            lat.append((time.perf_counter() - t0) * 1000)
+            hits += int(t in rows.tolist())
+        print(f"{mode:<10}{np.mean(lat):>10.1f}{np.percentile(lat, 95):>10.1f}{hits / len(queries):>10.3f}")
+    server.shutdown()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# corpus: 문서 수(1/10/100)별 병합 시간 / 질의 지연시간 (dense exact·auto, lexical)
+#   - 문서마다 샤드를 미리 기록해 두고, 선택 문서 수만 바꿔 병합 → mmap 로드 → 질의
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_corpus(args):
+    n_max = max(args.docs)
+    per = args.sections_per_doc
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = pathlib.Path(tmp)
+        t0 = time.perf_counter()
+        texts = synthetic_corpus(n_max * per)
+        emb = synthetic_embeddings(n_max * per, args.dim)
+        doc_ids = [f"{i:064x}" for i in range(n_max)]
+        for i, d in enumerate(doc_ids):
+            rows = slice(i * per, (i + 1) * per)
+            secs = [{"title": f"Doc {i} Section {j}", "page": None, "section_id": j + 1, "content": t}
+                    for j, t in enumerate(texts[rows])]
+            save_shard(cache_dir, d, emb[rows], SectionTable.from_sections(secs, d, f"doc{i}"))
+        print(f"shards={n_max} x {per} sections, dim={args.dim} (기록 {time.perf_counter() - t0:.1f}s)")
+
+        queries = synthetic_queries(emb[:min(len(emb), per * min(args.docs))], args.queries)
+        words = [t.split()[:4] for t in texts[:args.queries]]
+        print(f"{'docs':>6}{'rows':>8}{'merge s':>9}{'exact ms':>10}{'auto ms':>9}{'backend':>9}{'lexical ms':>12}")
+        for n in args.docs:
+            t0 = time.perf_counter()
+            key = merge_shards(cache_dir, doc_ids[:n])
+            merge_s = time.perf_counter() - t0
+            shard = open_shard(cache_dir, key)
+            store = EmbeddingStore(shard.emb)
+            ann = IVFIndex.build(store) if use_ann(len(store), "auto") else None
+            index = make_index(store, ann, shard.sections)
+            bm25 = shard.lexical
+            exact_ms = time_queries(index["exact"], queries, args.k)
+            t1 = time.perf_counter()
+            for q in queries:
+                search_index(index, q, args.k)
+            auto_ms = (time.perf_counter() - t1) * 1000 / len(queries)
+            t1 = time.perf_counter()
+            for w in words:
+                bm25.search(" ".join(w), args.k)
+            lex_ms = (time.perf_counter() - t1) * 1000 / len(words)
+            print(f"{n:>6}{len(store):>8}{merge_s:>9.2f}{exact_ms:>10.2f}{auto_ms:>9.2f}"
+                  f"{'ivf' if ann is not None else 'exact':>9}{lex_ms:>12.2f}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# lookup: 상위 k개 섹션 꺼내기 (기존 next() 선형 탐색 vs SectionTable 행 접근)
+#         + 재로드 (재청킹 vs .rag 번들 열기)
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_lookup(args):
+    pages = synthetic_pages(args.pages)
+    t0 = time.perf_counter()
+    sections = chunk_pages(pages)
+    chunk_s = time.perf_counter() - t0
+    n = len(sections)
+    table = SectionTable.from_sections(sections, "doc")
+    rng = np.random.default_rng(0)
+    hits = rng.integers(0, n, size=(args.queries, args.k))
+
+    t0 = time.perf_counter()
+    for row in hits:
+        for i in row:
+            sid = sections[i]["section_id"]
+            next(s for s in sections if s["section_id"] == sid)["content"]
+    legacy_us = (time.perf_counter() - t0) * 1e6 / args.queries
+    t0 = time.perf_counter()
+    for row in hits:
+        for i in row:
+            table.row(int(i))
+    table_us = (time.perf_counter() - t0) * 1e6 / args.queries
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = pathlib.Path(tmp)
+        save_shard(cache_dir, "doc", synthetic_embeddings(n, args.dim), table)
+        t0 = time.perf_counter()
+        shard = open_shard(cache_dir, "doc")
+        open_s = time.perf_counter() - t0
+        same = all(shard.sections.content(i) == sections[i]["content"] for i in range(0, n, max(1, n // 200)))
+    print(f"sections={n} (pages={args.pages}), top-{args.k} fetch per query:")
+    print(f"  next() scan      {legacy_us:>10.1f} us")
+    print(f"  SectionTable.row {table_us:>10.1f} us")
+    print(f"reload: re-chunk {chunk_s * 1000:.0f} ms vs open .rag bundle {open_s * 1000:.1f} ms (content ok={same})")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ocr: 스캔 이미지 폴더 처리량 — 기존(원본 이미지 통째로 1회 OCR) vs 파이프라인(워커 수별) vs 캐시 적중
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_ocr(args):
+    from concurrent.futures import ProcessPoolExecutor
+    from rag_ocr import OCRCache, ocr_available, ocr_image, ocr_languages
+    if not ocr_available() or not ocr_languages():
+        sys.exit("Pillow/pytesseract/Tesseract가 필요합니다.")
+    from PIL import Image
+    import pytesseract
+    files = sorted(p for p in pathlib.Path(args.folder).iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg"))
+    if not files:
+        sys.exit(f"이미지가 없습니다: {args.folder}")
+    images = [p.read_bytes() for p in files]
+    lang = ocr_languages()
+    print(f"{args.folder}: {len(images)} images ({sum(map(len, images)) / 1e6:.1f} MB) lang={lang}")
+    print(f"{'run':<16}{'total s':>10}{'img/s':>8}{'tiles':>8}{'chars':>10}")
+
+    def report(name, sec, tiles, texts):
+        print(f"{name:<16}{sec:>10.2f}{len(images) / sec:>8.2f}{tiles:>8}{sum(map(len, texts)):>10}")
+
+    if not args.skip_legacy:
+        t0 = time.perf_counter()
+        texts = [pytesseract.image_to_string(Image.open(pathlib.Path(f)), lang=lang) for f in files]
+        report("legacy", time.perf_counter() - t0, len(images), texts)
+    with tempfile.TemporaryDirectory() as tmp:
+        for w in args.workers:
+            cache = OCRCache(pathlib.Path(tmp) / f"ocr-{w}.sqlite")
+            pool = ProcessPoolExecutor(max_workers=w) if w > 1 else None
+            stats = {}
+            t0 = time.perf_counter()
+            texts = [ocr_image(b, cache=cache, pool=pool, stats=stats) for b in images]
+            report(f"tiled w={w}", time.perf_counter() - t0, stats.get("tiles", 0), texts)
+            if pool is not None:
+                pool.shutdown()
+        stats = {}
+        t0 = time.perf_counter()
+        texts = [ocr_image(b, cache=cache, stats=stats) for b in images]
+        report("cached", time.perf_counter() - t0, 0, texts)
+
+def main():
+    ap = argparse.ArgumentParser(description="RAG 검색 구성요소 벤치마크")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("ann", help="exact vs IVF 지연시간/recall@k")
+    p.add_argument("--n", type=int, default=20000)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_ann)
+
+    p = sub.add_parser("store", help="기존 경로 vs 정규화/양자화 store 지연시간·메모리·순위 일치")
+    p.add_argument("--n", type=int, default=20000)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_store)
+
+    p = sub.add_parser("registry", help="세션 수별 RSS: 세션별 로드 vs 공유 mmap 레지스트리")
+    p.add_argument("--n", type=int, default=20000)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--sessions", type=int, default=50)
+    p.set_defaults(func=bench_registry)
+
+    p = sub.add_parser("embed", help="가짜 임베딩 서버 상대로 배치/동시 임베딩 빌드 시간")
+    p.add_argument("--sections", type=int, default=5000)
+    p.add_argument("--chars", type=int, default=800)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    p.add_argument("--latency-ms", type=float, default=100.0)
+    p.add_argument("--ms-per-1k-tok", type=float, default=20.0)
+    p.add_argument("--rate-429", type=float, default=0.0)
+    p.set_defaults(func=bench_embed)
+
+    p = sub.add_parser("extract", help="워커 수별 PDF 페이지 병렬 추출 시간")
+    p.add_argument("pdf")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--ocr", action="store_true", help="텍스트 없는 페이지 OCR 포함 (2회 실행: OCR / 캐시 적중)")
+    p.set_defaults(func=bench_extract)
+
+    p = sub.add_parser("chunk", help="기존 청커 vs 페이지 인식 청커 처리량/크기 분포")
+    p.add_argument("--pages", type=int, default=3000)
+    p.add_argument("--pdf", default=None)
+    p.add_argument("--tokens", type=int, default=CHUNK_TOKENS)
+    p.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    p.set_defaults(func=bench_chunk)
+
+    p = sub.add_parser("lexical", help="검색 모드별(dense/hybrid/lexical) 검색 시간·hit@k")
+    p.add_argument("--sections", type=int, default=5000)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--query-words", type=int, default=4)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--embed-latency-ms", type=float, default=150.0)
+    p.set_defaults(func=bench_lexical)
+
+    p = sub.add_parser("corpus", help="문서 수별 병합 시간 / 질의 지연시간")
+    p.add_argument("--docs", type=int, nargs="+", default=[1, 10, 100])
+    p.add_argument("--sections-per-doc", type=int, default=200)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--queries", type=int, default=100)
+    p.set_defaults(func=bench_corpus)
+
+    p = sub.add_parser("lookup", help="섹션 조회(선형 탐색 vs 열 저장소) / 재로드 시간")
+    p.add_argument("--pages", type=int, default=3000)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_lookup)
+
+    p = sub.add_parser("ocr", help="스캔 이미지 폴더 OCR 처리량 (기존 vs 띠 분할 병렬 vs 캐시)")
+    p.add_argument("folder")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--skip-legacy", action="store_true")
+    p.set_defaults(func=bench_ocr)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
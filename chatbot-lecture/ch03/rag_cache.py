@@ -0,0 +1,179 @@
+# rag_cache.py
+# 질의 단위 캐시 (02/04 앱에서 st.cache_resource 로 1개씩 보관 → 재실행/세션 간 유지)
+# - 질의 임베딩 캐시   : (임베딩 모델, 정규화 질의) → 벡터  — 정규화 후 같은 질문(대소문자/전각/문장부호/공백 차이)만 embed_query 호출 생략
+# - 검색 결과 캐시(선택): (파일 서명, 검색 설정, 질의 해시, top_k) → 섹션 목록
+# - 답변 캐시(디스크)  : (모델, temperature, 시스템 프롬프트 해시, 검색 섹션 id, 정규화 질문) → 답변
+#                        + 선택: 같은 조건에서 질문 임베딩 코사인 유사도가 임계값 이상이면 재사용
+# - 항목마다 처음 계산에 걸린 ms를 같이 저장 → 적중 시 "절약한 ms"로 합산
+import hashlib, json, pathlib, re, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUERY_CACHE_SIZE = 2048
+RESULT_CACHE_SIZE = 1024
+ANSWER_CACHE_FILE = "answers.sqlite"
+ANSWER_TTL_S = 7 * 24 * 3600        # 답변 보관 기간 (문서/모델이 바뀌면 어차피 키가 달라짐)
+ANSWER_CACHE_MAX = 5000             # 초과 시 가장 오래 안 쓴 답변부터 삭제
+
+PUNCT_RE = re.compile(r"[^\w\s]+")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 질의 정규화 / 해시
+#    - 유니코드 NFKC(전각/반각 통일) → 소문자 → 문장부호 제거 → 공백 정리
+#    - "PDF 설치 절차는?" / "pdf  설치 절차는" / "ＰＤＦ 설치 절차는 ?" → 같은 키
+# ──────────────────────────────────────────────────────────────────────────────
+def normalize_query(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(PUNCT_RE.sub(" ", t).split())
+
+def query_hash(text: str) -> str:
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()[:16]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 크기 제한 LRU (스레드 안전) + 적중률 / 절약 시간 통계
+# ──────────────────────────────────────────────────────────────────────────────
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()   # key → (값, 계산 ms)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(값, 적중 여부) — 미스면 fn() 실행 후 저장 (계산 중엔 잠금을 잡지 않음)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                self.saved_ms += item[1]
+                return item[0], True
+            self.misses += 1
+        t0 = time.perf_counter()
+        value = fn()
+        cost_ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self._items[key] = (value, cost_ms)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value, False
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "saved_ms": round(self.saved_ms, 1)}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 답변 캐시 (SQLite 1파일, 모든 세션/프로세스 공유)
+#    - scope: 답변을 바꾸는 조건(모델, temperature, 시스템 프롬프트, 컨텍스트 섹션 id) 해시
+#    - 정확 일치: scope + 정규화 질문
+#    - 유사 일치(선택): 같은 scope 안에서 질문 임베딩 코사인 ≥ threshold 인 가장 가까운 답변
+#    - 만료(TTL) 항목은 조회에서 제외, 저장 시 정리 / 개수 초과 시 last_hit 오래된 순 삭제(LRU)
+# ──────────────────────────────────────────────────────────────────────────────
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def answer_scope(model: str, temperature: float, system_prompt: str, context_ids: Sequence[Any] = ()) -> str:
+    """context_ids: 프롬프트에 들어간 컨텍스트 식별자 (검색 섹션 id, [CONTEXT] 해시 등) — 순서 유지"""
+    raw = json.dumps([model, round(float(temperature), 3), text_hash(system_prompt), list(context_ids)],
+                     ensure_ascii=False)
+    return text_hash(raw)
+
+class AnswerCache:
+    def __init__(self, path: pathlib.Path, ttl_s: float = ANSWER_TTL_S, max_entries: int = ANSWER_CACHE_MAX):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+            k TEXT PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL,
+            emb BLOB, gen_ms REAL NOT NULL, created REAL NOT NULL, last_hit REAL NOT NULL, model TEXT)""")
+        if "model" not in {r[1] for r in self._conn.execute("PRAGMA table_info(answers)")}:
+            self._conn.execute("ALTER TABLE answers ADD COLUMN model TEXT")    # 이전 형식 파일: 답한 모델 열 추가
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)")
+        self._conn.commit()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def key(scope: str, question: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalize_query(question)}".encode("utf-8")).hexdigest()
+
+    def get(self, scope: str, question: str, qvec: Optional[np.ndarray] = None,
+            threshold: float = 1.0) -> Optional[Dict[str, Any]]:
+        """{"answer", "kind": exact|semantic, "similarity", "question", "gen_ms", "model"} 또는 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT k, question, answer, gen_ms, model FROM answers WHERE k = ? AND created >= ?",
+                                     (self.key(scope, question), now - self.ttl_s)).fetchone()
+            kind, sim = "exact", 1.0
+            if row is None and qvec is not None and threshold < 1.0:
+                row, sim = self._nearest(scope, qvec, now)
+                kind = "semantic"
+                if row is not None and sim < threshold:
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_hit = ? WHERE k = ?", (now, row[0]))
+            self._conn.commit()
+            self.hits[kind] += 1
+            self.saved_ms += row[3]
+        return {"answer": row[2], "kind": kind, "similarity": round(sim, 4), "question": row[1], "gen_ms": row[3],
+                "model": row[4]}
+
+    def _nearest(self, scope: str, qvec: np.ndarray, now: float):
+        rows = self._conn.execute("SELECT k, question, answer, gen_ms, model, emb FROM answers "
+                                  "WHERE scope = ? AND emb IS NOT NULL AND created >= ?",
+                                  (scope, now - self.ttl_s)).fetchall()
+        q = np.asarray(qvec, dtype=np.float32)
+        rows = [r for r in rows if len(r[5]) == q.nbytes]       # 임베딩 모델(차원)이 다른 항목 제외
+        if not rows:
+            return None, 0.0
+        m = np.stack([np.frombuffer(r[5], dtype=np.float32) for r in rows])
+        sims = (m @ q) / (np.linalg.norm(m, axis=1) * np.linalg.norm(q) + 1e-8)
+        best = int(np.argmax(sims))
+        return rows[best][:5], float(sims[best])
+
+    def put(self, scope: str, question: str, answer: str, qvec: Optional[np.ndarray] = None, gen_ms: float = 0.0,
+            model: Optional[str] = None):
+        """model: 실제로 답한 모델 (auto 범위에서 적중해도 로그에 이 모델을 남김)"""
+        now = time.time()
+        emb = np.asarray(qvec, dtype=np.float32).tobytes() if qvec is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO answers (k, scope, question, answer, emb, gen_ms, created, last_hit, model) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (self.key(scope, question), scope, question, answer, emb, gen_ms, now, now, model))
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_s,))
+            over = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if over > 0:
+                self._conn.execute("DELETE FROM answers WHERE k IN "
+                                   "(SELECT k FROM answers ORDER BY last_hit ASC LIMIT ?)", (over,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {"size": size, "hits": hits, **{f"hits_{k}": v for k, v in self.hits.items()}, "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0, "saved_ms": round(self.saved_ms, 1)}
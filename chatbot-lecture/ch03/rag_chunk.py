@@ -0,0 +1,193 @@
+# rag_chunk.py
+# PDF → 섹션 Chunking (04_app_chat_dashboard_rag.py 에서 사용)
+# - naive_split_sections : 기존 방식(평문 전체 기준, page=None) — 비교/호환용
+# - chunk_pages          : 페이지 스트림을 한 번만 훑으며 제목 단위 + 목표 토큰 크기/겹침으로 분할,
+#                          각 섹션에 시작/끝 페이지(page, page_end) 기록
+#                          (줄바꿈 없는 긴 문단은 문장 → 공백/글자 경계로 먼저 나눠서 청크 크기 유지)
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Union
+
+from rag_embed import clip_to_tokens, estimate_tokens
+from rag_extract import PageText
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 제목 패턴 (모듈 로드 시 1회 컴파일)
+# ──────────────────────────────────────────────────────────────────────────────
+HEADING_PATTERNS = [
+    r"^\s*\d+(\.\d+)*\s+.+",          # 1 / 1.1 / 2.3.4 형태
+    r"^\s*[IVXLCM]+\.\s+.+",          # 로마숫자. Title
+    r"^\s*[A-Z][A-Z\s\-:]{4,}$",      # 전부 대문자 계열 제목
+]
+HEADING_RE = re.compile("|".join(HEADING_PATTERNS), flags=re.IGNORECASE)
+SENT_SPLIT_RE = re.compile(r"(?<=[\.\?\!])\s+")
+
+CHUNK_TOKENS = 400          # 섹션(청크) 목표 크기(추정 토큰)
+CHUNK_OVERLAP = 60          # 긴 섹션을 나눌 때 앞 청크 끝부분을 다음 청크에 겹치는 양
+MAX_TITLE_CHARS = 120       # 이보다 긴 줄은 패턴이 맞아도 본문으로 취급
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 기존 방식: 평문 전체 → 제목 단위, 실패 시 문장 슬라이딩 윈도우
+#    - 텍스트 기반 규칙이라 페이지 매핑 불가(page=None)
+# ──────────────────────────────────────────────────────────────────────────────
+def naive_split_sections(source: Union[str, Iterable[PageText]]) -> List[Dict[str, Any]]:
+    """source: 전체 텍스트 또는 페이지 스트림(PageText) — 후자는 페이지가 도착하는 대로 줄 단위 분할"""
+    if isinstance(source, str):
+        full_text = source
+        lines = full_text.splitlines()
+    else:
+        seen = []   # 제목 감지 실패 시 슬라이딩 윈도우용 원문
+        def stream_lines():
+            for pt in source:
+                if pt.text.strip():
+                    seen.append(pt.text)
+                    yield from pt.text.splitlines()
+        lines = stream_lines()
+    sections = []
+    cur_title = "Introduction"
+    cur_buf = []
+    cur_start_page = None  # 텍스트 추출 방식에선 정확 페이지 매핑 어려움 → None 처리
+
+    def flush():
+        if cur_buf:
+            sections.append({
+                "title": cur_title.strip(),
+                "content": "\n".join(cur_buf).strip(),
+                "page": cur_start_page,
+            })
+
+    for ln in lines:
+        if HEADING_RE.match(ln.strip()):
+            # 새 섹션 시작
+            if cur_buf:
+                flush()
+                cur_buf = []
+            cur_title = ln.strip()
+        else:
+            cur_buf.append(ln)
+    # 마지막 섹션 flush
+    flush()
+
+    # 섹션이 너무 적거나 제목 감지가 실패하면, 문장 슬라이딩 윈도우로 분할
+    if len(sections) <= 1:
+        if not isinstance(source, str):
+            full_text = "\n\n".join(seen)
+        sections = []
+        sents = SENT_SPLIT_RE.split(full_text)
+        win = 8              # 문장 8개 정도씩
+        stride = 6           # 겹치게
+        for i in range(0, len(sents), stride):
+            chunk = " ".join(sents[i:i+win]).strip()
+            if len(chunk) > 100:
+                sections.append({
+                    "title": f"Chunk {i//stride+1}",
+                    "content": chunk,
+                    "page": None,
+                })
+    # section_id 부여
+    for idx, s in enumerate(sections, start=1):
+        s["section_id"] = idx
+    return sections
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 페이지 인식 청커 (단일 선형 패스)
+#    - 제목 줄을 만나면 현재 섹션을 닫고 새 섹션 시작
+#    - 본문이 목표 토큰을 넘으면 청크를 내보내고, 끝부분 overlap 토큰만큼 줄을 다음 청크로 이월
+#    - 줄마다 페이지 번호를 같이 들고 다녀서 청크의 시작/끝 페이지를 기록
+#    - 목표 토큰보다 긴 줄은 조각(겹침 크기 정도)으로 나눈 뒤 쌓음 → 한 줄이 청크 1개를 통째로 넘기지 않음
+# ──────────────────────────────────────────────────────────────────────────────
+def split_long_line(line: str, max_tokens: int) -> List[str]:
+    """max_tokens 이하 조각들로 분할: 문장 경계 우선, 문장 하나가 넘치면 마지막 공백(없으면 글자)에서 자름"""
+    if estimate_tokens(line) <= max_tokens:
+        return [line]
+    pieces, cur = [], ""
+    for sent in SENT_SPLIT_RE.split(line):
+        while estimate_tokens(sent) > max_tokens:
+            cut = len(clip_to_tokens(sent, max_tokens))
+            space = sent.rfind(" ", 0, cut)
+            cut = space if space > 0 else max(1, cut)
+            if cur:
+                pieces.append(cur)
+                cur = ""
+            pieces.append(sent[:cut].strip())
+            sent = sent[cut:].strip()
+        joined = f"{cur} {sent}" if cur else sent
+        if cur and estimate_tokens(joined) > max_tokens:
+            pieces.append(cur)
+            cur = sent
+        else:
+            cur = joined
+    if cur:
+        pieces.append(cur)
+    return [p for p in pieces if p]
+
+def chunk_pages(pages: Iterable[PageText], target_tokens: int = CHUNK_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    overlap_tokens = max(0, min(overlap_tokens, target_tokens // 2))
+    piece_tokens = max(1, overlap_tokens, target_tokens // 8)     # 긴 줄을 나눌 조각 크기
+    sections: List[Dict[str, Any]] = []
+    title = "Introduction"
+    part = 1                        # 같은 제목 안에서 몇 번째 청크인지
+    buf: deque = deque()            # (line, tokens, page)
+    buf_tok = 0
+    fresh = 0                       # 이월(overlap) 이후 새로 들어온 줄 수
+
+    def emit():
+        nonlocal part
+        content = "\n".join(ln for ln, _, _ in buf).strip()
+        if content:
+            sections.append({
+                "title": title if part == 1 else f"{title} (cont. {part})",
+                "content": content,
+                "page": buf[0][2],
+                "page_end": buf[-1][2],
+                "n_tokens": buf_tok,
+            })
+            part += 1
+
+    def carry_overlap():
+        """버퍼 끝에서 overlap 토큰만큼만 남기고 앞부분 제거"""
+        nonlocal buf_tok
+        keep = 0
+        for _, n, _ in reversed(buf):
+            if keep + n > overlap_tokens:
+                break
+            keep += n
+        while buf and buf_tok > keep:
+            buf_tok -= buf.popleft()[1]
+
+    for pt in pages:
+        for ln in pt.text.splitlines():
+            stripped = ln.strip()
+            if not stripped:
+                continue
+            if len(stripped) <= MAX_TITLE_CHARS and HEADING_RE.match(stripped):
+                if fresh:
+                    emit()
+                buf.clear()
+                buf_tok = fresh = 0
+                title, part = stripped, 1
+                continue
+            pieces = [stripped] if estimate_tokens(stripped) <= target_tokens else split_long_line(stripped, piece_tokens)
+            for piece in pieces:
+                n = estimate_tokens(piece)
+                buf.append((piece, n, pt.page))
+                buf_tok += n
+                fresh += 1
+                if buf_tok >= target_tokens:
+                    emit()
+                    carry_overlap()
+                    fresh = 0
+    if fresh:
+        emit()
+
+    for idx, s in enumerate(sections, start=1):
+        s["section_id"] = idx
+    return sections
+
+def page_label(sec: Dict[str, Any]) -> str:
+    """'p.3' / 'pp.3-5' / '' (페이지 정보 없음)"""
+    a, b = sec.get("page"), sec.get("page_end")
+    if not a:
+        return ""
+    return f"p.{a}" if not b or b == a else f"pp.{a}-{b}"
@@ -0,0 +1,126 @@
+# rag_context.py
+# 프롬프트 컨텍스트 패킹 (04_app_chat_dashboard_rag.py 의 [RAG] / [CONTEXT] 블록 구성)
+# - 문자 수 대신 실제 토큰 수로 예산 관리 (tiktoken 있으면 사용, 없으면 추정치)
+# - 점수 높은 섹션부터 예산을 채우되, 겹침(overlap) 청크에서 이미 넣은 줄은 제외
+# - 예산을 넘는 섹션은 문장 경계에서 자름
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from rag_embed import clip_to_tokens, estimate_tokens
+
+try:
+    import tiktoken  # 로컬 토크나이저 (pip install tiktoken)
+except Exception:
+    tiktoken = None
+
+# 모델별 [RAG] 블록 기본 토큰 예산 (입력 비용/지연과 답변 품질 사이 절충값)
+MODEL_CONTEXT_BUDGET = {
+    "gpt-4o-mini": 6000,
+    "gpt-4o": 6000,
+    "gpt-4.1": 8000,
+    "gpt-3.5-turbo": 3000,
+}
+DEFAULT_CONTEXT_BUDGET = 4000
+MIN_NEW_RATIO = 0.2         # 겹침 제거 후 새 내용이 이 비율 미만이면 그 청크는 건너뜀
+SENT_RE = re.compile(r"(?<=[\.\?\!。？！])\s+|\n+")
+TRUNC_MARK = "\n...[truncated]"
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 토큰 계산
+# ──────────────────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return estimate_tokens(text) if text else 0
+    return len(enc.encode(text, disallowed_special=()))
+
+def tokenizer_name(model: str) -> str:
+    enc = _encoding(model)
+    return enc.name if enc is not None else "estimate"
+
+def context_budget(model: str) -> int:
+    return MODEL_CONTEXT_BUDGET.get(model, DEFAULT_CONTEXT_BUDGET)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 문장 경계 자르기
+# ──────────────────────────────────────────────────────────────────────────────
+def trim_to_tokens(text: str, budget: int, model: str) -> Tuple[str, int]:
+    """budget 토큰 안에 들어가는 앞부분 문장들만 남김 → (텍스트, 토큰 수)"""
+    if budget <= 0:
+        return "", 0
+    n = count_tokens(text, model)
+    if n <= budget:
+        return text, n
+    out, used = [], 0
+    pos = 0
+    for m in SENT_RE.finditer(text + "\n"):
+        sent = text[pos:m.end()]
+        t = count_tokens(sent, model)
+        if used + t > budget:
+            break
+        out.append(sent)
+        used += t
+        pos = m.end()
+    if not out:     # 첫 문장부터 예산 초과 → 토큰 단위로 강제 절단
+        head = _cut_tokens(text, budget, model)
+        return head, count_tokens(head, model)
+    return "".join(out).rstrip(), used
+
+def _cut_tokens(text: str, budget: int, model: str) -> str:
+    enc = _encoding(model)
+    if enc is None:
+        return clip_to_tokens(text, budget)
+    return enc.decode(enc.encode(text, disallowed_special=())[:budget])
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) [RAG] 블록 패킹
+# ──────────────────────────────────────────────────────────────────────────────
+def pack_sections(items: List[Dict[str, Any]], budget: int, model: str,
+                  header_fn=lambda it: f"### {it['title']}\n") -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    items: retrieve_sections 결과(score, title, content, ...)
+    반환: (블록 본문, 사용 토큰, 실제 포함된 item 목록)
+    """
+    pieces, kept = [], []
+    used = 0
+    seen_lines = set()
+    sep_tok = count_tokens("\n---\n", model)
+    for it in sorted(items, key=lambda x: -x["score"]):
+        remain = budget - used - (sep_tok if pieces else 0)
+        if remain <= 0:
+            break
+        # 슬라이딩 윈도우 겹침 제거: 이미 넣은 줄은 빼고 새 줄만
+        lines = [ln for ln in it["content"].strip().splitlines() if ln.strip()]
+        new_lines = [ln for ln in lines if ln.strip() not in seen_lines]
+        if not new_lines or len(new_lines) < MIN_NEW_RATIO * len(lines):
+            continue
+        head = header_fn(it)
+        body = "\n".join(new_lines)
+        head_tok = count_tokens(head, model)
+        if head_tok >= remain:
+            break
+        body_fit, body_tok = trim_to_tokens(body, remain - head_tok, model)
+        truncated = body_fit != body
+        if truncated:   # 잘림 표시 토큰까지 예산에 포함
+            mark_tok = count_tokens(TRUNC_MARK, model)
+            body_fit, body_tok = trim_to_tokens(body, remain - head_tok - mark_tok, model)
+            body_tok += mark_tok
+        if not body_fit:
+            break
+        pieces.append(head + body_fit + (TRUNC_MARK if truncated else ""))
+        used += head_tok + body_tok + (sep_tok if len(pieces) > 1 else 0)
+        seen_lines.update(ln.strip() for ln in body_fit.splitlines())
+        kept.append({**it, "tokens": head_tok + body_tok, "truncated": truncated})
+        if truncated:
+            break
+    return "\n---\n".join(pieces), used, kept
@@ -0,0 +1,172 @@
+# rag_corpus.py
+# 여러 PDF 문서 코퍼스 (04_app_chat_dashboard_rag.py 에서 사용)
+# - 문서 1개 = 샤드 1개: {doc_id}.rag 번들(float32 임베딩 + 섹션 열 저장소 + BM25, rag_store.py)
+#   (doc_id = PDF 파일 SHA-256 → 같은 문서를 같은 청크 설정으로 다시 올리면 재추출·재청킹·재임베딩 없음,
+#    청크 설정이 다르면 다시 청킹 — 바뀌지 않은 섹션은 섹션 임베딩 캐시에서 재사용)
+# - CorpusRegistry: 등록 문서 목록(corpus.json) — 추가/삭제 시 다른 문서 샤드는 그대로
+# - merge_shards : 선택한 문서들의 샤드를 이어 붙여 검색용 병합 색인 1벌 기록 (corpus-{선택 해시}.rag)
+#   → 이후는 단일 문서와 같은 경로(mmap 로드, IVF, BM25, 공유 레지스트리)로 검색
+# - prune_merged : 지금 쓰지 않는 선택 조합의 병합본 삭제 (선택을 바꿀 때마다 쌓이지 않도록)
+import datetime as dt, hashlib, json, pathlib, threading, time
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+import numpy as np
+
+from rag_index import normalize
+from rag_lexical import BM25Index
+from rag_store import SectionTable, bundle_path, read_bundle, read_header, write_bundle
+
+CORPUS_FILE = "corpus.json"
+MERGED_PREFIX = "corpus-"
+MERGED_GRACE_S = 300        # 막 기록된 병합본은 정리하지 않음 (다른 세션이 아직 열기 전일 수 있음)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 샤드 파일
+#    - 번들 안: "emb"(단위 정규화 float32) + "sec.*"(SectionTable 열) + "bm25.*"(역색인)
+#    - 번들 옆 파생 캐시: {key}.float16.npy / {key}.int8*.npy / {key}.ivf* (선택 형식·백엔드에 따라 로드 시 생성)
+# ──────────────────────────────────────────────────────────────────────────────
+class Shard(NamedTuple):
+    emb: np.ndarray             # (N, d) float32 memmap
+    sections: SectionTable
+    lexical: BM25Index
+    attrs: Dict[str, Any]
+
+def section_text(sec: Dict[str, Any]) -> str:
+    """임베딩/BM25 입력 텍스트 (제목 + 본문)"""
+    return f"{sec['title']}\n{sec['content']}"
+
+def save_shard(cache_dir: pathlib.Path, key: str, emb: np.ndarray, table: SectionTable,
+               attrs: Optional[Dict[str, Any]] = None):
+    """attrs: 번들 헤더에 같이 남길 값 (청크 설정 등) — built(기록 시각)는 항상 추가"""
+    bm25 = BM25Index.build([table.text(i) for i in range(len(table))])
+    arrays = {"emb": normalize(np.asarray(emb, dtype=np.float32)), **table.arrays(), **bm25.arrays()}
+    write_bundle(bundle_path(cache_dir, key), arrays, {**table.attrs(), **(attrs or {}), "built": time.time()})
+
+def open_shard(cache_dir: pathlib.Path, key: str, mmap: bool = True) -> Optional[Shard]:
+    p = bundle_path(cache_dir, key)
+    if not p.exists():
+        return None
+    arrays, attrs = read_bundle(p, mmap=mmap)
+    table = SectionTable.from_bundle(arrays, attrs)
+    return Shard(arrays["emb"], table, BM25Index.from_bundle(arrays, len(table)), attrs)
+
+def has_shard(cache_dir: pathlib.Path, key: str) -> bool:
+    return bundle_path(cache_dir, key).exists()
+
+def shard_attrs(cache_dir: pathlib.Path, key: str) -> Optional[Dict[str, Any]]:
+    """번들 헤더의 속성만 읽음 (배열은 열지 않음) — 없거나 이전 형식이면 None"""
+    p = bundle_path(cache_dir, key)
+    if not p.exists():
+        return None
+    try:
+        return read_header(p)[0]["attrs"]
+    except ValueError:
+        return None
+
+def shard_files(cache_dir: pathlib.Path, key: str) -> List[pathlib.Path]:
+    """key로 시작하는 캐시 파일 전부 (.rag 번들 + 파생 .float16.npy / .int8*.npy / .ivf*)"""
+    return sorted(cache_dir.glob(f"{key}.*"))
+
+def delete_shard(cache_dir: pathlib.Path, key: str) -> int:
+    n = 0
+    for p in shard_files(cache_dir, key):
+        p.unlink(missing_ok=True)
+        n += 1
+    return n
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 문서 레지스트리 (corpus.json)
+# ──────────────────────────────────────────────────────────────────────────────
+class CorpusRegistry:
+    def __init__(self, cache_dir: pathlib.Path):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.path = self.cache_dir / CORPUS_FILE
+        self._lock = threading.Lock()
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            self.docs = json.loads(self.path.read_text(encoding="utf-8"))["docs"]
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, doc_id: str):
+        return doc_id in self.docs
+
+    def _save(self):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"docs": self.docs}, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(self.path)          # 원자적 교체 (동시 세션이 반쯤 쓴 파일을 읽지 않도록)
+
+    def add(self, doc_id: str, name: str, n_sections: int, **info):
+        with self._lock:
+            self.docs[doc_id] = {"name": name, "n_sections": n_sections,
+                                 "added": dt.datetime.now().isoformat(timespec="seconds"), **info}
+            self._save()
+
+    def remove(self, doc_id: str) -> List[str]:
+        """문서 샤드 + 그 문서를 포함한 병합 색인 파일 삭제 → 삭제된 캐시 키 목록"""
+        with self._lock:
+            self.docs.pop(doc_id, None)
+            self._save()
+            keys = [doc_id] + self.drop_merged(doc_id)
+            delete_shard(self.cache_dir, doc_id)
+            return keys
+
+    def drop_merged(self, doc_id: str) -> List[str]:
+        """그 문서를 포함한 병합 색인 파일 삭제 (문서를 다시 청킹했을 때도 사용) → 삭제된 캐시 키 목록"""
+        keys = []
+        for p in self.cache_dir.glob(f"{MERGED_PREFIX}*.rag"):
+            key = p.name[:-len(".rag")]
+            try:
+                members = read_header(p)[0]["attrs"].get("doc_ids", [])
+            except ValueError:
+                members = [doc_id]
+            if doc_id in members:
+                delete_shard(self.cache_dir, key)
+                keys.append(key)
+        return keys
+
+    def names(self) -> Dict[str, str]:
+        return {d: info["name"] for d, info in self.docs.items()}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 병합 색인
+#    - 선택 문서가 1개면 그 샤드를 그대로 사용 (복사 없음)
+#    - 여러 개면 float32 행 / 섹션 열을 이어 붙여 corpus-{hash}.rag 로 기록 (doc 열 = 문서 번호)
+#    - BM25는 전체 코퍼스 기준 idf가 필요하므로 병합본에서 다시 계산 (임베딩 호출은 없음)
+# ──────────────────────────────────────────────────────────────────────────────
+def selection_key(doc_ids: List[str]) -> str:
+    ids = sorted(set(doc_ids))
+    if len(ids) == 1:
+        return ids[0]
+    return MERGED_PREFIX + hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+def merge_shards(cache_dir: pathlib.Path, doc_ids: List[str], names: Optional[Dict[str, str]] = None) -> str:
+    """선택 문서 병합 색인을 기록(이미 있으면 생략)하고 캐시 키 반환"""
+    ids = sorted(set(doc_ids))
+    key = selection_key(ids)
+    if len(ids) == 1 or has_shard(cache_dir, key):
+        return key
+    embs, tables = [], []
+    for d in ids:
+        shard = open_shard(cache_dir, d)
+        if shard is None:
+            raise FileNotFoundError(f"문서 샤드가 없습니다: {d}")
+        embs.append(shard.emb)
+        tables.append(shard.sections)
+    save_shard(cache_dir, key, np.concatenate(embs), SectionTable.concat(tables, names))
+    return key
+
+def prune_merged(cache_dir: pathlib.Path, keep: Set[str], grace_s: float = MERGED_GRACE_S) -> List[str]:
+    """keep 에 없는 병합본(+파생 캐시) 삭제 → 삭제한 키 목록 (다른 프로세스가 열고 있어 못 지우면 건너뜀)"""
+    removed = []
+    now = time.time()
+    for p in cache_dir.glob(f"{MERGED_PREFIX}*.rag"):
+        key = p.name[:-len(".rag")]
+        try:
+            if key in keep or now - p.stat().st_mtime < grace_s:
+                continue
+            delete_shard(cache_dir, key)
+        except OSError:
+            continue
+        removed.append(key)
+    return removed
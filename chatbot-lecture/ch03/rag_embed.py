@@ -0,0 +1,200 @@
+# rag_embed.py
+# 섹션 임베딩 파이프라인 (04_app_chat_dashboard_rag.py 의 build_rag_index 에서 사용)
+# - 추정 토큰 수 기준으로 요청을 배치 분할 (요청당 입력/토큰 한도 보호)
+# - ThreadPoolExecutor로 배치를 동시 전송, 429/5xx는 지수 백오프로 재시도
+# - 결과는 섹션 순서대로 재조립 → np.float32 (N, d)
+# - SectionEmbeddingCache: hash(모델 + 섹션 텍스트) → 벡터 (SQLite), 바뀐 섹션만 다시 임베딩
+import hashlib, pathlib, random, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAX_BATCH_TOKENS = 16000    # 배치당 추정 토큰 상한 (API 한도 300k보다 작게 → 병렬성 확보)
+MAX_BATCH_INPUTS = 256      # 배치당 입력 개수 상한 (API 한도 2048)
+MAX_INPUT_TOKENS = 8000     # 입력 1개당 상한 (text-embedding-3 한도 8191)
+EMBED_WORKERS = 4
+MAX_RETRIES = 6
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 토큰 추정 & 배치 분할
+#    - 영문은 약 4자/토큰, 한글 등 비ASCII는 약 1자/토큰으로 보수적으로 추정
+# ──────────────────────────────────────────────────────────────────────────────
+def estimate_tokens(text: str) -> int:
+    n_ascii = len(text.encode("ascii", "ignore"))      # 문자 루프 대신 C 레벨 인코딩으로 계산
+    return max(1, n_ascii // 4 + (len(text) - n_ascii))
+
+def clip_to_tokens(text: str, max_tokens: int = MAX_INPUT_TOKENS) -> str:
+    """입력 1개가 모델 한도를 넘지 않도록 뒤를 잘라냄(추정치 기준)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+def pack_batches(texts: List[str], max_tokens: int = MAX_BATCH_TOKENS,
+                 max_inputs: int = MAX_BATCH_INPUTS) -> List[List[int]]:
+    """텍스트 위치 목록을 순서대로 묶음 — 각 묶음은 토큰/개수 상한 이하"""
+    batches, cur, cur_tok = [], [], 0
+    for i, t in enumerate(texts):
+        n = estimate_tokens(t)
+        if cur and (cur_tok + n > max_tokens or len(cur) >= max_inputs):
+            batches.append(cur)
+            cur, cur_tok = [], 0
+        cur.append(i)
+        cur_tok += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 재시도: 429/5xx/연결 오류만, 지수 백오프 + 지터 (retry-after 헤더 우선)
+# ──────────────────────────────────────────────────────────────────────────────
+def is_retryable(e: Exception) -> bool:
+    return getattr(e, "status_code", None) in RETRY_STATUS or type(e).__name__ in RETRY_ERRORS
+
+def retry_delay(e: Exception, attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(cap, base * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+def call_with_retry(fn: Callable, max_retries: int = MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            time.sleep(retry_delay(e, attempt))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 배치 동시 임베딩
+# ──────────────────────────────────────────────────────────────────────────────
+def embed_texts(client, texts: List[str], model: str, max_workers: int = EMBED_WORKERS,
+                max_tokens: int = MAX_BATCH_TOKENS, max_retries: int = MAX_RETRIES,
+                on_progress: Optional[Callable[[int, int], None]] = None,
+                on_batch: Optional[Callable[[List[int], list], None]] = None) -> np.ndarray:
+    """
+    client.embeddings.create 를 배치 단위로 병렬 호출하고 입력 순서대로 (N, d) 배열 반환
+    - on_batch(indices, vectors): 배치 1개 완료 시 (texts 내 위치, 벡터) 콜백 (메인 스레드에서 호출)
+    - on_progress(done, total): 완료된 텍스트 수 콜백 (메인 스레드에서 호출)
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    texts = [clip_to_tokens(t) for t in texts]
+    batches = pack_batches(texts, max_tokens=max_tokens)
+
+    def run(batch: List[int]):
+        resp = call_with_retry(
+            lambda: client.embeddings.create(model=model, input=[texts[i] for i in batch]),
+            max_retries=max_retries,
+        )
+        # 응답 data는 index 필드 기준으로 정렬(서버가 순서를 보장하지 않을 수 있음)
+        data = sorted(resp.data, key=lambda e: getattr(e, "index", 0))
+        return batch, [e.embedding for e in data]
+
+    out: List[Optional[list]] = [None] * len(texts)
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+        futures = [pool.submit(run, b) for b in batches]
+        try:
+            for fut in as_completed(futures):
+                batch, vecs = fut.result()
+                for i, v in zip(batch, vecs):
+                    out[i] = v
+                if on_batch:
+                    on_batch(batch, vecs)
+                done += len(batch)
+                if on_progress:
+                    on_progress(done, len(texts))
+        except Exception:
+            for f in futures:      # 재시도 소진 등 실패 시 남은 배치는 취소
+                f.cancel()
+            raise
+    return np.array(out, dtype=np.float32)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 4) 섹션 단위 내용 주소(content-addressed) 캐시
+#    - 키: sha256(모델명 + "\n" + 섹션 텍스트) 앞 16바이트
+#    - 값: float32 벡터 바이트 (SQLite 1파일, 여러 세션/문서가 공유)
+# ──────────────────────────────────────────────────────────────────────────────
+def section_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).digest()[:16]
+
+class SectionEmbeddingCache:
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (k BLOB PRIMARY KEY, v BLOB NOT NULL)")
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            for s in range(0, len(keys), 500):      # SQLite 변수 개수 제한 대비 분할 조회
+                chunk = keys[s:s + 500]
+                q = f"SELECT k, v FROM emb WHERE k IN ({','.join('?' * len(chunk))})"
+                for k, v in self._conn.execute(q, chunk):
+                    found[bytes(k)] = np.frombuffer(v, dtype=np.float32)
+        return found
+
+    def put_many(self, items: List[Tuple[bytes, np.ndarray]]):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO emb (k, v) VALUES (?, ?)",
+                                   [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items])
+            self._conn.commit()
+
+def embed_texts_cached(client, texts: List[str], model: str, cache: SectionEmbeddingCache,
+                       on_progress: Optional[Callable[[int, int], None]] = None,
+                       **kw) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    캐시에 없는(새로 생겼거나 바뀐) 섹션만 embed_texts로 임베딩 → (벡터, {"hits", "misses"})
+    - 배치가 끝날 때마다 캐시에 기록 → 중간에 취소/실패해도 끝낸 배치는 다음 빌드에서 재사용
+    - on_progress(done, total): total은 전체 텍스트 수, 캐시 적중분은 처음부터 완료로 셈
+    """
+    keys = [section_key(model, clip_to_tokens(t)) for t in texts]
+    found = cache.get_many(list(set(keys)))
+    miss_pos = [i for i, k in enumerate(keys) if k not in found]
+    # 같은 텍스트가 여러 번 나오면 한 번만 요청 (완료 시 중복 위치 수만큼 진행)
+    miss_first: Dict[bytes, int] = {}
+    miss_count: Dict[bytes, int] = {}
+    for i in miss_pos:
+        miss_first.setdefault(keys[i], i)
+        miss_count[keys[i]] = miss_count.get(keys[i], 0) + 1
+    done = len(texts) - len(miss_pos)
+    if on_progress:
+        on_progress(done, len(texts))
+    if miss_first:
+        order = list(miss_first.values())
+
+        def on_batch(batch: List[int], vecs: list):
+            nonlocal done
+            items = [(keys[order[j]], v) for j, v in zip(batch, vecs)]
+            cache.put_many(items)
+            found.update(items)
+            done += sum(miss_count[k] for k, _ in items)
+            if on_progress:
+                on_progress(done, len(texts))
+
+        embed_texts(client, [texts[i] for i in order], model, on_batch=on_batch, **kw)
+    emb = np.stack([found[k] for k in keys]).astype(np.float32)
+    return emb, {"hits": len(texts) - len(miss_pos), "misses": len(miss_pos)}
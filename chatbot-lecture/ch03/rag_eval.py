@@ -0,0 +1,301 @@
+# rag_eval.py
+# RAG 검색 품질/지연시간 오프라인 평가 (청커·제목 패턴·top_k·임베딩 모델 변경 전후 비교용)
+# - 입력: 질문 / 정답 위치 목록(JSONL) + PDF들
+#     {"pdf": "manual.pdf", "question": "전원 초기화 방법은?", "pages": [12]}
+#     {"pdf": "manual.pdf", "question": "...", "contains": "공장 초기화"}
+#     · pdf 경로는 JSONL 파일 기준 상대 경로
+#     · pages   : 섹션 페이지 범위(page~page_end)가 이 중 하나라도 포함하면 정답 (naive 청커는 페이지 정보가 없어 매칭 불가)
+#     · contains: 섹션 본문에 이 문자열이 있으면 정답 (청커가 바뀌어도 유지되는 기준)
+#     · 둘 다 주면 둘 다 만족해야 정답
+# - 설정 조합(청커 x 청크 크기 x 저장 형식 x 백엔드 x 검색 모드)마다
+#     recall@k(정답 섹션 중 top-k에 든 비율), hit@k(top-k에 정답이 하나라도 있는 질문 비율), MRR, 색인 빌드 시간(청킹/임베딩/BM25/IVF), 메모리(MB), 질의 지연시간 p50/p95
+# - 임베딩: hash(로컬 결정적 가짜 임베딩, 네트워크 없음) / openai(실제 모델, 섹션 캐시 sqlite 재사용)
+#   · 질문 임베딩은 섹션 캐시에 넣지 않음 (실행 중 메모리에만 보관 → 설정 조합마다 재호출 없음)
+# - 결과는 JSON으로 저장 → compare 로 두 실행 비교
+# 사용 예)
+#   python rag_eval.py run qa.jsonl --out runs/base.json
+#   python rag_eval.py run qa.jsonl --chunkers page naive --chunk-tokens 200 400 800 --k 1 3 5 --out runs/chunk.json
+#   python rag_eval.py run qa.jsonl --embedder openai --model text-embedding-3-small --out runs/openai.json
+#   python rag_eval.py compare runs/base.json runs/chunk.json
+import argparse, datetime as dt, json, pathlib, sys, time
+from typing import Any, Callable, Dict, List, Set, Tuple
+import numpy as np
+
+from rag_index import STORE_DTYPES, EmbeddingStore, IVFIndex, make_index, search_index, use_ann
+from rag_embed import SectionEmbeddingCache, embed_texts, embed_texts_cached
+from rag_extract import PageText, iter_pdf_pages
+from rag_chunk import CHUNK_OVERLAP, CHUNK_TOKENS, chunk_pages, naive_split_sections
+from rag_lexical import CAND_MULT, HYBRID_ALPHA, RAG_MODES, BM25Index, fuse_scores
+from rag_store import SectionTable
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))   # chatbot-lecture/common
+
+CHUNKERS = ["page", "naive"]
+EVAL_BACKENDS = ["exact", "ivf", "auto"]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 데이터셋: 질문 목록 + PDF 페이지 (PDF당 1번만 추출)
+# ──────────────────────────────────────────────────────────────────────────────
+def load_qa(path: pathlib.Path) -> List[Dict[str, Any]]:
+    items = []
+    for n, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if "pdf" not in item or "question" not in item:
+            raise ValueError(f"{path}:{n}: pdf / question 필드가 필요합니다.")
+        if not item.get("pages") and not item.get("contains"):
+            raise ValueError(f"{path}:{n}: pages 또는 contains 중 하나는 있어야 합니다.")
+        items.append(item)
+    return items
+
+def load_pdfs(qa: List[Dict[str, Any]], base: pathlib.Path) -> Tuple[Dict[str, List[PageText]], List[Dict[str, Any]]]:
+    pages, info = {}, []
+    for name in dict.fromkeys(item["pdf"] for item in qa):
+        t0 = time.perf_counter()
+        pages[name] = list(iter_pdf_pages((base / name).read_bytes()))
+        info.append({"pdf": name, "pages": len(pages[name]), "extract_s": round(time.perf_counter() - t0, 3)})
+    return pages, info
+
+def is_relevant(sec: Dict[str, Any], item: Dict[str, Any]) -> bool:
+    if item.get("pages"):
+        a, b = sec.get("page"), sec.get("page_end") or sec.get("page")
+        if a is None or not any(a <= p <= b for p in item["pages"]):
+            return False
+    return not item.get("contains") or item["contains"] in sec["content"]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 임베딩 함수: texts → (N, d) float32
+# ──────────────────────────────────────────────────────────────────────────────
+Embedder = Callable[[List[str]], np.ndarray]
+
+def make_embedder(args) -> Tuple[Embedder, Embedder, str]:
+    """(섹션 임베딩, 질문 임베딩, 이름)"""
+    if args.embedder == "hash":
+        from common.mock_openai_server import hash_embedding
+        embed = lambda texts: np.stack([hash_embedding(t, args.dim) for t in texts])
+        return embed, embed, f"hash-{args.dim}"
+    from openai import OpenAI
+    client = OpenAI()
+    cache = SectionEmbeddingCache(pathlib.Path(args.cache))   # 앱과 같은 캐시 → 이미 임베딩한 섹션은 재호출 없음
+    seen: Dict[str, np.ndarray] = {}                          # 질문은 섹션 캐시와 분리
+
+    def embed_questions(texts: List[str]) -> np.ndarray:
+        new = list(dict.fromkeys(t for t in texts if t not in seen))
+        if new:
+            seen.update(zip(new, embed_texts(client, new, args.model)))
+        return np.stack([seen[t] for t in texts])
+
+    return (lambda texts: embed_texts_cached(client, texts, args.model, cache)[0]), embed_questions, args.model
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 설정 1개: 청킹 → 임베딩 → 색인 → 질의
+# ──────────────────────────────────────────────────────────────────────────────
+def chunk_docs(pages: Dict[str, List[PageText]], chunker: str, tokens: int, overlap: int) -> SectionTable:
+    tables = []
+    for name, doc_pages in pages.items():
+        if chunker == "naive":
+            sections = naive_split_sections(doc_pages)
+        else:
+            sections = chunk_pages(doc_pages, tokens, overlap)
+        tables.append(SectionTable.from_sections(sections, name, name))
+    return SectionTable.concat(tables)
+
+def relevant_rows(table: SectionTable, qa: List[Dict[str, Any]]) -> List[Set[int]]:
+    rows_by_doc: Dict[str, List[int]] = {}
+    for i in range(len(table)):
+        rows_by_doc.setdefault(table.doc_ids[int(table.cols["doc"][i])], []).append(i)
+    out = []
+    for item in qa:
+        out.append({i for i in rows_by_doc.get(item["pdf"], []) if is_relevant(table.row(i), item)})
+    return out
+
+def score_ranking(ranked: List[np.ndarray], truth: List[Set[int]], ks: List[int]) -> Dict[str, Any]:
+    """
+    질문 평균 recall@k = |정답 ∩ top-k| / |정답|, hit@k = top-k에 정답이 하나라도 있는지, MRR
+    (정답 섹션을 찾지 못한 질문은 모두 0으로 계산)
+    """
+    recall = {str(k): 0.0 for k in ks}
+    hit = {str(k): 0.0 for k in ks}
+    rr = 0.0
+    for rows, rel in zip(ranked, truth):
+        rows = rows.tolist()
+        first = next((r for r, row in enumerate(rows, start=1) if row in rel), None)
+        if first is not None:
+            rr += 1.0 / first
+            for k in ks:
+                recall[str(k)] += len(rel.intersection(rows[:k])) / len(rel)
+                hit[str(k)] += float(first <= k)
+    n = max(1, len(truth))
+    return {"recall": {k: round(v / n, 4) for k, v in recall.items()},
+            "hit": {k: round(v / n, 4) for k, v in hit.items()}, "mrr": round(rr / n, 4)}
+
+def percentiles(ms: List[float]) -> Dict[str, float]:
+    return {"p50": round(float(np.percentile(ms, 50)), 3), "p95": round(float(np.percentile(ms, 95)), 3)}
+
+def eval_config(pages, qa, embed, embed_questions, chunker: str, tokens: int, overlap: int, dtypes: List[str],
+                backends: List[str], modes: List[str], ks: List[int], alpha: float) -> List[Dict[str, Any]]:
+    build: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    table = chunk_docs(pages, chunker, tokens, overlap)
+    build["chunk_s"] = time.perf_counter() - t0
+    texts = [table.text(i) for i in range(len(table))]
+    truth = relevant_rows(table, qa)
+
+    t0 = time.perf_counter()
+    emb = embed(texts)
+    build["embed_s"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bm25 = BM25Index.build(texts)
+    build["bm25_s"] = time.perf_counter() - t0
+    questions = [item["question"] for item in qa]
+    t0 = time.perf_counter()
+    q_emb = embed_questions(questions) if any(m != "lexical" for m in modes) else None
+    q_embed_ms = (time.perf_counter() - t0) * 1000 / max(1, len(questions))
+
+    k_max = max(ks)
+    n_cand = k_max * CAND_MULT
+    results = []
+    base = {"chunker": chunker, "chunk_tokens": tokens if chunker == "page" else None,
+            "n_sections": len(table), "unresolved": sum(1 for t in truth if not t)}
+    for dtype in dtypes:
+        store = EmbeddingStore.from_embeddings(emb, dtype)
+        for backend in backends:
+            ann, ann_s = None, 0.0
+            if backend == "ivf" or (backend == "auto" and use_ann(len(store), backend)):
+                t0 = time.perf_counter()
+                ann = IVFIndex.build(store)
+                ann_s = time.perf_counter() - t0
+            index = make_index(store, ann, [])
+            search_store = ann.store if ann is not None else store
+            memory = {"embeddings": search_store.nbytes, "sections": table.nbytes, "bm25": bm25.nbytes,
+                      "ivf": (ann.centroids.nbytes + ann.order.nbytes + ann.offsets.nbytes) if ann is not None else 0}
+            for mode in modes:
+                if mode == "lexical" and (dtype != dtypes[0] or backend != backends[0]):
+                    continue        # BM25만 쓰는 모드는 저장 형식/백엔드와 무관 → 1번만
+                ranked, lat = [], []
+                for i, q in enumerate(questions):
+                    t0 = time.perf_counter()
+                    if mode == "lexical":
+                        rows, _ = bm25.search(q, k_max)
+                    elif mode == "dense":
+                        rows, _ = search_index(index, q_emb[i], k_max, backend=backend)
+                    else:
+                        rows, _ = fuse_scores(search_index(index, q_emb[i], n_cand, backend=backend),
+                                              bm25.search(q, n_cand), k_max, alpha=alpha)
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    ranked.append(rows)
+                steps = {"chunk_s": build["chunk_s"]}
+                if mode != "lexical":
+                    steps.update(embed_s=build["embed_s"], ivf_s=ann_s)
+                if mode != "dense":
+                    steps["bm25_s"] = build["bm25_s"]
+                used = ["sections"] + {"dense": ["embeddings", "ivf"], "hybrid": ["embeddings", "ivf", "bm25"],
+                                       "lexical": ["bm25"]}[mode]
+                results.append({
+                    **base, "mode": mode, "dtype": dtype if mode != "lexical" else None,
+                    "backend": backend if mode != "lexical" else None, "ann": ann is not None and mode != "lexical",
+                    **score_ranking(ranked, truth, ks),
+                    "build_s": {k: round(v, 4) for k, v in steps.items()},
+                    "build_total_s": round(sum(steps.values()), 4),
+                    "memory_mb": round(sum(memory[k] for k in used) / 1e6, 3),
+                    "latency_ms": percentiles(lat),
+                    "query_embed_ms": round(q_embed_ms, 3) if mode != "lexical" else 0.0,
+                })
+    return results
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 4) 출력 / 비교
+# ──────────────────────────────────────────────────────────────────────────────
+def config_name(r: Dict[str, Any]) -> str:
+    parts = [r["chunker"] + (f"/{r['chunk_tokens']}" if r.get("chunk_tokens") else ""), r["mode"]]
+    if r.get("backend"):
+        parts.append(f"{r['backend']}/{r['dtype']}")
+    return " ".join(parts)
+
+def print_results(results: List[Dict[str, Any]], ks: List[int]):
+    head = f"{'config':<34}{'secs':>6}" + "".join(f"{f'R@{k}':>7}" for k in ks) + "".join(f"{f'H@{k}':>7}" for k in ks)
+    print(head + f"{'MRR':>7}{'build s':>9}{'MB':>8}{'p50 ms':>8}{'p95 ms':>8}")
+    for r in results:
+        print(f"{config_name(r):<34}{r['n_sections']:>6}" + "".join(f"{r['recall'][str(k)]:>7.3f}" for k in ks)
+              + "".join(f"{r['hit'][str(k)]:>7.3f}" for k in ks) + f"{r['mrr']:>7.3f}{r['build_total_s']:>9.2f}{r['memory_mb']:>8.2f}"
+              f"{r['latency_ms']['p50']:>8.2f}{r['latency_ms']['p95']:>8.2f}")
+
+def run(args):
+    qa_path = pathlib.Path(args.qa)
+    qa = load_qa(qa_path)
+    pages, pdf_info = load_pdfs(qa, qa_path.parent)
+    embed, embed_questions, embed_name = make_embedder(args)
+    ks = sorted(set(args.k))
+    print(f"{len(qa)} questions / {len(pages)} PDFs · embedder={embed_name}")
+    results = []
+    for chunker in args.chunkers:
+        for tokens in (args.chunk_tokens if chunker == "page" else [None]):
+            results += eval_config(pages, qa, embed, embed_questions, chunker, tokens, args.overlap, args.dtypes, args.backends,
+                                   args.modes, ks, args.alpha)
+    unresolved = {config_name(r).split()[0]: r["unresolved"] for r in results if r["unresolved"]}
+    for name, n in unresolved.items():
+        print(f"! {name}: 정답 섹션을 찾을 수 없는 질문 {n}개 (항상 miss로 계산)")
+    print_results(results, ks)
+    if args.out:
+        out = pathlib.Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        report = {"created": dt.datetime.now().isoformat(timespec="seconds"), "label": args.label or out.stem,
+                  "qa": str(qa_path), "n_questions": len(qa), "pdfs": pdf_info, "embedder": embed_name,
+                  "ks": ks, "alpha": args.alpha, "overlap": args.overlap, "results": results}
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"→ {out}")
+
+def compare(args):
+    a, b = (json.loads(pathlib.Path(p).read_text(encoding="utf-8")) for p in (args.base, args.new))
+    ks = [k for k in a["ks"] if k in b["ks"]]
+    base = {config_name(r): r for r in a["results"]}
+    print(f"{a['label']} ({a['embedder']}) → {b['label']} ({b['embedder']}), 질문 {a['n_questions']} → {b['n_questions']}")
+    print(f"{'config':<34}" + "".join(f"{f'ΔR@{k}':>8}" for k in ks)
+          + "".join(f"{f'ΔH@{k}':>8}" for k in ks) + f"{'ΔMRR':>8}{'Δbuild s':>10}{'ΔMB':>8}{'Δp95 ms':>9}")
+    for r in b["results"]:
+        name = config_name(r)
+        o = base.pop(name, None)
+        if o is None:
+            print(f"{name:<34}  (새 설정)")
+            continue
+        o_hit = o.get("hit", o["recall"])      # hit 이 없는 이전 결과의 "recall"은 실제로 hit@k
+        print(f"{name:<34}" + "".join(f"{r['recall'][str(k)] - o['recall'][str(k)]:>+8.3f}" for k in ks)
+              + "".join(f"{r['hit'][str(k)] - o_hit[str(k)]:>+8.3f}" for k in ks)
+              + f"{r['mrr'] - o['mrr']:>+8.3f}{r['build_total_s'] - o['build_total_s']:>+10.2f}"
+              f"{r['memory_mb'] - o['memory_mb']:>+8.2f}{r['latency_ms']['p95'] - o['latency_ms']['p95']:>+9.2f}")
+    for name in base:
+        print(f"{name:<34}  (새 실행에 없음)")
+
+def main():
+    ap = argparse.ArgumentParser(description="RAG 검색 품질/지연시간 오프라인 평가")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="질문/정답 JSONL + PDF로 설정 조합별 평가")
+    p.add_argument("qa")
+    p.add_argument("--out", default=None, help="결과 JSON 경로")
+    p.add_argument("--label", default=None)
+    p.add_argument("--chunkers", nargs="+", choices=CHUNKERS, default=["page"])
+    p.add_argument("--chunk-tokens", type=int, nargs="+", default=[CHUNK_TOKENS])
+    p.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    p.add_argument("--dtypes", nargs="+", choices=STORE_DTYPES, default=["float32"])
+    p.add_argument("--backends", nargs="+", choices=EVAL_BACKENDS, default=["exact"])
+    p.add_argument("--modes", nargs="+", choices=RAG_MODES, default=RAG_MODES)
+    p.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    p.add_argument("--alpha", type=float, default=HYBRID_ALPHA)
+    p.add_argument("--embedder", choices=["hash", "openai"], default="hash")
+    p.add_argument("--dim", type=int, default=256, help="hash 임베딩 차원")
+    p.add_argument("--model", default="text-embedding-3-small", help="openai 임베딩 모델")
+    p.add_argument("--cache", default=".rag_cache/sections.sqlite", help="openai 임베딩 섹션 캐시")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="두 결과 JSON 비교 (같은 설정끼리 차이)")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.set_defaults(func=compare)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
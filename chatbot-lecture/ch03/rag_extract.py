@@ -0,0 +1,82 @@
+# rag_extract.py
+# PDF 페이지 단위 텍스트 추출 (04_app_chat_dashboard_rag.py 에서 사용)
+# - 페이지 범위를 여러 프로세스에 나눠 pdfplumber로 추출 (코어 수에 비례해 빨라짐)
+# - 결과는 (페이지 번호, 텍스트)를 페이지 순서대로 하나씩 내보내는 generator
+#   → 호출 측에서 진행률 표시 / 청킹을 페이지가 도착하는 대로 진행 가능
+# - 텍스트 층이 없는 페이지(스캔본)는 내용 해시(digest)를 같이 돌려줌 → rag_ocr.ocr_pdf_pages 가 그 페이지만 OCR
+import hashlib, io, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import pdfplumber
+    from pdfminer.pdftypes import resolve1
+except Exception:
+    pdfplumber = None
+    resolve1 = None
+
+PAGES_PER_TASK = 8          # 프로세스 작업 1개당 페이지 수
+SERIAL_MAX_PAGES = 16       # 이 이하 페이지 수는 프로세스 생성 비용이 더 커서 현재 프로세스에서 추출
+MIN_TEXT_CHARS = 8          # 추출 텍스트가 이보다 짧으면 텍스트 없는 페이지(스캔본)로 판단
+
+class PageText(NamedTuple):
+    page: int               # 1부터 시작
+    text: str
+    digest: str = ""        # 텍스트 없는 페이지만: 페이지 내용(콘텐츠 스트림 + 이미지) SHA-256 → OCR 캐시 키
+
+def available_cpus() -> int:
+    """컨테이너 CPU 제한(affinity)을 반영한 사용 가능 코어 수"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+def needs_ocr(text: str) -> bool:
+    return len(text.strip()) < MIN_TEXT_CHARS
+
+def page_digest(page) -> str:
+    """pdfplumber 페이지 내용 해시 — 같은 스캔 페이지면 다른 PDF에 들어 있어도 같은 값 (렌더링 없이 계산)"""
+    h = hashlib.sha256()
+    for ref in page.page_obj.contents:
+        h.update(resolve1(ref).get_data())
+    for img in page.images:
+        stream = img["stream"]
+        h.update(stream.get_rawdata() or stream.get_data())
+    return h.hexdigest()
+
+def _extract_range(pdf_bytes: bytes, start: int, stop: int) -> List[Tuple[int, str, str]]:
+    """[start, stop) 페이지 추출 — 워커 프로세스에서 실행 (pickle 가능한 최상위 함수)"""
+    out = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for i in range(start, stop):
+            page = pdf.pages[i]
+            text = page.extract_text() or ""
+            out.append((i + 1, text, page_digest(page) if needs_ocr(text) else ""))
+            page.flush_cache()      # 페이지 객체 캐시 해제 → 큰 문서에서 메모리 누적 방지
+    return out
+
+def iter_pdf_pages(pdf_bytes: bytes, workers: Optional[int] = None,
+                   pages_per_task: int = PAGES_PER_TASK) -> Iterator[PageText]:
+    """페이지 순서대로 PageText를 내보냄 (빈 페이지도 text="" + digest 로 포함)"""
+    n_pages = pdf_page_count(pdf_bytes)
+    workers = workers or available_cpus()
+    if n_pages <= SERIAL_MAX_PAGES or workers <= 1:
+        for start in range(0, n_pages, pages_per_task):
+            for row in _extract_range(pdf_bytes, start, min(n_pages, start + pages_per_task)):
+                yield PageText(*row)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, -(-n_pages // pages_per_task))) as pool:
+        futures = [pool.submit(_extract_range, pdf_bytes, start, min(n_pages, start + pages_per_task))
+                   for start in range(0, n_pages, pages_per_task)]
+        try:
+            # 제출 순서대로 결과를 기다리면 페이지 순서가 유지됨 (뒤 범위는 그동안 병렬로 진행)
+            for fut in futures:
+                for row in fut.result():
+                    yield PageText(*row)
+        finally:
+            for f in futures:       # 소비 중단/오류 시 남은 작업 취소
+                f.cancel()
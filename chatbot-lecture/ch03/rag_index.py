@@ -0,0 +1,363 @@
+# rag_index.py
+# RAG 임베딩 검색 백엔드 (04_app_chat_dashboard_rag.py 에서 import 해서 사용)
+# - EmbeddingStore: 빌드 시 단위 정규화해 둔 임베딩 (float32 / float16 / int8+행별 scale)
+# - ExactIndex : 전체 행 내적 스캔 (기존 방식, 폴백용)
+# - IVFIndex   : k-means 군집(IVF) 기반 근사 최근접 탐색(ANN), NumPy만 사용
+# - recall_at_k: ANN Top-K가 Exact Top-K를 얼마나 재현하는지 측정
+# - IndexRegistry: 파일 서명별 색인을 프로세스 전체에서 공유(mmap 읽기 전용 뷰)
+import pathlib, threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+import numpy as np
+
+ANN_MIN_ROWS = 2000     # 섹션 수가 이보다 적으면 auto 모드에서 exact 스캔 사용
+BACKENDS = ["auto", "ivf", "exact"]
+STORE_DTYPES = ["float32", "float16", "int8"]
+SCORE_BLOCK = 2048      # float16/int8 저장 시 float32로 올려 계산하는 행 블록 크기
+REGISTRY_MAX = 16       # 공유 레지스트리에 열어 둘 색인 수 (초과 시 가장 오래 안 쓴 것부터 해제)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 공통 유틸
+# ──────────────────────────────────────────────────────────────────────────────
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / (np.linalg.norm(x, axis=-1, keepdims=True) + 1e-8)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """점수 내림차순 상위 k개 위치 (전체 정렬 대신 argpartition 후 k개만 정렬)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return part[np.argsort(-scores[part])]
+
+def unit_query(qv: np.ndarray) -> np.ndarray:
+    return normalize(np.asarray(qv, dtype=np.float32).ravel())
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 0) EmbeddingStore: 단위 벡터를 빌드 시 1회 정규화 → 질의 시엔 내적(matvec)만
+#    - float16: 메모리 1/2
+#    - int8   : 행별 scale(max|x|/127)로 양자화, 메모리 약 1/4
+# ──────────────────────────────────────────────────────────────────────────────
+class EmbeddingStore:
+    def __init__(self, data: np.ndarray, scale: Optional[np.ndarray] = None):
+        self.data = data                # (N, d) float32 | float16 | int8
+        self.scale = scale              # int8일 때만 (N,) float32
+
+    @classmethod
+    def from_embeddings(cls, emb: np.ndarray, dtype: str = "float32") -> "EmbeddingStore":
+        x = normalize(np.asarray(emb, dtype=np.float32))
+        if dtype == "float16":
+            return cls(x.astype(np.float16))
+        if dtype == "int8":
+            scale = (np.abs(x).max(axis=1) / 127.0 + 1e-12).astype(np.float32)
+            return cls(np.round(x / scale[:, None]).astype(np.int8), scale)
+        return cls(x)
+
+    @property
+    def dtype(self) -> str:
+        return self.data.dtype.name
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def take(self, rows: np.ndarray) -> "EmbeddingStore":
+        return EmbeddingStore(self.data[rows], None if self.scale is None else self.scale[rows])
+
+    def dense(self, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """float32 단위 벡터(근사)로 복원"""
+        d = self.data[lo:hi].astype(np.float32)
+        return d * self.scale[lo:hi, None] if self.scale is not None else d
+
+    def scores(self, q: np.ndarray, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """단위 질의 벡터 q와 [lo:hi] 행의 코사인 유사도"""
+        d = self.data[lo:hi]
+        if d.dtype == np.float32:
+            return d @ q
+        # float16/int8은 BLAS 경로가 없으므로 블록 단위로 float32 변환 후 matvec (메모리만 절약, 점수 계산은 float32보다 느림)
+        out = np.empty(len(d), dtype=np.float32)
+        for s in range(0, len(d), SCORE_BLOCK):
+            out[s:s + SCORE_BLOCK] = d[s:s + SCORE_BLOCK].astype(np.float32) @ q
+        if self.scale is not None:
+            out *= self.scale[lo:hi]
+        return out
+
+    # ── 저장/로드: {key}.npy(float32) | {key}.float16.npy | {key}.int8.npy + {key}.int8.scale.npy
+    def save(self, cache_dir: pathlib.Path, cache_key: str):
+        np.save(store_path(cache_dir, cache_key, self.dtype), self.data)
+        if self.scale is not None:
+            np.save(cache_dir / f"{cache_key}.int8.scale.npy", self.scale)
+
+    @classmethod
+    def load(cls, cache_dir: pathlib.Path, cache_key: str, dtype: str = "float32",
+             mmap: bool = False, base: Optional[np.ndarray] = None) -> Optional["EmbeddingStore"]:
+        """
+        mmap=True면 np.load(mmap_mode="r") — 같은 파일을 여는 모든 세션/프로세스가 OS 페이지 캐시를 공유
+        base: float32 원본을 이미 연 경우(.rag 번들의 memmap) — float32면 그대로, 다른 형식은 여기서 변환
+        """
+        if dtype == "float32" and base is not None:
+            return cls(base)
+        mode = "r" if mmap else None
+        p = store_path(cache_dir, cache_key, dtype)
+        if p.exists():
+            scale = np.load(cache_dir / f"{cache_key}.int8.scale.npy", mmap_mode=mode) if dtype == "int8" else None
+            return cls(np.load(p, mmap_mode=mode), scale)
+        # 다른 형식 캐시만 있으면 float32 원본에서 변환 후 저장
+        if base is None and store_path(cache_dir, cache_key, "float32").exists():
+            base = np.load(store_path(cache_dir, cache_key, "float32"))
+        if base is not None:
+            store = cls.from_embeddings(np.asarray(base), dtype)
+            store.save(cache_dir, cache_key)
+            return cls.load(cache_dir, cache_key, dtype, mmap) if mmap else store
+        return None
+
+def store_path(cache_dir: pathlib.Path, cache_key: str, dtype: str) -> pathlib.Path:
+    return cache_dir / (f"{cache_key}.npy" if dtype == "float32" else f"{cache_key}.{dtype}.npy")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) Exact: 모든 행과 내적 (정확하지만 O(N))
+#    - order가 있으면 store가 재배치된 상태(IVF 공유)이므로 원래 행 번호로 역매핑
+# ──────────────────────────────────────────────────────────────────────────────
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, store: EmbeddingStore, order: Optional[np.ndarray] = None):
+        self.store = store
+        self.order = order
+
+    def __len__(self):
+        return len(self.store)
+
+    def search(self, qv: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims = self.store.scores(unit_query(qv))
+        top = top_k_indices(sims, k)
+        rows = top if self.order is None else self.order[top]
+        return rows, sims[top]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) IVF: 벡터를 nlist개 군집으로 나누고, 질의와 가까운 nprobe개 군집만 스캔
+#    - 군집별로 행을 연속 배치(emb_sorted)해서 후보 스캔이 슬라이스 연산이 되도록 함
+#    - 반환 위치는 원래 행 번호(order로 역매핑)
+# ──────────────────────────────────────────────────────────────────────────────
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray,
+                 store: EmbeddingStore, nprobe: int):
+        self.centroids = centroids      # (nlist, d) 단위 벡터
+        self.order = order              # 군집 순서로 정렬된 원래 행 번호
+        self.offsets = offsets          # 군집 c의 행 범위 = offsets[c]:offsets[c+1]
+        self.store = store              # order 순서로 재배치한 EmbeddingStore
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, store: EmbeddingStore, nlist: Optional[int] = None, n_iter: int = 10,
+              nprobe: Optional[int] = None, seed: int = 0) -> "IVFIndex":
+        x = store.dense()
+        n = len(x)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+
+        # 구형(spherical) k-means: 학습은 샘플(최대 군집당 64개)로만 수행
+        sample = x[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            sums[counts == 0] = centroids[counts == 0]   # 빈 군집은 이전 중심 유지
+            centroids = normalize(sums)
+
+        assign = np.argmax(x @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        nprobe = nprobe or max(4, nlist // 10)
+        return cls(centroids.astype(np.float32), order, offsets, store.take(order), nprobe)
+
+    def exact(self) -> ExactIndex:
+        """재배치된 store를 그대로 공유하는 전체 스캔(폴백) — 메모리 추가 없음"""
+        return ExactIndex(self.store, self.order)
+
+    def search(self, qv: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        q = unit_query(qv)
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        c_sims = self.centroids @ q
+        probe = np.argpartition(-c_sims, nprobe - 1)[:nprobe]
+
+        pos, sims = [], []
+        for c in probe:
+            lo, hi = self.offsets[c], self.offsets[c + 1]
+            if hi > lo:
+                pos.append(np.arange(lo, hi))
+                sims.append(self.store.scores(q, lo, hi))
+        if not pos:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        pos = np.concatenate(pos)
+        sims = np.concatenate(sims)
+        top = top_k_indices(sims, k)
+        return self.order[pos[top]], sims[top]
+
+    # ── 저장/로드: .rag_cache/{key}.ivf.npz + 군집 순서로 재배치한 store({key}.ivf[.dtype].npy)
+    #    재배치본도 파일로 두어야 mmap 공유가 가능(로드 시 fancy-index 복사가 생기지 않음)
+    def save(self, cache_dir: pathlib.Path, cache_key: str):
+        np.savez(ann_path(cache_dir, cache_key), centroids=self.centroids, order=self.order,
+                 offsets=self.offsets, nprobe=np.int64(self.nprobe))
+        self.store.save(cache_dir, f"{cache_key}.ivf")
+
+    @classmethod
+    def load(cls, cache_dir: pathlib.Path, cache_key: str, store: EmbeddingStore,
+             mmap: bool = False) -> "IVFIndex":
+        z = np.load(ann_path(cache_dir, cache_key))
+        order = z["order"]
+        sorted_store = EmbeddingStore.load(cache_dir, f"{cache_key}.ivf", store.dtype, mmap)
+        if sorted_store is None or len(sorted_store) != len(order):
+            sorted_store = store.take(order)
+            sorted_store.save(cache_dir, f"{cache_key}.ivf")
+        return cls(z["centroids"], order, z["offsets"], sorted_store, int(z["nprobe"]))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 백엔드 선택 / 캐시 경로 / 품질 측정
+# ──────────────────────────────────────────────────────────────────────────────
+def ann_path(cache_dir: pathlib.Path, cache_key: str) -> pathlib.Path:
+    return cache_dir / f"{cache_key}.ivf.npz"
+
+def use_ann(n_rows: int, backend: str) -> bool:
+    if backend == "exact":
+        return False
+    if backend == "ivf":
+        return True
+    return n_rows >= ANN_MIN_ROWS
+
+def build_ann(store: EmbeddingStore, cache_dir: pathlib.Path, cache_key: str) -> IVFIndex:
+    ann = IVFIndex.build(store)
+    ann.save(cache_dir, cache_key)
+    return ann
+
+def load_ann(store: EmbeddingStore, cache_dir: pathlib.Path, cache_key: str,
+             mmap: bool = False) -> Optional[IVFIndex]:
+    if ann_path(cache_dir, cache_key).exists():
+        ann = IVFIndex.load(cache_dir, cache_key, store, mmap)
+        if len(ann) == len(store):
+            return ann
+    return None
+
+def make_index(store: EmbeddingStore, ann: Optional[IVFIndex], meta: list) -> dict:
+    """세션에 보관할 색인 dict — IVF가 있으면 exact 폴백도 IVF store를 공유"""
+    exact = ann.exact() if ann is not None else ExactIndex(store)
+    return {"exact": exact, "ann": ann, "meta": meta}
+
+def search_index(index: dict, qv: np.ndarray, k: int, backend: str = "auto",
+                 nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    ann = index.get("ann")
+    if ann is not None and backend != "exact":
+        return ann.search(qv, k, nprobe=nprobe)
+    return index["exact"].search(qv, k)
+
+def recall_at_k(ann, exact: ExactIndex, queries: np.ndarray, k: int, nprobe: Optional[int] = None) -> float:
+    """질의별 |ANN Top-K ∩ Exact Top-K| / k 평균"""
+    hits = 0
+    total = 0
+    for q in queries:
+        truth, _ = exact.search(q, k)
+        got, _ = ann.search(q, k, nprobe=nprobe)
+        hits += len(set(truth.tolist()) & set(got.tolist()))
+        total += len(truth)
+    return hits / total if total else 1.0
+
+def self_recall(ann: IVFIndex, k: int, n_queries: int = 100, nprobe: Optional[int] = None,
+                seed: int = 0) -> float:
+    """색인 자체 행(+약한 노이즈)을 질의로 써서 recall@k 추정 (빌드 직후 리포트용)"""
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(ann), size=min(n_queries, len(ann)), replace=False))
+    q = ann.store.take(rows).dense()
+    q = q + rng.normal(scale=0.05 * float(np.abs(q).mean() + 1e-8), size=q.shape).astype(np.float32)
+    return recall_at_k(ann, ann.exact(), q, k, nprobe=nprobe)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 4) IndexRegistry: 프로세스 전역 색인 공유
+#    - 키: file_signature(SHA-256) + 저장 형식 + 검색 백엔드
+#    - 값: mmap 읽기 전용 store를 가진 색인 dict → 모든 세션이 같은 객체를 참조
+#    - 로드(IVF k-means 포함)는 키별 잠금 안에서 → 다른 키 조회/로드는 기다리지 않음, 같은 키는 1번만 로드
+#    - 최대 maxsize개 (LRU) — 지나간 문서 선택 조합의 색인이 계속 쌓이지 않도록
+# ──────────────────────────────────────────────────────────────────────────────
+class IndexRegistry:
+    def __init__(self, maxsize: int = REGISTRY_MAX):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}   # 로드 중인 키 → 키별 잠금
+        self._lock = threading.Lock()                   # _items / _loading 조회·갱신만 (짧게)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: str):
+        return key in self._items
+
+    def _cached(self, key: str) -> Optional[dict]:
+        index = self._items.get(key)
+        if index is not None:
+            self._items.move_to_end(key)
+        return index
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[dict]]) -> Optional[dict]:
+        with self._lock:
+            index = self._cached(key)
+            if index is not None:
+                return index
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:            # 기다리는 동안 다른 세션이 이미 로드했으면 그것을 사용
+                index = self._cached(key)
+            if index is not None:
+                return index
+            try:
+                index = loader()
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+            if index is not None:
+                with self._lock:
+                    self._items[key] = index
+                    self._items.move_to_end(key)
+                    while len(self._items) > self.maxsize:
+                        self._items.popitem(last=False)
+            return index
+
+    def sigs(self) -> Set[str]:
+        """지금 열려 있는 색인들의 캐시 키(파일 서명)"""
+        with self._lock:
+            return {k.split(":", 1)[0] for k in self._items}
+
+    def evict(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def evict_sig(self, sig: str):
+        """해당 캐시 키(파일 서명)의 모든 저장 형식/백엔드 조합 제거"""
+        with self._lock:
+            for key in [k for k in self._items if k.startswith(f"{sig}:")]:
+                del self._items[key]
+
+    def mapped_bytes(self) -> int:
+        """공유 중인 임베딩 바이트(세션 수와 무관하게 1벌)"""
+        return sum(ix["exact"].store.nbytes for ix in self._items.values())
+
+def registry_key(sig: str, dtype: str, backend: str) -> str:
+    return f"{sig}:{dtype}:{backend}"
@@ -0,0 +1,126 @@
+# rag_jobs.py
+# 백그라운드 빌드 작업 관리자 (04_app_chat_dashboard_rag.py 에서 st.cache_resource 로 1개 보관)
+# - Streamlit 스크립트 재실행과 무관하게 작업 스레드에서 추출 → 청킹 → 임베딩 → 색인 기록 실행
+# - 단계별 진행률(done/total), 취소(협조적: 진행률 보고 시점마다 취소 여부 확인), 오류 보관
+# - 작업 함수 안에서는 st.* 를 호출하지 않음 (진행 상황은 BuildJob 객체로만 전달)
+import itertools, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+BUILD_WORKERS = 2           # 동시에 빌드할 문서 수
+KEEP_FINISHED = 50          # 끝난 작업 기록 보관 개수
+
+class JobCancelled(Exception):
+    pass
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 작업 1개의 상태
+# ──────────────────────────────────────────────────────────────────────────────
+class BuildJob:
+    def __init__(self, job_id: int, name: str, key: str):
+        self.id = job_id
+        self.name = name
+        self.key = key                      # 같은 key(문서 id)의 진행 중 작업은 1개만
+        self.status = "queued"              # queued → running → done | failed | cancelled
+        self.stage = ""
+        self.stages: Dict[str, List[int]] = {}     # 단계 → [done, total] (입력 순서 유지)
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.t_submit = time.time()
+        self.t_start: Optional[float] = None
+        self.t_end: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    # ── 작업 함수에서 호출
+    def set_stage(self, stage: str, total: int = 0):
+        self.check_cancelled()
+        with self._lock:
+            self.stage = stage
+            self.stages[stage] = [0, total]
+
+    def progress(self, done: int, total: Optional[int] = None):
+        """현재 단계 진행률 갱신 + 취소 요청 확인 (취소됐으면 JobCancelled)"""
+        with self._lock:
+            cur = self.stages.setdefault(self.stage, [0, 0])
+            cur[0] = done
+            if total is not None:
+                cur[1] = total
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    # ── UI에서 호출
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.t_end or time.time()
+            return {"id": self.id, "name": self.name, "status": self.status, "stage": self.stage,
+                    "stages": {k: tuple(v) for k, v in self.stages.items()}, "error": self.error,
+                    "elapsed_s": round(end - (self.t_start or end), 1)}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 작업 관리자: 스레드 풀 + 작업 목록
+# ──────────────────────────────────────────────────────────────────────────────
+class JobManager:
+    def __init__(self, max_workers: int = BUILD_WORKERS, keep: int = KEEP_FINISHED):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-build")
+        self._jobs: Dict[int, BuildJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(self, name: str, key: str, fn: Callable[..., Any], *args, **kw) -> BuildJob:
+        """fn(job, *args, **kw) 를 백그라운드 실행 — 같은 key가 진행 중이면 그 작업을 반환"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.active:
+                    return job
+            job = BuildJob(next(self._ids), name, key)
+            self._jobs[job.id] = job
+            self._trim()
+        self._pool.submit(self._run, job, fn, args, kw)
+        return job
+
+    def _run(self, job: BuildJob, fn: Callable[..., Any], args, kw):
+        job.t_start = time.time()
+        job.status = "running"
+        try:
+            job.check_cancelled()           # 대기 중에 취소된 경우
+            job.result = fn(job, *args, **kw)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            traceback.print_exc()
+        finally:
+            job.t_end = time.time()
+
+    def _trim(self):
+        done = [j for j in self._jobs.values() if not j.active]
+        for j in done[:max(0, len(done) - self.keep)]:
+            del self._jobs[j.id]
+
+    def get(self, job_id: int) -> Optional[BuildJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[BuildJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active_count(self) -> int:
+        return sum(1 for j in self.jobs() if j.active)
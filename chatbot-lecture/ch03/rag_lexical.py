@@ -0,0 +1,147 @@
+# rag_lexical.py
+# 로컬 BM25 역색인 + 하이브리드(어휘 + 임베딩) 점수 결합 (04_app_chat_dashboard_rag.py 에서 사용)
+# - 토큰화: 영문/숫자는 단어 단위, 한글 등은 문자 2-gram (조사/어미가 붙어도 어간 bigram이 겹침)
+# - 색인: 용어별 posting(CSR: indptr/doc_ids)에 BM25 가중치를 빌드 시 미리 계산해 저장 (.rag 번들에 함께 기록)
+#         → 질의 시엔 해당 용어 posting 슬라이스를 모아 np.bincount 한 번
+# - 하이브리드: 두 후보 목록 점수를 각각 min-max 정규화 후 alpha 가중합
+# - lexical 모드는 질의 임베딩(네트워크 왕복) 없이 검색 → 첫 토큰까지 시간 단축
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+from rag_index import top_k_indices
+from rag_store import pack_strings, unpack_strings
+
+RAG_MODES = ["dense", "hybrid", "lexical"]
+BM25_K1 = 1.5
+BM25_B = 0.75
+HYBRID_ALPHA = 0.5          # 하이브리드에서 임베딩 점수 비중 (1.0이면 dense와 동일)
+CAND_MULT = 4               # 결합 전 각 방식에서 k * CAND_MULT 개 후보를 뽑음
+
+TOKEN_RE = re.compile(r"[a-z0-9]+|[^\W\d_a-z]+")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 토큰화
+# ──────────────────────────────────────────────────────────────────────────────
+def tokenize(text: str) -> List[str]:
+    """'설치절차를 확인 the Device' → ['설치', '치절', '절차', '차를', '확인', 'the', 'device']"""
+    out = []
+    for w in TOKEN_RE.findall(text.lower()):
+        if w.isascii():
+            out.append(w)
+        elif len(w) == 1:
+            out.append(w)
+        else:
+            out.extend(w[i:i + 2] for i in range(len(w) - 1))
+    return out
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) BM25 역색인
+# ──────────────────────────────────────────────────────────────────────────────
+class BM25Index:
+    kind = "bm25"
+
+    def __init__(self, terms: List[str], indptr: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, n_docs: int):
+        self.terms = terms                  # (V,) 용어 문자열
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.indptr = indptr                # (V+1,) 용어 i의 posting = [indptr[i], indptr[i+1])
+        self.doc_ids = doc_ids              # (P,) int32 문서(행) 번호
+        self.weights = weights              # (P,) float32 BM25 가중치 (idf · tf 포화 · 길이 정규화)
+        self.n_docs = n_docs
+
+    def __len__(self):
+        return self.n_docs
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.doc_ids.nbytes + self.weights.nbytes
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        t_ids, d_ids, tfs = [], [], []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[d] = sum(counts.values())
+            for t, c in counts.items():
+                t_ids.append(vocab.setdefault(t, len(vocab)))
+                d_ids.append(d)
+                tfs.append(c)
+        t_ids = np.asarray(t_ids, dtype=np.int64)
+        d_ids = np.asarray(d_ids, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+
+        # 용어 순으로 정렬(안정 정렬 → 용어 안에서는 문서 순서 유지) → CSR
+        order = np.argsort(t_ids, kind="stable")
+        t_ids, d_ids, tf = t_ids[order], d_ids[order], tf[order]
+        df = np.bincount(t_ids, minlength=len(vocab))
+        indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        n = max(1, len(texts))
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        avgdl = max(1e-8, float(doc_len.mean())) if len(texts) else 1.0
+        norm = k1 * (1.0 - b + b * doc_len[d_ids] / avgdl)
+        weights = (idf[t_ids] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        return cls(list(vocab), indptr, d_ids, weights, len(texts))   # dict 삽입 순서 = 용어 id
+
+    def scores(self, query: str) -> np.ndarray:
+        """전체 문서 BM25 점수 (질의 용어 posting만 모아 합산)"""
+        q = Counter(t for t in tokenize(query) if t in self.vocab)
+        if not q:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        docs, w = [], []
+        for t, c in q.items():
+            i = self.vocab[t]
+            lo, hi = self.indptr[i], self.indptr[i + 1]
+            docs.append(self.doc_ids[lo:hi])
+            w.append(self.weights[lo:hi] * c)
+        return np.bincount(np.concatenate(docs), weights=np.concatenate(w),
+                           minlength=self.n_docs).astype(np.float32)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        s = self.scores(query)
+        top = top_k_indices(s, k)
+        top = top[s[top] > 0]               # 겹치는 용어가 하나도 없는 문서는 제외
+        return top, s[top]
+
+    # ── 번들 입출력 (용어는 UTF-8 버퍼 + 오프셋, 나머지는 배열 그대로)
+    def arrays(self, prefix: str = "bm25.") -> Dict[str, np.ndarray]:
+        terms_buf, terms_off = pack_strings(self.terms)
+        return {prefix + "terms_buf": terms_buf, prefix + "terms_off": terms_off, prefix + "indptr": self.indptr,
+                prefix + "doc_ids": self.doc_ids, prefix + "weights": self.weights}
+
+    @classmethod
+    def from_bundle(cls, arrays: Dict[str, np.ndarray], n_docs: int, prefix: str = "bm25.") -> "BM25Index":
+        terms = unpack_strings(arrays[prefix + "terms_buf"], arrays[prefix + "terms_off"])
+        return cls(terms, arrays[prefix + "indptr"], arrays[prefix + "doc_ids"], arrays[prefix + "weights"], n_docs)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 하이브리드 결합
+#    - 각 후보 목록 점수를 [0, 1]로 min-max 정규화, 한쪽 목록에만 있으면 다른 쪽은 0
+#    - fused = alpha · dense + (1 - alpha) · lexical
+# ──────────────────────────────────────────────────────────────────────────────
+def _minmax(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores
+    lo, hi = float(scores.min()), float(scores.max())
+    if hi - lo < 1e-9:
+        return np.ones_like(scores, dtype=np.float32)
+    return ((scores - lo) / (hi - lo)).astype(np.float32)
+
+def fuse_scores(dense: Tuple[np.ndarray, np.ndarray], lexical: Tuple[np.ndarray, np.ndarray],
+                k: int, alpha: float = HYBRID_ALPHA) -> Tuple[np.ndarray, np.ndarray]:
+    """(rows, scores) 두 목록 → 결합 점수 상위 k개 (rows, fused)"""
+    fused: Dict[int, float] = {}
+    for (rows, s), wgt in ((dense, alpha), (lexical, 1.0 - alpha)):
+        for r, v in zip(rows.tolist(), _minmax(np.asarray(s, dtype=np.float32)).tolist()):
+            fused[r] = fused.get(r, 0.0) + wgt * v
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    vals = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    top = top_k_indices(vals, k)
+    return rows[top], vals[top]
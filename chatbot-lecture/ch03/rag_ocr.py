@@ -0,0 +1,248 @@
+# rag_ocr.py
+# 이미지 OCR 파이프라인 (04_app_chat_dashboard_rag.py 이미지 업로드 / 스캔 PDF 페이지에서 사용)
+# - 전처리: EXIF 회전 보정 → 흑백 → 큰 이미지는 축소 → Otsu 이진화
+# - 큰 스캔은 가로 띠(tile)로 분할: 목표 높이 근처에서 잉크가 가장 적은 행(줄 사이 여백)을 잘라 글자 줄이 잘리지 않게
+# - 띠들은 프로세스 풀에서 병렬 OCR → 위에서부터 순서대로 이어 붙임
+# - 결과는 이미지 바이트 해시(+언어/전처리 설정)로 SQLite 캐시 → 같은 이미지는 즉시
+# - OCR 언어(kor+eng / eng)는 설치된 traineddata를 보고 프로세스당 1번만 결정 (실패 후 재시도 없음)
+import collections, hashlib, io, os, pathlib, sqlite3, tempfile, threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from rag_extract import PageText, available_cpus, pdfplumber
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+    ImageOps = None
+
+try:
+    import pytesseract  # 시스템에 Tesseract 설치 필요
+except Exception:
+    pytesseract = None
+
+MAX_SIDE = 3500             # 긴 변이 이보다 크면 축소 (300dpi A4 ≈ 2480x3508)
+TILE_HEIGHT = 1000          # 띠 목표 높이(px)
+TILE_SEARCH = 120           # 자를 위치를 찾는 범위(목표 높이 ± px)
+MIN_TILE_PIXELS = 1500 * 1500   # 이보다 작은 이미지는 나누지 않음
+OCR_CONFIG = "--psm 6"      # 띠 하나 = 균일한 텍스트 블록
+PREPROCESS_VERSION = 1      # 전처리 방식이 바뀌면 올려서 캐시 무효화
+PDF_OCR_DPI = 300           # 스캔 PDF 페이지 렌더링 해상도
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 언어 결정 (프로세스당 1회)
+# ──────────────────────────────────────────────────────────────────────────────
+def ocr_available() -> bool:
+    return Image is not None and pytesseract is not None
+
+@lru_cache(maxsize=1)
+def ocr_languages() -> str:
+    """설치된 언어 데이터 기준: kor 있으면 'kor+eng', 없으면 'eng' (Tesseract 자체가 없으면 '')"""
+    if not ocr_available():
+        return ""
+    try:
+        langs = set(pytesseract.get_languages(config=""))
+    except Exception:
+        return ""
+    if "kor" in langs:
+        return "kor+eng" if "eng" in langs else "kor"
+    return "eng"
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 전처리 / 띠 분할
+# ──────────────────────────────────────────────────────────────────────────────
+def otsu_threshold(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    w0 = np.cumsum(hist)
+    m0 = np.cumsum(hist * np.arange(256))
+    total, mean = w0[-1], m0[-1]
+    w1 = total - w0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean * w0 / total - m0) ** 2 / (w0 * w1 / total)
+    return int(np.nanargmax(between[:-1])) if total else 127
+
+def preprocess(image) -> np.ndarray:
+    """PIL 이미지 → 이진화된 uint8 배열 (글자 0, 배경 255)"""
+    img = ImageOps.exif_transpose(image).convert("L")
+    scale = MAX_SIDE / max(img.size)
+    if scale < 1:
+        img = img.resize((int(img.width * scale), int(img.height * scale)), Image.LANCZOS)
+    gray = np.asarray(img, dtype=np.uint8)
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+def split_tiles(binary: np.ndarray, tile_height: int = TILE_HEIGHT, search: int = TILE_SEARCH) -> List[Tuple[int, int]]:
+    """[(위, 아래)] 행 범위 — 목표 높이 근처에서 잉크(검은 픽셀)가 가장 적은 행에서 자름"""
+    h = binary.shape[0]
+    if binary.size <= MIN_TILE_PIXELS or h <= tile_height + search:
+        return [(0, h)]
+    ink = (binary < 128).sum(axis=1)
+    cuts, top = [], 0
+    while h - top > tile_height + search:
+        lo, hi = top + tile_height - search, top + tile_height + search
+        cut = lo + int(np.argmin(ink[lo:hi]))
+        cuts.append((top, cut))
+        top = cut
+    cuts.append((top, h))
+    return cuts
+
+def _ocr_tile(tile: np.ndarray, lang: str, config: str = OCR_CONFIG) -> str:
+    """워커 프로세스에서 실행 (pickle 가능한 최상위 함수)"""
+    if not (tile < 128).any():          # 빈 띠(여백)는 건너뜀
+        return ""
+    return pytesseract.image_to_string(Image.fromarray(tile), lang=lang or None, config=config).strip()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 공유 프로세스 풀 (이미지/스캔 PDF 페이지 OCR 공용, 프로세스당 1개)
+# ──────────────────────────────────────────────────────────────────────────────
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def shared_pool(workers: Optional[int] = None) -> Optional[Executor]:
+    """코어가 1개면 None (현재 프로세스에서 순차 처리)"""
+    global _POOL
+    workers = workers or available_cpus()
+    if workers <= 1:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=workers)
+        return _POOL
+
+def ocr_tiles(tiles: List[np.ndarray], lang: str, pool: Optional[Executor] = None) -> List[str]:
+    """띠 목록 OCR → 입력 순서대로 텍스트"""
+    if pool is None or len(tiles) == 1:
+        return [_ocr_tile(t, lang) for t in tiles]
+    return list(pool.map(_ocr_tile, tiles, [lang] * len(tiles)))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 4) OCR 결과 캐시 (SQLite: 키 → 텍스트)
+# ──────────────────────────────────────────────────────────────────────────────
+class OCRCache:
+    def __init__(self, path: pathlib.Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ocr (k TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO ocr (k, text) VALUES (?, ?)", (key, text))
+            self._conn.commit()
+
+def ocr_key(data: bytes, lang: str) -> str:
+    h = hashlib.sha256(data)
+    h.update(f"\n{lang}\n{OCR_CONFIG}\n{PREPROCESS_VERSION}".encode("utf-8"))
+    return h.hexdigest()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 5) 진입점
+# ──────────────────────────────────────────────────────────────────────────────
+def ocr_image(data: bytes, cache: Optional[OCRCache] = None, pool: Optional[Executor] = None,
+              stats: Optional[Dict[str, int]] = None) -> str:
+    """
+    이미지 바이트 → 텍스트 (캐시 → 전처리 → 띠 분할 → 병렬 OCR)
+    stats가 주어지면 {"cached", "tiles"} 누적
+    """
+    lang = ocr_languages()
+    key = ocr_key(data, lang)
+    if cache is not None:
+        text = cache.get(key)
+        if text is not None:
+            if stats is not None:
+                stats["cached"] = stats.get("cached", 0) + 1
+            return text
+    binary = preprocess(Image.open(io.BytesIO(data)))
+    tiles = [binary[a:b] for a, b in split_tiles(binary)]
+    text = "\n".join(t for t in ocr_tiles(tiles, lang, pool) if t)
+    if stats is not None:
+        stats["tiles"] = stats.get("tiles", 0) + len(tiles)
+    if cache is not None:
+        cache.put(key, text)
+    return text
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 6) 스캔 PDF: 텍스트 없는 페이지만 렌더링 → OCR (rag_extract.iter_pdf_pages 결과에 덧씌움)
+#    - 캐시 키 = 페이지 내용 해시(PageText.digest) → 같은 PDF를 다시 올리면 렌더링/OCR 없이 즉시
+#    - 미스 페이지는 워커 프로세스에서 렌더링 + 전처리 + 띠 OCR (PDF는 임시 파일 경로로 전달 → 작업마다 바이트 복사 없음)
+#    - 텍스트 페이지는 그대로 통과, 출력은 항상 페이지 순서
+# ──────────────────────────────────────────────────────────────────────────────
+def _ocr_pdf_page(pdf_path: str, page_no: int, lang: str) -> str:
+    """워커 프로세스에서 실행: 페이지 1장 렌더링 → 전처리 → 띠 단위 순차 OCR"""
+    with pdfplumber.open(pdf_path) as pdf:
+        image = pdf.pages[page_no - 1].to_image(resolution=PDF_OCR_DPI).original
+    binary = preprocess(image)
+    return "\n".join(t for t in (_ocr_tile(binary[a:b], lang) for a, b in split_tiles(binary)) if t)
+
+def ocr_pdf_pages(pdf_bytes: bytes, pages: Iterable[PageText], cache: Optional[OCRCache] = None,
+                  pool: Optional[Executor] = None, stats: Optional[Dict[str, int]] = None) -> Iterator[PageText]:
+    """
+    PageText 스트림에서 텍스트 없는 페이지(digest 있음)만 OCR 텍스트로 채워 페이지 순서대로 내보냄
+    - OCR을 못 쓰는 환경이면 입력을 그대로 통과
+    - 페이지 1장의 OCR 실패는 그 페이지만 빈 텍스트로 두고 계속 (캐시에 기록하지 않음)
+    - stats가 주어지면 {"ocr", "cached", "failed"} 누적
+    """
+    lang = ocr_languages()
+    if not (ocr_available() and lang and pdfplumber):
+        yield from pages
+        return
+    stats = stats if stats is not None else {}
+    pending: "collections.deque[Tuple[PageText, Optional[Future], str]]" = collections.deque()   # (페이지, OCR 작업, 캐시 키)
+    tmp_path = None
+    try:
+        for pt in pages:
+            fut, key = None, ""
+            if pt.digest:
+                key = ocr_key(pt.digest.encode("ascii"), lang)
+                text = cache.get(key) if cache is not None else None
+                if text is not None:
+                    stats["cached"] = stats.get("cached", 0) + 1
+                    pt = pt._replace(text=text)
+                else:
+                    if tmp_path is None:
+                        fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(pdf_bytes)
+                    if pool is None:
+                        fut = Future()
+                        try:
+                            fut.set_result(_ocr_pdf_page(tmp_path, pt.page, lang))
+                        except Exception as e:
+                            fut.set_exception(e)
+                    else:
+                        fut = pool.submit(_ocr_pdf_page, tmp_path, pt.page, lang)
+            pending.append((pt, fut, key))
+            # 앞쪽 페이지가 준비되는 대로 내보냄 (뒤쪽 OCR은 그동안 계속 진행)
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                yield _resolve(pending.popleft(), cache, stats)
+        while pending:
+            yield _resolve(pending.popleft(), cache, stats)
+    finally:
+        running = [fut for _, fut, _ in pending if fut is not None and not fut.cancel()]
+        for fut in running:             # 소비 중단/오류 시: 대기 작업은 취소, 실행 중인 작업은 끝날 때까지 기다린 뒤
+            fut.exception()
+        if tmp_path is not None:        # 임시 PDF 삭제
+            os.unlink(tmp_path)
+
+def _resolve(item: Tuple[PageText, Optional[Future], str], cache: Optional[OCRCache], stats: Dict[str, int]) -> PageText:
+    pt, fut, key = item
+    if fut is None:
+        return pt
+    try:
+        text = fut.result()
+    except Exception:
+        stats["failed"] = stats.get("failed", 0) + 1
+        return pt
+    if cache is not None:
+        cache.put(key, text)
+    stats["ocr"] = stats.get("ocr", 0) + 1
+    return pt._replace(text=text)
@@ -0,0 +1,168 @@
+# rag_store.py
+# 섹션 열(column) 저장소 + 단일 파일 번들 (04_app_chat_dashboard_rag.py / rag_corpus.py 에서 사용)
+# - SectionTable: 섹션 메타/본문을 행 단위 dict 대신 열 배열로 보관
+#     · 제목/본문: UTF-8 바이트 버퍼 1개 + 오프셋 배열 (행 i = buf[off[i]:off[i+1]])
+#     · page / page_end / section_id / doc: int32 배열
+# - 번들(.rag): 임베딩 + 섹션 열 + BM25 배열을 파일 1개에 기록
+#     · [매직 8B][헤더 길이 8B][JSON 헤더][64B 정렬된 원시 배열들...]
+#     · 읽을 때 배열마다 np.memmap(offset) → 재실행/세션 간 재청킹·재파싱 없이 바로 검색
+import json, pathlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+BUNDLE_MAGIC = b"RAGBNDL1"
+BUNDLE_ALIGN = 64
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 단일 파일 번들
+# ──────────────────────────────────────────────────────────────────────────────
+def bundle_path(cache_dir: pathlib.Path, cache_key: str) -> pathlib.Path:
+    return cache_dir / f"{cache_key}.rag"
+
+def write_bundle(path: pathlib.Path, arrays: Dict[str, np.ndarray], attrs: Optional[Dict[str, Any]] = None):
+    """배열 묶음 + 속성(JSON) 기록 — 임시 파일에 쓴 뒤 교체(읽는 쪽이 반쯤 쓴 파일을 보지 않도록)"""
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+    spec, offset = {}, 0
+    for k, v in arrays.items():
+        spec[k] = {"dtype": v.dtype.str, "shape": list(v.shape), "offset": offset}
+        offset += -(-v.nbytes // BUNDLE_ALIGN) * BUNDLE_ALIGN
+    header = json.dumps({"arrays": spec, "attrs": attrs or {}}, ensure_ascii=False).encode("utf-8")
+    header += b" " * (-(len(BUNDLE_MAGIC) + 8 + len(header)) % BUNDLE_ALIGN)
+    base = len(BUNDLE_MAGIC) + 8 + len(header)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(BUNDLE_MAGIC + len(header).to_bytes(8, "little") + header)
+        for k, v in arrays.items():
+            f.seek(base + spec[k]["offset"])
+            f.write(v.tobytes())
+        f.truncate(base + offset)
+    tmp.replace(path)
+
+def read_header(path: pathlib.Path) -> Tuple[Dict[str, Any], int]:
+    """(헤더 dict, 데이터 시작 위치)"""
+    with open(path, "rb") as f:
+        if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+            raise ValueError(f"RAG 번들 파일이 아닙니다: {path}")
+        n = int.from_bytes(f.read(8), "little")
+        return json.loads(f.read(n)), len(BUNDLE_MAGIC) + 8 + n
+
+def read_bundle(path: pathlib.Path, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """(배열 dict, 속성) — mmap=True면 읽기 전용 memmap (OS 페이지 캐시를 모든 세션/프로세스가 공유)"""
+    header, base = read_header(path)
+    arrays = {}
+    raw = None if mmap else path.read_bytes()
+    for k, s in header["arrays"].items():
+        dtype, shape = np.dtype(s["dtype"]), tuple(s["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[k] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            arrays[k] = np.memmap(path, dtype=dtype, mode="r", offset=base + s["offset"], shape=shape)
+        else:
+            arrays[k] = np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape)),
+                                      offset=base + s["offset"]).reshape(shape)
+    return arrays, header["attrs"]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 문자열 열: UTF-8 버퍼 + 오프셋
+# ──────────────────────────────────────────────────────────────────────────────
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    off = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)), out=off[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), off
+
+def unpack_string(buf: np.ndarray, off: np.ndarray, i: int) -> str:
+    return buf[off[i]:off[i + 1]].tobytes().decode("utf-8")
+
+def unpack_strings(buf: np.ndarray, off: np.ndarray) -> List[str]:
+    raw = buf.tobytes()
+    return [raw[a:b].decode("utf-8") for a, b in zip(off[:-1].tolist(), off[1:].tolist())]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) SectionTable
+# ──────────────────────────────────────────────────────────────────────────────
+SECTION_COLUMNS = ["title_buf", "title_off", "text_buf", "text_off", "page", "page_end", "section_id", "doc"]
+
+class SectionTable:
+    def __init__(self, cols: Dict[str, np.ndarray], doc_ids: List[str], doc_names: List[str]):
+        self.cols = cols
+        self.doc_ids = doc_ids                      # doc 열 값 → 문서 id / 이름
+        self.doc_names = doc_names
+
+    def __len__(self):
+        return len(self.cols["section_id"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in self.cols.values())
+
+    @classmethod
+    def from_sections(cls, sections: List[Dict[str, Any]], doc_id: str = "", doc_name: str = "") -> "SectionTable":
+        title_buf, title_off = pack_strings([s["title"] for s in sections])
+        text_buf, text_off = pack_strings([s["content"] for s in sections])
+        cols = {
+            "title_buf": title_buf, "title_off": title_off, "text_buf": text_buf, "text_off": text_off,
+            "page": np.array([s.get("page") or 0 for s in sections], dtype=np.int32),
+            "page_end": np.array([s.get("page_end") or 0 for s in sections], dtype=np.int32),
+            "section_id": np.array([s["section_id"] for s in sections], dtype=np.int32),
+            "doc": np.zeros(len(sections), dtype=np.int32),
+        }
+        return cls(cols, [doc_id], [doc_name])
+
+    @classmethod
+    def concat(cls, tables: List["SectionTable"], names: Optional[Dict[str, str]] = None) -> "SectionTable":
+        """문서 순서대로 이어 붙임 — 버퍼는 그대로 잇고 오프셋만 누적 이동 (names: 문서 id → 표시 이름 갱신)"""
+        cols: Dict[str, List[np.ndarray]] = {k: [] for k in SECTION_COLUMNS}
+        doc_ids, doc_names = [], []
+        t_base = x_base = 0
+        for t in tables:
+            c = t.cols
+            cols["title_buf"].append(c["title_buf"])
+            cols["text_buf"].append(c["text_buf"])
+            cols["title_off"].append(c["title_off"][:-1] + t_base)
+            cols["text_off"].append(c["text_off"][:-1] + x_base)
+            t_base += len(c["title_buf"])
+            x_base += len(c["text_buf"])
+            for k in ("page", "page_end", "section_id"):
+                cols[k].append(c[k])
+            cols["doc"].append(c["doc"] + len(doc_ids))
+            doc_ids += t.doc_ids
+            doc_names += [(names or {}).get(d, n or d[:8]) for d, n in zip(t.doc_ids, t.doc_names)]
+        cols["title_off"].append(np.array([t_base], dtype=np.int64))
+        cols["text_off"].append(np.array([x_base], dtype=np.int64))
+        return cls({k: np.concatenate(v) for k, v in cols.items()}, doc_ids, doc_names)
+
+    # ── 행 접근 (O(1), 상위 k개만 디코드)
+    def title(self, i: int) -> str:
+        return unpack_string(self.cols["title_buf"], self.cols["title_off"], i)
+
+    def content(self, i: int) -> str:
+        return unpack_string(self.cols["text_buf"], self.cols["text_off"], i)
+
+    def text(self, i: int) -> str:
+        """임베딩/BM25 입력 텍스트 (제목 + 본문)"""
+        return f"{self.title(i)}\n{self.content(i)}"
+
+    def row(self, i: int) -> Dict[str, Any]:
+        c = self.cols
+        d = int(c["doc"][i])
+        return {
+            "title": self.title(i),
+            "content": self.content(i),
+            "page": int(c["page"][i]) or None,
+            "page_end": int(c["page_end"][i]) or None,
+            "section_id": int(c["section_id"][i]),
+            "doc_id": self.doc_ids[d],
+            "doc_name": self.doc_names[d] if len(self.doc_ids) > 1 else None,
+        }
+
+    # ── 번들 입출력
+    def arrays(self, prefix: str = "sec.") -> Dict[str, np.ndarray]:
+        return {prefix + k: v for k, v in self.cols.items()}
+
+    def attrs(self) -> Dict[str, Any]:
+        return {"doc_ids": self.doc_ids, "doc_names": self.doc_names}
+
+    @classmethod
+    def from_bundle(cls, arrays: Dict[str, np.ndarray], attrs: Dict[str, Any], prefix: str = "sec.") -> "SectionTable":
+        return cls({k: arrays[prefix + k] for k in SECTION_COLUMNS}, attrs["doc_ids"], attrs["doc_names"])
@@ -1,7 +1,7 @@
 # 003_app_instabot_streamlit.py
 # Streamlit: Instagram 캡션 생성 + 이미지 생성(DALL·E 2 기본) + 업로드(instagrapi)
 
-import os, io, time, urllib
+import os, io, time, urllib, sys
 from pathlib import Path
 
 import streamlit as st
@@ -15,8 +15,13 @@ load_dotenv()
 
 # OpenAI 최신 SDK 사용을 권장합니다.
 # pip install -U openai
+# 호출은 공유 게이트웨이(common/gateway.py) 경유 → 키별 연결 풀 1개, 429/5xx는 속도 조절 + 재시도
+LECTURE_DIR = str(Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
 try:
-    from openai import OpenAI
+    from common.gateway import get_gateway
+    from common.model_router import with_fallback
 except Exception:
     st.error("OpenAI SDK 불일치: 'pip install -U openai'로 1.x 이상 설치하세요.")
     st.stop()
@@ -47,7 +52,7 @@ def google_trans(text: str) -> str:
 # 캡션 생성 (Chat Completions)
 # ─────────────────────────────────────────────────────────
 def gen_caption(topic: str, mood: str, apikey: str) -> str:
-    client = OpenAI(api_key=apikey)
+    client = get_gateway(apikey)
     prompt = f"""Write a Korean Instagram caption.
 - topic: {topic}
 - mood: {mood}
@@ -72,7 +77,7 @@ def gen_image(topic: str, mood: str, apikey: str, size: str = "1024x1024",
     """
     
     # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    client = OpenAI(api_key=apikey)
+    client = get_gateway(apikey)
 
     t_topic, t_mood = google_trans(topic), google_trans(mood)
     prompt = f"Draw picture about {t_topic}. Picture mood is {t_mood}."
@@ -80,17 +85,9 @@ def gen_image(topic: str, mood: str, apikey: str, size: str = "1024x1024",
     def _call(model_name: str):
         return client.images.generate(model=model_name, prompt=prompt, size=size, n=1)
 
-    # 우선순위: 사용자가 원하면 gpt-image-1 시도 → 실패 시 dall-e-2
-    resp = None
-    if try_gpt_image_1:
-        try:
-            resp = _call("gpt-image-1")
-        except Exception as e:
-            # 권한 문제(403) 등 → DALL·E 2로 폴백
-            print("gpt-image-1 실패 → dall-e-2로 폴백:", e)
-
-    if resp is None:
-        resp = _call("dall-e-2")
+    # 우선순위: 사용자가 원하면 gpt-image-1 시도 → 실패 시(권한 문제 403 등) dall-e-2로 폴백
+    models = ["gpt-image-1", "dall-e-2"] if try_gpt_image_1 else ["dall-e-2"]
+    _, resp = with_fallback(models, _call, on_error=lambda m, e: print(f"{m} 실패 → 다음 모델로 폴백:", e))
 
     url = resp.data[0].url
     out_path = "instaimg.jpg"
@@ -2,12 +2,16 @@
 # Streamlit x OpenAI - 문구/메시지 추천 챗봇 (톤/길이/언어/이모지/여러 개 생성 + 다운로드)
 # 필요 패키지: streamlit, openai, python-dotenv
 
-import os
+import os, sys, pathlib
 import time
 import textwrap
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경 설정
@@ -16,7 +20,7 @@ load_dotenv()
 API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 if not API_KEY:
     raise RuntimeError("OPENAI_API_KEY가 설정되어 있지 않습니다. .env를 확인하세요.")
-client = OpenAI(api_key=API_KEY)
+client = get_gateway(API_KEY)
 
 st.set_page_config(page_title="문구/메시지 추천 챗봇", page_icon="✉️", layout="centered")
 st.title("✉️ 문구/메시지 추천 챗봇")
@@ -126,19 +130,16 @@ def call_model(prompt_text: str) -> str:
     composed = f"[SYSTEM]\n{SYSTEM_PROMPT}\n\n[USER]\n{prompt_text}"
     if streaming:
         with st.chat_message("assistant"):
-            placeholder = st.empty()
-            chunks = []
+            renderer = StreamRenderer(st.empty())   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
             with client.responses.stream(
                 model=model,
                 input=composed,
                 temperature=0.6,  # 창의성 조금 높임
             ) as stream:
-                for event in stream:
-                    if event.type == "response.output_text.delta":
-                        chunks.append(event.delta)
-                        placeholder.markdown("".join(chunks))
+                renderer.consume(stream)
                 stream.until_done()
-            return "".join(chunks) if chunks else "(응답 없음)"
+            st.caption(renderer.summary())
+            return renderer.text or "(응답 없음)"
     else:
         resp = client.responses.create(model=model, input=composed, temperature=0.6)
         answer = getattr(resp, "output_text", None) or str(resp)
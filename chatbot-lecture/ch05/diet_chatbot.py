@@ -1,11 +1,17 @@
 # diet_chatbot.py
 # Streamlit x OpenAI Responses API - 식단 추천 챗봇 (단일 파일)
-import os
+import os, sys, pathlib
 import time
 import textwrap
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
+from common.chat_memory import count_tokens
+from common.model_router import AUTO, get_router
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경 설정
@@ -15,7 +21,7 @@ API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 if not API_KEY:
     raise RuntimeError("OPENAI_API_KEY가 설정되어 있지 않습니다. .env를 확인하세요.")
 
-client = OpenAI(api_key=API_KEY)
+client = get_gateway(API_KEY)
 
 st.set_page_config(page_title="식단 추천 챗봇", page_icon="🥗", layout="centered")
 st.title("🥗 식단 추천 챗봇")
@@ -28,9 +34,9 @@ with st.sidebar:
     st.subheader("⚙️ 추천 옵션")
     model = st.selectbox(
         "모델 선택",
-        options=["gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
+        options=[AUTO, "gpt-4o-mini", "gpt-4o", "gpt-4.1", "gpt-3.5-turbo"],
         index=0,
-        help="가성비는 gpt-4o-mini 권장"
+        help="auto: 간단한 요청은 gpt-4o-mini, 조건이 복잡하면 상위 모델 (실패 시 다음 모델로 자동 전환) · 가성비는 gpt-4o-mini 권장"
     )
     meal_type = st.radio("식사 유형", ["아침", "점심", "저녁"], index=1, horizontal=True)
     target_kcal = st.slider("목표 칼로리 (kcal)", min_value=300, max_value=1200, value=600, step=50)
@@ -87,33 +93,44 @@ if prompt:
     # 단일 문자열로 합성 (Responses API는 자유 형식 input 허용)
     composed = f"[SYSTEM]\n{SYSTEM_GUIDE}\n\n[USER]\n{prompt}"
 
-    # 호출
+    # 호출 (auto: 라우터가 모델 선택, 실패하면 route.chain 의 다음 모델로 폴백)
     t0 = time.perf_counter()
     try:
+        route = get_router().route(prompt, prompt_tokens=count_tokens(composed)) if model == AUTO else None
         if streaming:
             with st.chat_message("assistant"):
-                placeholder = st.empty()
-                chunks = []
-                with client.responses.stream(
-                    model=model,
+                placeholder = st.empty()        # 폴백하면 같은 자리에 다시 그림
+
+                def ask(m: str) -> StreamRenderer:
+                    renderer = StreamRenderer(placeholder)   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
+                    with client.responses.stream(
+                        model=m,
+                        input=composed,
+                        temperature=0.4,
+                    ) as stream:
+                        renderer.consume(stream)
+                        stream.until_done()
+                    return renderer
+
+                renderer = get_router().run(route, ask) if route else ask(model)
+                answer = renderer.text or "(응답 없음)"
+                st.caption(renderer.summary())
+            t_wait_ms, tok_s = renderer.ttft_ms, renderer.tok_per_s
+        else:
+            def ask(m: str):
+                return client.responses.create(
+                    model=m,
                     input=composed,
                     temperature=0.4,
-                ) as stream:
-                    for event in stream:
-                        if event.type == "response.output_text.delta":
-                            chunks.append(event.delta)
-                            placeholder.markdown("".join(chunks))
-                    stream.until_done()
-                answer = "".join(chunks) if chunks else "(응답 없음)"
-        else:
-            resp = client.responses.create(
-                model=model,
-                input=composed,
-                temperature=0.4,
-            )
+                )
+
+            resp = get_router().run(route, ask) if route else ask(model)
             answer = getattr(resp, "output_text", None) or str(resp)
+            t_wait_ms, tok_s = None, None   # 비스트리밍은 첫 토큰 시점을 모름 → 라우터 관측치에서 제외
             with st.chat_message("assistant"):
                 st.markdown(answer)
+        used_model = route.model if route else model
+        get_router().observe({"model": used_model, "t_wait_ms": t_wait_ms, "tok_s": tok_s})
 
         # 응답 저장
         st.session_state.messages.append({"role": "assistant", "content": answer})
@@ -122,7 +139,9 @@ if prompt:
         elapsed_ms = int((time.perf_counter() - t0) * 1000)
         with st.expander("Ⓘ 요청 컨텍스트(시스템 가이드)", expanded=False):
             st.code(SYSTEM_GUIDE, language="markdown")
-        st.caption(f"⏱️ 응답 시간: {elapsed_ms} ms")
+        st.caption(f"⏱️ 응답 시간: {elapsed_ms} ms · 모델: {used_model}"
+                   + (f" (auto: {route.reason}{' · 폴백 ' + ', '.join(route.fallbacks) if route.fallbacks else ''})"
+                      if route else ""))
 
     except Exception as e:
         with st.chat_message("assistant"):
@@ -1,14 +1,19 @@
-import os
+import os, sys, pathlib
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.chat_memory import ConversationMemory
 
 # ──────────────────────────────────────────────
 # 1) 환경설정
 # ──────────────────────────────────────────────
 load_dotenv()
 API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
-client = OpenAI(api_key=API_KEY)
+client = get_gateway(API_KEY)
+MODEL = "gpt-4o-mini"
 
 st.set_page_config(page_title="운동 플래너 챗봇", page_icon="🏋️")
 st.title("🏋️ 운동 플래너 챗봇")
@@ -28,7 +33,10 @@ system_prompt = {
 # 3) 세션 상태 초기화
 # ──────────────────────────────────────────────
 if "messages" not in st.session_state:
-    st.session_state["messages"] = [system_prompt]
+    st.session_state["messages"] = [system_prompt]     # 화면 표시용 전체 기록
+if "memory" not in st.session_state:
+    # 모델에 보내는 대화: 최근 몇 턴 원문 + 그 이전은 백그라운드 요약 (모델별 토큰 예산 이내)
+    st.session_state["memory"] = ConversationMemory(client, MODEL, system=system_prompt["content"])
 
 # ──────────────────────────────────────────────
 # 4) 기존 대화 표시
@@ -44,6 +52,8 @@ for msg in st.session_state["messages"]:
 if user_input := st.chat_input("오늘 운동 루틴을 알려줘!"):
     # 사용자 메시지 저장
     st.session_state["messages"].append({"role": "user", "content": user_input})
+    memory = st.session_state["memory"]
+    memory.add("user", user_input)
     with st.chat_message("user"):
         st.markdown(user_input)
 
@@ -51,11 +61,12 @@ if user_input := st.chat_input("오늘 운동 루틴을 알려줘!"):
     with st.chat_message("assistant"):
         with st.spinner("운동 플랜을 구성하는 중..."):
             response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=st.session_state["messages"]
+                model=MODEL,
+                messages=memory.messages()      # 전체 messages 대신 요약 + 최근 대화
             )
             answer = response.choices[0].message.content
             st.markdown(answer)
 
     # AI 응답 저장
     st.session_state["messages"].append({"role": "assistant", "content": answer})
+    memory.add("assistant", answer)
@@ -1,12 +1,16 @@
 # fitness_planner_app.py
 # Streamlit x OpenAI - 운동 목표/부위 선택 위젯을 포함한 "운동 플래너 챗봇" (완성 코드)
 
-import os
+import os, sys, pathlib
 import time
 import textwrap
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경 설정
@@ -15,7 +19,7 @@ load_dotenv()
 API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 if not API_KEY:
     raise RuntimeError("OPENAI_API_KEY가 설정되어 있지 않습니다. .env를 확인하세요.")
-client = OpenAI(api_key=API_KEY)
+client = get_gateway(API_KEY)
 
 st.set_page_config(page_title="운동 플래너 챗봇", page_icon="🏋️", layout="centered")
 st.title("🏋️ 운동 플래너 챗봇")
@@ -122,19 +126,16 @@ if user_prompt:
     try:
         if streaming:
             with st.chat_message("assistant"):
-                placeholder = st.empty()
-                chunks = []
+                renderer = StreamRenderer(st.empty())   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
                 with client.responses.stream(
                     model=model,
                     input=composed,
                     temperature=0.4,
                 ) as stream:
-                    for event in stream:
-                        if event.type == "response.output_text.delta":
-                            chunks.append(event.delta)
-                            placeholder.markdown("".join(chunks))
+                    renderer.consume(stream)
                     stream.until_done()
-                answer = "".join(chunks) if chunks else "(응답 없음)"
+                answer = renderer.text or "(응답 없음)"
+                st.caption(renderer.summary())
         else:
             resp = client.responses.create(
                 model=model,
@@ -2,14 +2,18 @@
 # Streamlit x OpenAI - "운동 플래너 챗봇"
 # 확장: 동작별 YouTube 임베드 + GIF/이미지 검색 링크 포함
 
-import os
+import os, sys, pathlib
 import re
 import time
 import textwrap
 import urllib.parse
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
+LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+if LECTURE_DIR not in sys.path:
+    sys.path.append(LECTURE_DIR)
+from common.gateway import get_gateway
+from common.stream_render import StreamRenderer
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 0) 환경 설정
@@ -18,7 +22,7 @@ load_dotenv()
 API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 if not API_KEY:
     raise RuntimeError("OPENAI_API_KEY가 설정되어 있지 않습니다. .env를 확인하세요.")
-client = OpenAI(api_key=API_KEY)
+client = get_gateway(API_KEY)
 
 st.set_page_config(page_title="운동 플래너 챗봇 (미디어 포함)", page_icon="🏋️", layout="centered")
 st.title("🏋️ 운동 플래너 챗봇")
@@ -125,19 +129,16 @@ def call_model(prompt_text: str) -> str:
     composed = f"[SYSTEM]\n{SYSTEM_GUIDE}\n\n[USER]\n{prompt_text}"
     if streaming:
         with st.chat_message("assistant"):
-            placeholder = st.empty()
-            chunks = []
+            renderer = StreamRenderer(st.empty())   # 델타 버퍼링 → 일정 간격으로만 화면 갱신
             with client.responses.stream(
                 model=model,
                 input=composed,
                 temperature=0.4,
             ) as stream:
-                for event in stream:
-                    if event.type == "response.output_text.delta":
-                        chunks.append(event.delta)
-                        placeholder.markdown("".join(chunks))
+                renderer.consume(stream)
                 stream.until_done()
-            return "".join(chunks) if chunks else "(응답 없음)"
+            st.caption(renderer.summary())
+            return renderer.text or "(응답 없음)"
     else:
         resp = client.responses.create(model=model, input=composed, temperature=0.4)
         answer = getattr(resp, "output_text", None) or str(resp)
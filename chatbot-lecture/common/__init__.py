@@ -0,0 +1,17 @@
+# common: ch03~ch05 앱이 함께 쓰는 보조 모듈 모음
+# 앱에서 사용 시 chatbot-lecture 폴더를 sys.path에 추가한 뒤 import 합니다.
+# (Streamlit은 재실행마다 스크립트 전체를 다시 돌리므로, 이미 있으면 추가하지 않음)
+#   LECTURE_DIR = str(pathlib.Path(__file__).resolve().parents[1])
+#   if LECTURE_DIR not in sys.path:
+#       sys.path.append(LECTURE_DIR)
+#   from common.gateway import get_gateway
+# 모듈
+#   gateway       : 프로세스 전역 요청 게이트웨이 (공유 연결 + 동시 요청 상한/속도 제한/재시도)
+#   stream_render : 스트리밍 델타 점진 렌더 (TTFT/tok/s 측정)
+#   chat_memory   : 최근 대화 창 + 누적 요약 (프롬프트 크기 상한)
+#   log_store     : 대화 로그 영구 저장 (백그라운드 일괄 기록)
+#   log_analytics : 전체 세션 로그 집계 (06 분석 대시보드)
+#   turn_metrics  : 턴 단계별 지연/처리량 표·그래프
+#   model_router  : 요청별 모델 자동 선택 (기록된 지연/처리량 기반, 실패 시 폴백)
+#   openai_client : 프로세스 전역 OpenAI 클라이언트 (연결 풀 재사용)
+#   mock_openai_server : 측정용 로컬 가짜 OpenAI 서버
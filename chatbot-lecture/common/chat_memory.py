@@ -0,0 +1,232 @@
+# chat_memory.py
+# 대화 메모리: 최근 대화 창(window) + 누적 요약 (01_chat_min.py, ch05/fitness_chatbot.py 등)
+# - 기존: 매 턴 지금까지의 모든 메시지를 그대로 전송 → 대화가 길어질수록 입력 토큰/지연이 끝없이 증가
+# - ConversationMemory
+#   · 최근 WINDOW_TURNS 턴(사용자+어시스턴트)만 원문 유지
+#   · 창에서 밀려난 메시지는 모았다가 백그라운드 스레드에서 기존 요약과 합쳐 새 요약으로 압축
+#     (요약이 끝나기 전에는 밀려난 원문을 그대로 쓰고, 채팅 경로는 요약을 기다리지 않음)
+#   · 모델별 토큰 예산: [시스템 + 요약 + 최근 대화]가 예산을 넘으면 오래된 메시지부터 제외
+#   → 턴당 프롬프트 크기가 예산 근처에서 더 이상 늘지 않음
+# 사용 예)
+#   memory = ConversationMemory(client, "gpt-4o-mini", system="You are ...")   # st.session_state 에 보관
+#   memory.add("user", prompt)
+#   resp = client.responses.create(model=..., input=memory.messages())       # chat.completions 도 messages= 로 동일
+#   memory.add("assistant", answer)
+# 측정 (로컬 가짜 모델, 턴별 입력 토큰: 전체 전송 vs 메모리)
+#   python -m common.chat_memory --turns 60
+import argparse, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional
+
+try:
+    import tiktoken  # 로컬 토크나이저 (pip install tiktoken)
+except Exception:
+    tiktoken = None
+
+WINDOW_TURNS = 6                # 원문으로 유지할 최근 턴 수 (1턴 = 사용자 + 어시스턴트)
+COMPACT_MIN_MESSAGES = 4        # 창에서 밀려난 메시지가 이만큼 모이면 요약 갱신
+SUMMARY_TOKENS = 300            # 요약 길이 상한
+SUMMARY_MODEL = "gpt-4o-mini"   # 요약은 싸고 빠른 모델로
+
+# 모델별 대화 메모리 토큰 예산 (시스템 + 요약 + 최근 대화)
+MODEL_MEMORY_BUDGET = {
+    "gpt-4.1-nano": 2000,
+    "gpt-4o-mini": 3000,
+    "gpt-4o": 4000,
+    "gpt-4.1": 4000,
+    "gpt-3.5-turbo": 2000,
+}
+DEFAULT_MEMORY_BUDGET = 2500
+
+SUMMARY_PROMPT = (
+    "다음은 사용자와 어시스턴트의 이전 대화와, 그 이전까지의 요약입니다. "
+    "이후 대화에 필요한 사실(사용자 정보, 목표, 선호, 결정된 사항, 미해결 질문)만 남겨 "
+    f"한국어 {SUMMARY_TOKENS // 2}단어 이내로 요약하세요. 인사말/반복은 빼세요."
+)
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def shared_pool() -> ThreadPoolExecutor:
+    """요약 작업용 프로세스 전역 스레드 풀 (모든 세션 공유)"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-compact")
+        return _POOL
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 토큰 계산 (tiktoken 없으면 추정: ASCII 4글자 ≈ 1토큰, 그 외 1글자 ≈ 1토큰)
+# ──────────────────────────────────────────────────────────────────────────────
+_ENC = None
+
+def count_tokens(text: str) -> int:
+    global _ENC
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _ENC is None:
+            _ENC = tiktoken.get_encoding("o200k_base")
+        return len(_ENC.encode(text, disallowed_special=()))
+    n_ascii = len(text.encode("ascii", "ignore"))
+    return max(1, n_ascii // 4 + (len(text) - n_ascii))
+
+def message_tokens(m: Dict[str, str]) -> int:
+    return count_tokens(m["content"]) + 4          # 역할/구분자 오버헤드
+
+def memory_budget(model: str) -> int:
+    return MODEL_MEMORY_BUDGET.get(model, DEFAULT_MEMORY_BUDGET)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 요약 호출
+# ──────────────────────────────────────────────────────────────────────────────
+def summarize(client, model: str, summary: str, messages: List[Dict[str, str]]) -> str:
+    dialog = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    resp = client.responses.create(
+        model=model,
+        input=f"{SUMMARY_PROMPT}\n\n[이전 요약]\n{summary or '(없음)'}\n\n[대화]\n{dialog}",
+        temperature=0.0,
+        max_output_tokens=SUMMARY_TOKENS,
+    )
+    return (getattr(resp, "output_text", None) or "").strip() or summary
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 대화 메모리
+# ──────────────────────────────────────────────────────────────────────────────
+class ConversationMemory:
+    def __init__(self, client, model: str, system: str = "", window_turns: int = WINDOW_TURNS,
+                 budget: Optional[int] = None, summary_model: str = SUMMARY_MODEL,
+                 pool: Optional[ThreadPoolExecutor] = None):
+        self.client = client
+        self.model = model
+        self.system = system
+        self.window_turns = window_turns
+        self.budget = budget
+        self.summary_model = summary_model
+        self.pool = pool
+        self.summary = ""
+        self.recent: Deque[Dict[str, str]] = deque()       # 원문 유지 메시지
+        self.evicted: List[Dict[str, str]] = []             # 창에서 밀려났지만 아직 요약에 안 들어간 메시지
+        self.compactions = 0
+        self.compact_errors = 0
+        self._future: Optional[Future] = None
+        self._lock = threading.RLock()      # 요약이 즉시 끝나면 완료 콜백이 add() 안에서 바로 실행됨
+
+    def add(self, role: str, content: str):
+        with self._lock:
+            self.recent.append({"role": role, "content": content})
+            while len(self.recent) > 2 * self.window_turns:
+                self.evicted.append(self.recent.popleft())
+            self._maybe_compact()
+
+    # ── 백그라운드 압축: 진행 중인 작업이 없을 때만 1개 제출
+    def _maybe_compact(self):
+        if len(self.evicted) < COMPACT_MIN_MESSAGES or (self._future is not None and not self._future.done()):
+            return
+        batch = list(self.evicted)
+        prev = self.summary
+        pool = self.pool or shared_pool()
+        self._future = pool.submit(summarize, self.client, self.summary_model, prev, batch)
+        self._future.add_done_callback(lambda f: self._apply_summary(f, len(batch)))
+
+    def _apply_summary(self, future: Future, n: int):
+        with self._lock:
+            try:
+                self.summary = future.result()
+                del self.evicted[:n]        # 요약에 들어간 메시지만 제거 (요약 중 새로 밀려난 것은 유지)
+                self.compactions += 1
+            except Exception:
+                self.compact_errors += 1    # 요약 실패 → 원문 유지, 다음 add 때 재시도 (예산 초과분은 messages 에서 제외)
+            self._future = None
+            self._maybe_compact()
+
+    def wait(self, timeout: Optional[float] = None):
+        """진행 중인 요약(이어서 제출된 것 포함)이 끝날 때까지 대기 (측정/테스트용)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                f = self._future
+            if f is None:
+                return
+            try:
+                f.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.001)               # 완료 콜백이 _future 를 정리할 시간
+
+    # ── 프롬프트 구성: 시스템 + 요약 + (요약 안 된 밀려난 메시지) + 최근 창 → 예산 안에서 최신 우선
+    def messages(self, model: Optional[str] = None) -> List[Dict[str, str]]:
+        budget = self.budget or memory_budget(model or self.model)
+        with self._lock:
+            head = [{"role": "system", "content": self.system}] if self.system else []
+            if self.summary:
+                head.append({"role": "system", "content": f"[이전 대화 요약]\n{self.summary}"})
+            body = self.evicted + list(self.recent)
+        used = sum(message_tokens(m) for m in head)
+        kept: List[Dict[str, str]] = []
+        for m in reversed(body):
+            t = message_tokens(m)
+            if kept and used + t > budget:          # 가장 최근 메시지(현재 질문)는 항상 포함
+                break
+            kept.append(m)
+            used += t
+        return head + kept[::-1]
+
+    def prompt_tokens(self, model: Optional[str] = None) -> int:
+        return sum(message_tokens(m) for m in self.messages(model))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"recent": len(self.recent), "evicted": len(self.evicted), "summary_tokens": count_tokens(self.summary),
+                    "compactions": self.compactions, "errors": self.compact_errors}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 측정: 가짜 서버 상대로 N턴 대화 — 턴별 입력 토큰 (서버 usage 기준)
+# ──────────────────────────────────────────────────────────────────────────────
+def bench(args):
+    from common.mock_openai_server import start_mock_server
+    from common.openai_client import get_client
+    server, base_url = start_mock_server(latency_ms=args.latency_ms, out_tokens=args.out_tokens)
+    client = get_client("sk-mock", base_url)
+    system = "You are a helpful fitness trainer."
+
+    full = [{"role": "system", "content": system}]
+    memory = ConversationMemory(client, "gpt-4o-mini", system=system, budget=args.budget)
+    print(f"{'turn':>5}{'full tok_in':>13}{'memory tok_in':>15}{'full ms':>10}{'memory ms':>11}")
+    for turn in range(1, args.turns + 1):
+        q = f"질문 {turn}: 오늘 하체 운동 루틴을 세트와 횟수까지 알려줘. 무릎이 약한 편이야."
+        full.append({"role": "user", "content": q})
+        memory.add("user", q)
+
+        t0 = time.perf_counter()
+        r1 = client.responses.create(model="gpt-4o-mini", input=full)
+        t1 = time.perf_counter()
+        r2 = client.responses.create(model="gpt-4o-mini", input=memory.messages())
+        t2 = time.perf_counter()
+
+        full.append({"role": "assistant", "content": r1.output_text})
+        memory.add("assistant", r2.output_text)
+        if args.sync:
+            memory.wait()
+        if turn == 1 or turn % args.every == 0:
+            print(f"{turn:>5}{r1.usage.input_tokens:>13}{r2.usage.input_tokens:>15}"
+                  f"{(t1 - t0) * 1000:>10.1f}{(t2 - t1) * 1000:>11.1f}")
+    memory.wait()
+    print("memory:", memory.stats())
+    server.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser(description="대화 메모리 턴별 프롬프트 크기 측정 (로컬 가짜 서버)")
+    ap.add_argument("--turns", type=int, default=60)
+    ap.add_argument("--every", type=int, default=5, help="출력 간격(턴)")
+    ap.add_argument("--out-tokens", type=int, default=120, help="가짜 답변 길이(단어)")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--budget", type=int, default=None, help="메모리 토큰 예산 (기본: 모델별)")
+    ap.add_argument("--sync", action="store_true", help="턴마다 요약 완료까지 대기 (결정적 출력)")
+    bench(ap.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+# gateway.py
+# 프로세스 전역 OpenAI 요청 게이트웨이 (ch03~ch05 앱 공용)
+# - 기존: 각 앱이 Streamlit 스크립트 스레드에서 client.responses.create/.stream, images.generate 를 바로 호출
+#   → 동시 세션이 늘면 429가 그대로 "OpenAI 호출 실패"로 사용자에게 보임, 재시도/속도 조절 없음
+# - Gateway
+#   · 백그라운드 스레드 1개에서 asyncio 루프 + AsyncOpenAI(공유 연결 풀) 실행, 앱은 기존과 같은 동기 호출
+#   · 동시 요청 상한: 프로세스 전체 세마포어 (MAX_CONCURRENCY)
+#   · 속도 제한: 계정 RPM/TPM 으로 크기를 정한 토큰 버킷 2개 — 요청 전에 (입력 추정 + 출력 상한) 토큰을 예약,
+#     응답 usage 로 실제 사용량만큼 정산 / 서버 429(retry-after)를 받으면 버킷 전체를 그 시간만큼 멈춤
+#   · 재시도: 429/408/409/5xx/연결 오류만, 지수 백오프 + full jitter (서버 retry-after 보다 짧게는 안 기다림)
+#   · 요청 합치기: 완전히 같은 요청이 처리 중이면 새로 보내지 않고 그 결과를 같이 받음 (coalesce=False 로 끔)
+#   · 스트리밍: 첫 이벤트를 받기 전 오류만 재시도 (이미 화면에 그린 뒤에는 재시도하지 않음)
+# 사용 예) 클라이언트와 같은 모양이라 호출 코드는 그대로
+#   from common.gateway import get_gateway
+#   client = get_gateway(OPENAI_API_KEY)
+#   client.responses.create(...) / client.responses.stream(...) / client.chat.completions.create(...)
+#   client.images.generate(...) / client.embeddings.create(...)
+# 측정 (로컬 가짜 서버: 분당 한도 + 429/500 주입, 여러 스레드 동시 요청)
+#   python -m common.gateway --requests 300 --threads 32 --rpm 1200 --rate-429 0.05 --rate-500 0.05
+import argparse, asyncio, functools, hashlib, json, os, queue, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from common.chat_memory import count_tokens
+from common.openai_client import CONNECT_TIMEOUT_S, HTTP2, READ_TIMEOUT_S, httpx, pool_limits
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))    # 프로세스 전체 동시 요청 수
+RPM = float(os.getenv("OPENAI_RPM", "500"))                         # 계정 분당 요청 한도 (0: 제한 안 함)
+TPM = float(os.getenv("OPENAI_TPM", "200000"))                      # 계정 분당 토큰 한도 (0: 제한 안 함)
+RPM_BURST_S = 1.0           # 요청 버킷 용량 = 1초 분량 (한꺼번에 몰아 보내지 않게)
+TPM_BURST_S = 10.0          # 토큰 버킷 용량 = 10초 분량 (긴 프롬프트 1개는 통과할 수 있게)
+MAX_RETRIES = 5
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 20.0
+DEFAULT_OUTPUT_RESERVE = 512        # max_output_tokens 가 없을 때 예약할 출력 토큰
+RETRY_STATUS = {408, 409, 429}      # + 5xx
+
+OPS = {"responses.create", "responses.stream", "chat.completions.create", "embeddings.create", "images.generate"}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 토큰 버킷 (게이트웨이 루프 스레드에서만 사용)
+# ──────────────────────────────────────────────────────────────────────────────
+class TokenBucket:
+    """분당 per_minute 개 보충, 용량 = burst_s 초 분량. 용량보다 큰 요청은 가득 찼을 때 빚으로 통과"""
+    def __init__(self, per_minute: float, burst_s: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self._t = time.monotonic()
+        self._lock = asyncio.Lock()         # 먼저 온 요청부터 (FIFO)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    async def acquire(self, n: float = 1.0) -> float:
+        """n개 사용 → 기다린 초"""
+        if self.rate <= 0:
+            return 0.0
+        t0 = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.paused_until - now
+                if delay <= 0:
+                    need = min(n, self.capacity)
+                    if self.tokens >= need:
+                        self.tokens -= n
+                        return time.monotonic() - t0
+                    delay = (need - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+
+    def refund(self, n: float):
+        """예약보다 적게 썼으면 돌려받고(n > 0), 더 썼으면 빚으로 차감(n < 0)"""
+        if self.rate > 0:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + n)
+
+    def pause(self, seconds: float):
+        """서버가 한도 초과(429)를 알려 오면 그동안 아무도 보내지 않음"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 재시도 판단 / 대기 시간 / 토큰 추정
+# ──────────────────────────────────────────────────────────────────────────────
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, APIConnectionError):       # APITimeoutError 포함
+        return True
+    if isinstance(e, APIStatusError):
+        if getattr(e, "code", None) == "insufficient_quota":     # 크레딧 부족 429는 기다려도 안 풀림
+            return False
+        return e.status_code in RETRY_STATUS or e.status_code >= 500
+    return False
+
+def server_retry_after(e: Exception) -> Optional[float]:
+    """429/503 응답의 retry-after-ms / retry-after 헤더 (초)"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """full jitter: U(0, min(max, base·2^attempt)), 서버가 알려 준 시간보다 짧게는 안 기다림"""
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+def estimate_request_tokens(op: str, kwargs: Dict[str, Any]) -> int:
+    """TPM 예약량: 입력 추정 + 출력 상한 (이미지 생성은 토큰 한도 대상 아님)"""
+    if op == "images.generate":
+        return 0
+    payload = kwargs.get("input", kwargs.get("messages", ""))
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    n = count_tokens(text) + count_tokens(kwargs.get("instructions") or "")
+    if op != "embeddings.create":
+        n += int(kwargs.get("max_output_tokens") or kwargs.get("max_tokens")
+                 or kwargs.get("max_completion_tokens") or DEFAULT_OUTPUT_RESERVE)
+    return n
+
+def used_tokens(resp: Any) -> Optional[int]:
+    usage = getattr(resp, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+def request_key(op: str, kwargs: Dict[str, Any]) -> str:
+    data = json.dumps([op, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 게이트웨이
+# ──────────────────────────────────────────────────────────────────────────────
+class _Namespace:
+    """client.responses / client.chat.completions ... 와 같은 모양의 속성 경로"""
+    def __init__(self, gateway: "Gateway", path: str):
+        self._gateway = gateway
+        self._path = path
+
+    def __getattr__(self, name: str):
+        path = f"{self._path}.{name}"
+        if path == "responses.stream":
+            return self._gateway.stream
+        if path in OPS:
+            return functools.partial(self._gateway.call, path)
+        if any(op.startswith(path + ".") for op in OPS):
+            return _Namespace(self._gateway, path)
+        raise AttributeError(f"gateway 미지원 호출: {path}")
+
+class GatewayStream:
+    """responses.stream 결과: 이벤트 반복 / until_done() / get_final_response() (with 블록 종료 시 취소)"""
+    def __init__(self, gateway: "Gateway", kwargs: Dict[str, Any]):
+        self._queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self._final = None
+        self._done = False
+        self._future = asyncio.run_coroutine_threadsafe(gateway._pump(kwargs, self._queue), gateway.loop)
+        self._future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if future.cancelled():              # 취소되면 _pump 가 시작 전이었어도 소비 쪽 대기를 풀어 줌
+            self._queue.put(("error", asyncio.CancelledError()))
+
+    def __enter__(self) -> "GatewayStream":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self._future.done():
+            self._future.cancel()           # 중간에 빠져나오면 서버 스트림도 끊음
+
+    def __iter__(self):
+        while not self._done:
+            kind, value = self._queue.get()
+            if kind == "event":
+                yield value
+            elif kind == "final":
+                self._done, self._final = True, value
+            else:
+                self._done = True
+                raise value
+
+    def until_done(self) -> "GatewayStream":
+        for _ in self:
+            pass
+        return self
+
+    def get_final_response(self):
+        self.until_done()
+        return self._final
+
+class Gateway:
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concurrency: int = MAX_CONCURRENCY, rpm: float = RPM, tpm: float = TPM,
+                 max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        self.stats: Dict[str, Any] = {"calls": 0, "coalesced": 0, "retries": 0, "failed": 0, "inflight": 0,
+                                      "max_inflight": 0, "rate_wait_s": 0.0, "errors": {}}
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="openai-gateway", daemon=True)
+        self._thread.start()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        async def setup():      # 루프 객체(세마포어/락/HTTP 풀)는 루프 스레드에서 생성
+            self._sem = asyncio.Semaphore(max_concurrency)
+            self._rpm = TokenBucket(rpm, RPM_BURST_S)
+            self._tpm = TokenBucket(tpm, TPM_BURST_S)
+            http_client = DefaultAsyncHttpxClient(limits=pool_limits(), http2=HTTP2,
+                                                  timeout=httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S))
+            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+        asyncio.run_coroutine_threadsafe(setup(), self.loop).result()
+
+        self.responses = _Namespace(self, "responses")
+        self.chat = _Namespace(self, "chat")
+        self.embeddings = _Namespace(self, "embeddings")
+        self.images = _Namespace(self, "images")
+
+    # ── 동기 진입점 (Streamlit 스크립트 스레드 등)
+    def call(self, op: str, coalesce: bool = True, **kwargs):
+        return asyncio.run_coroutine_threadsafe(self.acall(op, coalesce, **kwargs), self.loop).result()
+
+    def stream(self, **kwargs) -> GatewayStream:
+        return GatewayStream(self, kwargs)
+
+    # ── 비동기 (루프 스레드)
+    async def acall(self, op: str, coalesce: bool = True, **kwargs):
+        self.stats["calls"] += 1
+        if not coalesce:
+            return await self._with_retries(op, kwargs)
+        key = request_key(op, kwargs)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._with_retries(op, kwargs))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)   # 기다리던 쪽 하나가 취소돼도 다른 쪽 결과는 유지
+
+    def _method(self, op: str):
+        target = self.client
+        for name in op.split("."):
+            target = getattr(target, name)
+        return target
+
+    async def _reserve(self, op: str, kwargs: Dict[str, Any]) -> int:
+        reserved = estimate_request_tokens(op, kwargs)
+        self.stats["rate_wait_s"] += await self._rpm.acquire(1) + await self._tpm.acquire(reserved)
+        return reserved
+
+    def _settle(self, reserved: int, resp: Any):
+        used = used_tokens(resp)
+        if used is not None:
+            self._tpm.refund(reserved - used)
+
+    def _failed(self, e: Exception, attempt: int) -> float:
+        """오류 기록 → 재시도할 거면 대기 초, 아니면 -1"""
+        status = getattr(e, "status_code", None) or type(e).__name__
+        self.stats["errors"][status] = self.stats["errors"].get(status, 0) + 1
+        if attempt >= self.max_retries or not is_retryable(e):
+            self.stats["failed"] += 1
+            return -1.0
+        retry_after = server_retry_after(e)
+        if getattr(e, "status_code", None) == 429:
+            self._rpm.pause(retry_after or BACKOFF_BASE_S)      # 다른 요청도 같이 멈춤
+        self.stats["retries"] += 1
+        return backoff_delay(attempt, retry_after)
+
+    def _enter(self):
+        self.stats["inflight"] += 1
+        self.stats["max_inflight"] = max(self.stats["max_inflight"], self.stats["inflight"])
+
+    def _leave(self):
+        self.stats["inflight"] -= 1
+
+    async def _with_retries(self, op: str, kwargs: Dict[str, Any]):
+        method = self._method(op)
+        for attempt in range(self.max_retries + 1):
+            reserved = await self._reserve(op, kwargs)
+            try:
+                async with self._sem:
+                    self._enter()
+                    try:
+                        resp = await method(**kwargs)
+                    finally:
+                        self._leave()
+            except Exception as e:
+                self._tpm.refund(reserved)
+                delay = self._failed(e, attempt)
+                if delay < 0:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._settle(reserved, resp)
+            return resp
+
+    async def _pump(self, kwargs: Dict[str, Any], out: "queue.Queue[Tuple[str, Any]]"):
+        """스트림 이벤트를 동기 쪽 큐로 전달 — 첫 이벤트 전 오류만 재시도"""
+        self.stats["calls"] += 1
+        reserved = 0
+        try:
+            for attempt in range(self.max_retries + 1):
+                reserved = await self._reserve("responses.stream", kwargs)
+                started = False
+                try:
+                    async with self._sem:
+                        self._enter()
+                        try:
+                            async with self.client.responses.stream(**kwargs) as stream:
+                                async for event in stream:
+                                    started = True
+                                    out.put(("event", event))
+                                final = await stream.get_final_response()
+                        finally:
+                            self._leave()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._tpm.refund(reserved)
+                    reserved = 0
+                    delay = -1.0 if started else self._failed(e, attempt)
+                    if delay < 0:
+                        out.put(("error", e))
+                        return
+                    await asyncio.sleep(delay)
+                    continue
+                self._settle(reserved, final)
+                out.put(("final", final))
+                return
+        except asyncio.CancelledError:
+            self._tpm.refund(reserved)      # 중간 취소 → 쓰지 않은 예약 반환
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        s = dict(self.stats, errors=dict(self.stats["errors"]))
+        s["rate_wait_s"] = round(s["rate_wait_s"], 2)
+        return s
+
+    def close(self):
+        async def shutdown():
+            await self.client.close()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+_GATEWAYS: Dict[Tuple[Optional[str], Optional[str]], Gateway] = {}
+_LOCK = threading.Lock()
+
+def get_gateway(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Gateway:
+    """(api_key, base_url)별 공유 게이트웨이 — 세마포어/속도 제한이 프로세스 전체(모든 세션)에 걸리도록 1개만"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    with _LOCK:
+        gateway = _GATEWAYS.get((api_key, base_url))
+        if gateway is None:
+            gateway = _GATEWAYS[(api_key, base_url)] = Gateway(api_key, base_url)
+        return gateway
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 측정: 가짜 서버(분당 한도 + 429/500 주입) 상대로 여러 스레드가 동시에 요청
+#   plain (재시도 없음) / SDK 기본 재시도(2회) / gateway — 사용자에게 보이는 실패 수, 전체 시간, 서버 요청 수
+# ──────────────────────────────────────────────────────────────────────────────
+def bench(args):
+    from openai import OpenAI
+    from common.mock_openai_server import start_mock_server
+
+    def run(name, make):
+        server, base_url = start_mock_server(latency_ms=args.latency_ms, rate_429=args.rate_429,
+                                             rate_500=args.rate_500, rpm=args.rpm)
+        client = make(base_url)
+        prompts = [f"질문 {i * args.unique // args.requests}: 오늘 저녁 메뉴 추천해줘"   # 같은 질문이 연달아 몰림
+                   for i in range(args.requests)]
+
+        def one(prompt):
+            try:
+                client.responses.create(model="gpt-4o-mini", input=prompt, max_output_tokens=40)
+                return True
+            except Exception:
+                return False
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            ok = sum(pool.map(one, prompts))
+        wall = time.perf_counter() - t0
+        st = server.stats
+        extra = ""
+        if isinstance(client, Gateway):
+            g = client.snapshot()
+            extra = f"  retries={g['retries']} coalesced={g['coalesced']} rate_wait={g['rate_wait_s']}s"
+            client.close()
+        print(f"{name:<16}{ok:>6}{args.requests - ok:>8}{wall:>9.2f}{st['requests']:>10}{st['429']:>7}{st.get('429_rpm', 0):>9}"
+              f"{st['500']:>7}{st['max_inflight']:>10}{extra}")
+        server.shutdown()
+
+    print(f"requests={args.requests} threads={args.threads} unique={args.unique} rpm={args.rpm} "
+          f"429={args.rate_429} 500={args.rate_500} latency={args.latency_ms}ms")
+    print(f"{'client':<16}{'ok':>6}{'failed':>8}{'wall s':>9}{'srv reqs':>10}{'429':>7}{'429 rpm':>9}{'500':>7}{'inflight':>10}")
+    run("plain", lambda url: OpenAI(api_key="sk-mock", base_url=url, max_retries=0))
+    run("sdk retries=2", lambda url: OpenAI(api_key="sk-mock", base_url=url, max_retries=2))
+    run("gateway", lambda url: Gateway("sk-mock", url, max_concurrency=args.concurrency, rpm=args.rpm, tpm=0))
+
+def main():
+    ap = argparse.ArgumentParser(description="요청 게이트웨이 부하 테스트 (로컬 가짜 서버, 429/500 주입)")
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--threads", type=int, default=32, help="동시에 요청하는 사용자(스레드) 수")
+    ap.add_argument("--unique", type=int, default=100, help="서로 다른 질문 수 (나머지는 중복)")
+    ap.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    ap.add_argument("--rpm", type=float, default=1200)
+    ap.add_argument("--rate-429", type=float, default=0.05)
+    ap.add_argument("--rate-500", type=float, default=0.05)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    bench(ap.parse_args())
+
+if __name__ == "__main__":
+    main()
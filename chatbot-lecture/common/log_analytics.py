@@ -0,0 +1,199 @@
+# log_analytics.py
+# 전체 세션 대화 로그 분석 (ch03/06_app_analytics_dashboard.py 에서 사용)
+# - 입력: common.log_store 의 SQLite (turns 테이블) — 모든 세션/앱의 기록
+# - 읽기: 필요한 컬럼만, chunksize 단위로 읽어 바로 category/float32 로 줄임 (수백만 행도 메모리 수십 MB)
+#         SQLite mmap 사용, TurnFrame 은 마지막으로 읽은 id 이후 행만 추가로 읽음 (증분)
+# - 집계: 시간 구간별 p50/p95, 모델·도메인별 처리량, 비용 추정 — 모두 벡터화 group-by
+# - 그리기: 기간 길이에 맞춰 구간 크기를 골라 점 개수를 MAX_POINTS 이하로 다운샘플
+# 측정용 가짜 기록)
+#   python -m common.log_analytics --fake 1000000
+import argparse, json, pathlib, sqlite3, threading, time
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from common.log_store import LOG_DB, SCHEMA
+from common.model_router import AUTO, PRICES_PER_1M   # 1M 토큰당 USD (입력, 출력), 없는 모델은 비용 NaN
+
+CHUNK_ROWS = 200_000
+MMAP_BYTES = 256 * 1024 * 1024
+MAX_POINTS = 1500                   # 시계열 그래프 점 개수 상한
+BUCKETS = ["1min", "5min", "15min", "1h", "6h", "1D", "7D"]
+CAT_COLUMNS = ["session", "app", "model", "domain"]
+NUM_COLUMNS = ["t_ms", "ttft_ms", "t_wait_ms", "t_gen_ms", "tok_in", "tok_out", "tok_s", "chars_out"]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 읽기
+# ──────────────────────────────────────────────────────────────────────────────
+def connect(path: pathlib.Path = LOG_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{pathlib.Path(path).as_posix()}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")      # 페이지를 복사 대신 메모리 매핑으로 읽음
+    return conn
+
+def _shrink(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk["ts"] = pd.to_datetime(chunk["ts"], unit="s")
+    chunk["model"] = chunk["model"].replace(AUTO, None)    # 답한 모델을 모르는 이전 캐시 적중 행 → "-"
+    for c in CAT_COLUMNS:
+        chunk[c] = chunk[c].fillna("-").astype("category")
+    for c in NUM_COLUMNS:
+        chunk[c] = pd.to_numeric(chunk[c], errors="coerce").astype(np.float32)
+    return chunk
+
+def _concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """category 컬럼은 범주를 합쳐서 이어붙임 (그냥 concat 하면 object 로 풀려 메모리가 몇 배)"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    out = pd.concat([f.drop(columns=CAT_COLUMNS) for f in frames], ignore_index=True)
+    for c in CAT_COLUMNS:
+        out[c] = union_categoricals([f[c] for f in frames], ignore_order=True)
+    return out[frames[0].columns]
+
+def load_turns(conn: sqlite3.Connection, after_id: int = 0, chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """turns 테이블에서 id > after_id 행을 청크 단위로 읽기 (답변 본문 JSON 은 읽지 않음)"""
+    sql = (f"SELECT id, ts, {', '.join(CAT_COLUMNS + NUM_COLUMNS)} FROM turns WHERE id > ? ORDER BY id")
+    frames = [_shrink(c) for c in pd.read_sql_query(sql, conn, params=(after_id,), chunksize=chunk_rows)]
+    return _concat(frames)
+
+class TurnFrame:
+    """전체 기록 DataFrame + 증분 갱신 (st.cache_resource 로 1개 보관)"""
+    def __init__(self, path: pathlib.Path = LOG_DB):
+        self.path = pathlib.Path(path)
+        self.df = pd.DataFrame()
+        self.last_id = 0
+        self.load_s = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> pd.DataFrame:
+        with self._lock:
+            if not self.path.exists():
+                return self.df
+            t0 = time.perf_counter()
+            conn = connect(self.path)
+            try:
+                new = load_turns(conn, self.last_id)
+            finally:
+                conn.close()
+            if len(new):
+                self.df = _concat([self.df, new]) if len(self.df) else new
+                self.last_id = int(new["id"].iloc[-1])
+            self.load_s = time.perf_counter() - t0
+            return self.df
+
+    def memory_mb(self) -> float:
+        return float(self.df.memory_usage(deep=True).sum()) / 2**20 if len(self.df) else 0.0
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 집계
+# ──────────────────────────────────────────────────────────────────────────────
+def add_cost(df: pd.DataFrame) -> pd.DataFrame:
+    """cost_usd 컬럼 추가 (usage 가 있는 행만, 단가표에 없는 모델은 NaN)"""
+    cats = df["model"].cat.categories
+    p_in = pd.Series({m: PRICES_PER_1M.get(m, (np.nan, np.nan))[0] for m in cats}, dtype=np.float64)
+    p_out = pd.Series({m: PRICES_PER_1M.get(m, (np.nan, np.nan))[1] for m in cats}, dtype=np.float64)
+    codes = df["model"].cat.codes.to_numpy()
+    cost = (df["tok_in"].to_numpy(np.float64) * p_in.to_numpy()[codes]
+            + df["tok_out"].to_numpy(np.float64) * p_out.to_numpy()[codes]) / 1e6
+    return df.assign(cost_usd=cost)
+
+def pick_bucket(start: pd.Timestamp, end: pd.Timestamp, max_points: int = MAX_POINTS) -> str:
+    """기간 / max_points 보다 큰 가장 작은 구간 크기"""
+    span = max(end - start, pd.Timedelta(minutes=1))
+    for b in BUCKETS:
+        if span / pd.Timedelta(b) <= max_points:
+            return b
+    return BUCKETS[-1]
+
+def latency_percentiles(df: pd.DataFrame, bucket: str, cols: Sequence[str] = ("t_ms", "ttft_ms"),
+                        qs: Sequence[float] = (0.5, 0.95)) -> pd.DataFrame:
+    """구간별 백분위 — index: 구간 시작, columns: "t_ms p50", "t_ms p95", ... + turns"""
+    g = df.groupby(pd.Grouper(key="ts", freq=bucket))
+    out = g[list(cols)].quantile(list(qs)).unstack()
+    out.columns = [f"{c} p{int(q * 100)}" for c, q in out.columns]
+    out["turns"] = g.size()
+    return out.dropna(how="all", subset=[c for c in out.columns if c != "turns"])
+
+def rolling_percentiles(pct: pd.DataFrame, window: int) -> pd.DataFrame:
+    """구간 백분위를 window 구간 이동 평균으로 평활 (전체 행 rolling quantile 대신 다운샘플 후 평활)"""
+    if window <= 1:
+        return pct
+    cols = [c for c in pct.columns if c != "turns"]
+    return pct[cols].rolling(window, min_periods=1).mean().assign(turns=pct["turns"])
+
+def group_summary(df: pd.DataFrame, by: str) -> pd.DataFrame:
+    """모델/도메인별 턴 수, 지연 p50/p95, 처리량, 토큰, 비용"""
+    g = df.groupby(by, observed=True)
+    out = pd.DataFrame({
+        "turns": g.size(),
+        "t_ms p50": g["t_ms"].median(),
+        "t_ms p95": g["t_ms"].quantile(0.95),
+        "ttft_ms p50": g["ttft_ms"].median(),
+        "tok/s p50": g["tok_s"].median(),
+        "tok_out": g["tok_out"].sum(),
+        "cost_usd": g["cost_usd"].sum(min_count=1),
+        "usage 비율": g["tok_out"].count() / g.size(),
+    })
+    return out.sort_values("turns", ascending=False).round(3)
+
+def cost_by_period(df: pd.DataFrame, bucket: str) -> pd.DataFrame:
+    """구간 × 모델 비용 (누적 막대용)"""
+    return (df.groupby([pd.Grouper(key="ts", freq=bucket), "model"], observed=True)["cost_usd"]
+              .sum(min_count=1).unstack(fill_value=0.0))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 3) 측정용 가짜 기록 생성 (LogStore 와 같은 스키마, 한 번에 대량 INSERT)
+# ──────────────────────────────────────────────────────────────────────────────
+def write_fake(path: pathlib.Path, n: int, days: float = 30.0, seed: int = 0, batch: int = 100_000):
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    models, domains = list(PRICES_PER_1M), ["일반", "여행", "영화", "음식", "IT/개발", "금융"]
+    apps = ["02_chat", "03_stream", "04_rag"]
+    now = time.time()
+    for start in range(0, n, batch):
+        m = min(batch, n - start)
+        ts = np.sort(now - rng.uniform(0, days * 86400, m))
+        mi = rng.integers(0, len(models), m)
+        tok_out = rng.integers(20, 800, m)
+        tok_s = rng.normal(60, 15, m).clip(5) * (1 + (mi % 2))
+        wait = rng.lognormal(6, 0.4, m)
+        gen = tok_out / tok_s * 1000
+        rows = [(float(ts[i]), f"s{rng.integers(0, 500)}", apps[i % 3], models[mi[i]], domains[i % len(domains)],
+                 float(wait[i] + gen[i]), float(wait[i]), float(wait[i]), float(gen[i]), int(i % 200), int(tok_out[i] * 2),
+                 int(rng.integers(50, 3000)), int(tok_out[i]), float(tok_s[i]), "{}") for i in range(m)]
+        conn.executemany("INSERT INTO turns (ts, session, app, model, domain, t_ms, ttft_ms, t_wait_ms, t_gen_ms, "
+                         "chars_in, chars_out, tok_in, tok_out, tok_s, data) VALUES "
+                         "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    conn.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="대화 로그 분석: 가짜 기록 생성 + 읽기/집계 시간 측정")
+    ap.add_argument("--db", type=pathlib.Path, default=LOG_DB)
+    ap.add_argument("--fake", type=int, default=0, help="가짜 행 N개 추가")
+    args = ap.parse_args()
+    if args.fake:
+        t0 = time.perf_counter()
+        write_fake(args.db, args.fake)
+        print(f"fake rows {args.fake:,}: {time.perf_counter() - t0:.1f}s")
+    tf = TurnFrame(args.db)
+    df = add_cost(tf.refresh())
+    print(f"load: {len(df):,} rows in {tf.load_s:.2f}s, {tf.memory_mb():.1f} MB")
+    t0 = time.perf_counter()
+    bucket = pick_bucket(df["ts"].min(), df["ts"].max())
+    pct = latency_percentiles(df, bucket)
+    by_model = group_summary(df, "model")
+    group_summary(df, "domain")
+    cost_by_period(df, "1D")
+    print(f"aggregate: {time.perf_counter() - t0:.2f}s (bucket {bucket}, {len(pct)} points)")
+    print(json.dumps(by_model[["turns", "t_ms p95", "tok/s p50", "cost_usd"]].head().to_dict("index"),
+                     ensure_ascii=False, indent=1, default=float))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# log_store.py
+# 대화 로그 영구 저장소 (ch03 대시보드 공용, st.cache_resource 로 프로세스당 1개)
+# - 기존: st.session_state.logs (메모리 리스트) → 세션이 끝나면 사라지고, 재실행마다 DataFrame을 3번씩 새로 만듦
+# - LogStore
+#   · 추가 전용(append-only) SQLite 1파일 (WAL) — 턴 1개 = 행 1개, 원본 로그 dict는 JSON으로 통째 보관
+#     + 분석용 핵심 컬럼(시각/세션/앱/모델/도메인/지연/토큰)은 따로 뽑아 저장
+#   · 쓰기는 백그라운드 스레드가 큐에서 모아 한 트랜잭션으로 일괄 기록 → 채팅 경로는 디스크 I/O를 기다리지 않음
+#   · 세션별 집계(턴 수, 지연 합, 출력 문자 합)를 추가 시점에 갱신 → KPI는 기록 크기와 무관하게 O(1)
+#   · 세션별 최근 N개 행은 메모리 링 버퍼로 유지 → Logs/Charts 탭은 최근 N개만 그림
+# 사용 예)
+#   store = LogStore(LOG_DB)
+#   store.append(session_id, "04_rag", {"ts": ..., "model": ..., "t_ms": ..., ...})
+#   store.kpis(session_id)  /  store.recent(session_id)  /  store.session_rows(session_id)
+import atexit, json, pathlib, queue, sqlite3, threading, time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+LOG_DB = pathlib.Path(".chat_logs") / "chat_logs.sqlite"
+RECENT_ROWS = 500           # 세션별 메모리 보관 행 수 (Logs/Charts 탭 표시 범위)
+MAX_SESSIONS = 1000         # 메모리에 집계/최근 행을 들고 있을 세션 수 (초과 시 오래된 세션부터 정리)
+BATCH_MAX = 256             # 한 트랜잭션에 쓰는 최대 행 수
+FLUSH_INTERVAL_S = 0.5      # 행이 적어도 이 간격마다 기록
+
+# 원본 dict 에서 컬럼으로 뽑아 둘 필드 (analytics 집계/필터용)
+COLUMNS = ["model", "domain", "t_ms", "ttft_ms", "t_wait_ms", "t_gen_ms", "chars_in", "chars_out",
+           "tok_in", "tok_out", "tok_s"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL, session TEXT NOT NULL, app TEXT NOT NULL,
+    model TEXT, domain TEXT, t_ms REAL, ttft_ms REAL, t_wait_ms REAL, t_gen_ms REAL,
+    chars_in INTEGER, chars_out INTEGER, tok_in INTEGER, tok_out INTEGER, tok_s REAL,
+    data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id);
+CREATE INDEX IF NOT EXISTS turns_ts ON turns (ts);
+CREATE TABLE IF NOT EXISTS session_agg (
+    session TEXT PRIMARY KEY, app TEXT NOT NULL, turns INTEGER NOT NULL,
+    sum_t_ms REAL NOT NULL, sum_chars_out INTEGER NOT NULL, first_ts REAL NOT NULL, last_ts REAL NOT NULL);
+"""
+
+class SessionAgg:
+    """세션 KPI 누적값 (추가할 때마다 갱신)"""
+    __slots__ = ("turns", "sum_t_ms", "sum_chars_out")
+
+    def __init__(self, turns: int = 0, sum_t_ms: float = 0.0, sum_chars_out: int = 0):
+        self.turns = turns
+        self.sum_t_ms = sum_t_ms
+        self.sum_chars_out = sum_chars_out
+
+    def add(self, row: Dict[str, Any]):
+        self.turns += 1
+        self.sum_t_ms += row.get("t_ms") or 0
+        self.sum_chars_out += row.get("chars_out") or 0
+
+    def merge(self, turns: int, sum_t_ms: float, sum_chars_out: int):
+        self.turns += turns
+        self.sum_t_ms += sum_t_ms
+        self.sum_chars_out += sum_chars_out
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "avg_ms": int(self.sum_t_ms / self.turns) if self.turns else 0,
+                "chars_out": int(self.sum_chars_out)}
+
+class LogStore:
+    def __init__(self, path: pathlib.Path = LOG_DB, recent_rows: int = RECENT_ROWS):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.recent_rows = recent_rows
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")     # WAL에서는 커밋마다 fsync 안 해도 DB 손상 없음
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._db_lock = threading.Lock()                    # 쓰기 스레드 / 조회 공용 연결 보호 (둘 다 잡을 땐 _db_lock → _lock 순서)
+        self._lock = threading.Lock()                       # 메모리 집계/최근 행 보호
+        self._agg: "OrderedDict[str, SessionAgg]" = OrderedDict()
+        self._pending: Dict[str, SessionAgg] = {}           # 큐에 있고 아직 DB에 안 들어간 행의 세션별 합
+        self._recent: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._queue: "queue.Queue[Optional[Tuple[float, str, str, Dict[str, Any]]]]" = queue.Queue()
+        self.written = 0
+        self.batches = 0
+        self._writer = threading.Thread(target=self._write_loop, name="log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # ── 채팅 경로: 메모리 갱신 + 큐에 넣기만 (블로킹 없음)
+    def append(self, session: str, app: str, row: Dict[str, Any]):
+        now = time.time()
+        while True:
+            with self._lock:
+                agg = self._cached_agg(session)
+                if agg is not None:
+                    agg.add(row)
+                    self._pending.setdefault(session, SessionAgg()).add(row)
+                    self._session_recent(session).append(row)
+                    self._queue.put((now, session, app, row))
+                    return
+            self._load_agg(session)     # 처음 보는 세션만 (락 밖에서 DB 조회)
+
+    def _cached_agg(self, session: str) -> Optional[SessionAgg]:
+        agg = self._agg.get(session)
+        if agg is not None:
+            self._agg.move_to_end(session)
+        return agg
+
+    def _load_agg(self, session: str):
+        """재시작/정리 후 이어지는 세션이면 저장된 집계 + 아직 기록 안 된 행에서 시작 (인덱스 조회 1번)"""
+        with self._db_lock:             # 쓰기 스레드의 커밋 ↔ _pending 차감 사이에 끼지 않도록 같은 락 안에서 합침
+            r = self._conn.execute("SELECT turns, sum_t_ms, sum_chars_out FROM session_agg WHERE session = ?",
+                                   (session,)).fetchone()
+            with self._lock:
+                if session in self._agg:
+                    return
+                agg = self._agg[session] = SessionAgg(*r) if r else SessionAgg()
+                p = self._pending.get(session)
+                if p is not None:
+                    agg.merge(p.turns, p.sum_t_ms, p.sum_chars_out)
+                while len(self._agg) > MAX_SESSIONS:
+                    old, _ = self._agg.popitem(last=False)
+                    self._recent.pop(old, None)
+
+    def _session_recent(self, session: str) -> Deque[Dict[str, Any]]:
+        rows = self._recent.get(session)
+        if rows is None:
+            rows = self._recent[session] = deque(maxlen=self.recent_rows)
+        return rows
+
+    # ── 백그라운드 쓰기
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + FLUSH_INTERVAL_S
+            while item is not None and len(batch) < BATCH_MAX:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+            rows = [b for b in batch if b is not None]
+            try:
+                if rows:
+                    self._write(rows)
+            except Exception as e:      # 기록 실패가 채팅을 멈추게 하지 않음
+                print(f"[log_store] 기록 실패 ({len(rows)}행): {type(e).__name__}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, rows: List[Tuple[float, str, str, Dict[str, Any]]]):
+        values, agg = [], {}
+        for ts, session, app, row in rows:
+            values.append((ts, session, app, *[row.get(c) for c in COLUMNS],
+                           json.dumps(row, ensure_ascii=False, default=str)))
+            a = agg.setdefault(session, [app, 0, 0.0, 0, ts, ts])
+            a[1] += 1
+            a[2] += row.get("t_ms") or 0
+            a[3] += row.get("chars_out") or 0
+            a[5] = ts
+        with self._db_lock:
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO turns (ts, session, app, {', '.join(COLUMNS)}, data) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 4))})", values)
+                self._conn.executemany(
+                    "INSERT INTO session_agg VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(session) DO UPDATE SET "
+                    "turns = turns + excluded.turns, sum_t_ms = sum_t_ms + excluded.sum_t_ms, "
+                    "sum_chars_out = sum_chars_out + excluded.sum_chars_out, last_ts = excluded.last_ts",
+                    [(s, *a) for s, a in agg.items()])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()   # 일부만 들어간 행이 다음 배치와 함께 커밋되지 않도록
+                raise
+            finally:                    # 성공/실패 모두 더는 대기 중이 아님
+                with self._lock:
+                    for s, (_, turns, sum_t_ms, sum_chars_out, _, _) in agg.items():
+                        p = self._pending[s]
+                        p.merge(-turns, -sum_t_ms, -sum_chars_out)
+                        if p.turns <= 0:
+                            del self._pending[s]
+        self.written += len(rows)
+        self.batches += 1
+
+    # ── 조회 (대시보드)
+    def kpis(self, session: str) -> Dict[str, Any]:
+        """{"turns", "avg_ms", "chars_out"} — 누적값에서 바로 계산"""
+        while True:
+            with self._lock:
+                agg = self._cached_agg(session)
+                if agg is not None:
+                    return agg.as_dict()
+            self._load_agg(session)
+
+    def recent(self, session: str) -> List[Dict[str, Any]]:
+        """세션 최근 RECENT_ROWS개 (오래된 → 최신)"""
+        with self._lock:
+            return list(self._recent.get(session, ()))
+
+    def last(self, session: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rows = self._recent.get(session)
+            return rows[-1] if rows else None
+
+    def session_rows(self, session: str) -> List[Dict[str, Any]]:
+        """세션 전체 기록 (CSV 내보내기용 — 대기 중인 행을 먼저 기록)"""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute("SELECT data FROM turns WHERE session = ? ORDER BY id", (session,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def flush(self):
+        """큐에 쌓인 행이 모두 기록될 때까지 대기"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": self._queue.qsize(), "written": self.written, "batches": self.batches}
@@ -0,0 +1,327 @@
+# mock_openai_server.py
+# 로컬 가짜 OpenAI 엔드포인트 (실제 과금/네트워크 없이 벤치마크·부하 테스트용)
+# - POST /v1/embeddings : 텍스트 해시 기반 결정적 임베딩(비슷한 글자 n-gram → 비슷한 벡터)
+# - POST /v1/responses, /v1/chat/completions : 입력을 되받아 적는 고정 답변 (stream=True면 SSE로 토큰 단위 전송)
+# - POST /v1/images/generations : 1x1 PNG (b64_json)
+# - 지연(latency_ms + 입력 1k 토큰당 ms_per_1k_tok + 출력 토큰당 ms_per_out_tok), 429/500 오류 주입(rate_429, rate_500) 옵션
+# - 분당 요청 한도(rpm): 초과하면 실제 API처럼 429 + retry-after-ms / x-ratelimit-* 헤더 (게이트웨이 부하 테스트용)
+# - 동시 처리 중 요청 수 최대값을 stats["max_inflight"]로 기록
+# - HTTP/1.1 keep-alive 지원 → 클라이언트 연결 재사용 여부를 stats["connections"]로 확인 가능
+# 사용 예)
+#   python -m common.mock_openai_server --port 8765 --latency-ms 150 --rate-429 0.1 --rpm 600
+#   client = OpenAI(api_key="sk-mock", base_url="http://127.0.0.1:8765/v1")
+import argparse, base64, hashlib, itertools, json, random, socket, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+import numpy as np
+
+DEFAULT_DIM = 256
+DEFAULT_OUT_TOKENS = 40
+RPM_BURST_S = 1.0       # rpm 한도를 이 시간 단위로 적용 (실제 API도 1분보다 짧은 구간으로 나눠 제한)
+PNG_1PX = base64.b64encode(bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d4944415478da63f8ffff3f0005fe02fea7d6a4e70000000049454e44ae426082")).decode("ascii")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 결정적 가짜 임베딩: 문자 3-gram을 해시 버킷에 누적 → 단위 정규화
+# ──────────────────────────────────────────────────────────────────────────────
+def hash_embedding(text: str, dim: int = DEFAULT_DIM) -> np.ndarray:
+    v = np.zeros(dim, dtype=np.float32)
+    t = " ".join(text.lower().split())
+    grams = [t[i:i + 3] for i in range(max(1, len(t) - 2))]
+    for g in grams:
+        h = int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little")
+        v[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    return v / (np.linalg.norm(v) + 1e-8)
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+def mock_answer_tokens(prompt: str, n_tokens: int) -> list:
+    """질문 끝부분을 되받아 적는 고정 답변을 토큰(단어) 목록으로"""
+    tail = " ".join(prompt.split()[-8:]) or "empty"
+    words = f"(mock) You asked: {tail}.".split()
+    words += [f"word{i}" for i in range(max(0, n_tokens - len(words)))]
+    return [w + " " for w in words[:max(1, n_tokens)]]
+
+def input_text(body: dict) -> str:
+    """responses(input: str | list) / chat.completions(messages) 입력을 문자열 하나로"""
+    items = body.get("input") if "input" in body else body.get("messages") or []
+    if isinstance(items, str):
+        return items
+    parts = []
+    for m in items:
+        content = m.get("content") if isinstance(m, dict) else m
+        if isinstance(content, list):
+            content = " ".join(c.get("text", "") for c in content if isinstance(c, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# HTTP 핸들러
+# ──────────────────────────────────────────────────────────────────────────────
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/0.1"
+    protocol_version = "HTTP/1.1"       # keep-alive (응답마다 Content-Length 또는 chunked)
+
+    def setup(self):
+        super().setup()
+        # 헤더/본문을 나눠 쓰므로 Nagle + 지연 ACK(약 40ms)가 keep-alive 연결 지연을 왜곡하지 않게
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count("connections")    # 새 TCP 연결 수 (keep-alive 재사용이면 늘지 않음)
+
+    def log_message(self, fmt, *args):   # 콘솔 로그 생략
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def _inject_error(self) -> bool:
+        """분당 한도 초과 또는 설정된 확률로 429/500 응답. 응답했으면 True"""
+        opts = self.server.opts
+        wait_s = self.server.take_request()
+        if wait_s > 0:
+            self.server.count("429")
+            self.server.count("429_rpm")
+            self._send_json(429, {"error": {"message": f"Rate limit reached for requests (mock rpm={opts['rpm']})",
+                                            "type": "requests", "code": "rate_limit_exceeded"}},
+                            {"retry-after-ms": str(int(wait_s * 1000) + 1),
+                             "x-ratelimit-limit-requests": str(int(opts["rpm"])),
+                             "x-ratelimit-remaining-requests": "0"})
+            return True
+        r = random.random()
+        if r < opts["rate_429"]:
+            self.server.count("429")
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                            {"retry-after-ms": "50"})
+            return True
+        if r < opts["rate_429"] + opts["rate_500"]:
+            self.server.count("500")
+            self._send_json(500, {"error": {"message": "Internal error (mock)", "type": "server_error"}})
+            return True
+        return False
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._read_json()
+        self.server.count("requests")
+        self.server.enter()
+        try:
+            time.sleep(self.server.opts["latency_ms"] / 1000)
+            if not self._inject_error():
+                self._route(path, body)
+        finally:
+            self.server.leave()
+
+    def _route(self, path: str, body: dict):
+        if path.endswith("/images/generations"):
+            self.server.count("images")
+            n = int(body.get("n") or 1)
+            self._send_json(200, {"created": int(time.time()), "data": [{"b64_json": PNG_1PX} for _ in range(n)]})
+            return
+
+        if path.endswith("/embeddings"):
+            inputs = body.get("input") or []
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            n_tok = sum(estimate_tokens(t) for t in inputs)
+            time.sleep(self.server.opts["ms_per_1k_tok"] * n_tok / 1e6)   # 입력량 비례 처리 시간
+            dim = int(body.get("dimensions") or self.server.opts["dim"])
+            data = [{"object": "embedding", "index": i, "embedding": hash_embedding(t, dim).tolist()}
+                    for i, t in enumerate(inputs)]
+            self.server.count("inputs", len(inputs))
+            self._send_json(200, {"object": "list", "data": data, "model": body.get("model", "mock"),
+                                  "usage": {"prompt_tokens": n_tok, "total_tokens": n_tok}})
+            return
+
+        if path.endswith("/responses") or path.endswith("/chat/completions"):
+            prompt = input_text(body)
+            n_in = estimate_tokens(prompt)
+            time.sleep(self.server.opts["ms_per_1k_tok"] * n_in / 1e6)
+            n_out = int(body.get("max_output_tokens") or body.get("max_tokens") or self.server.opts["out_tokens"])
+            tokens = mock_answer_tokens(prompt, min(n_out, self.server.opts["out_tokens"]))
+            self.server.count("generations")
+            chat = path.endswith("/chat/completions")
+            model = body.get("model", "mock")
+            if body.get("stream"):
+                self._stream(chat, model, tokens, n_in)
+            elif chat:
+                self._send_json(200, chat_completion(model, "".join(tokens), n_in, len(tokens)))
+            else:
+                self._send_json(200, response_object(model, "".join(tokens), n_in, len(tokens)))
+            return
+
+        self._send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "not_found"}})
+
+    # ── SSE 스트리밍 (chunked 전송, 토큰 사이 ms_per_out_tok 지연)
+    def _stream(self, chat: bool, model: str, tokens: list, n_in: int):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = self.server.opts["ms_per_out_tok"] / 1000
+        events = chat_stream_events(model, tokens, n_in) if chat else response_stream_events(model, tokens, n_in)
+        for i, ev in enumerate(events):
+            if delay and i and (chat or ev["type"] == "response.output_text.delta"):
+                time.sleep(delay)
+            self._write_chunk(f"data: {json.dumps(ev)}\n\n" if chat else
+                              f"event: {ev['type']}\ndata: {json.dumps(ev)}\n\n")
+        if chat:
+            self._write_chunk("data: [DONE]\n\n")
+        self._write_chunk("")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 생성 응답 본문 (Responses API / Chat Completions 형식)
+# ──────────────────────────────────────────────────────────────────────────────
+_ids = itertools.count(1)
+
+def response_object(model: str, text: str, n_in: int, n_out: int, status: str = "completed", rid: str = None) -> dict:
+    rid = rid or f"resp_mock{next(_ids)}"
+    output = [{"type": "message", "id": f"msg_{rid}", "status": "completed", "role": "assistant",
+               "content": [{"type": "output_text", "text": text, "annotations": []}]}] if status == "completed" else []
+    return {"id": rid, "object": "response", "created_at": int(time.time()), "model": model, "status": status,
+            "output": output, "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            "usage": {"input_tokens": n_in, "output_tokens": n_out, "total_tokens": n_in + n_out,
+                      "input_tokens_details": {"cached_tokens": 0},
+                      "output_tokens_details": {"reasoning_tokens": 0}} if status == "completed" else None}
+
+def response_stream_events(model: str, tokens: list, n_in: int) -> list:
+    rid = f"resp_mock{next(_ids)}"
+    mid = f"msg_{rid}"
+    text = "".join(tokens)
+    part = {"type": "output_text", "text": "", "annotations": []}
+    events = [
+        {"type": "response.created", "response": response_object(model, "", n_in, 0, "in_progress", rid)},
+        {"type": "response.output_item.added", "output_index": 0,
+         "item": {"type": "message", "id": mid, "status": "in_progress", "role": "assistant", "content": []}},
+        {"type": "response.content_part.added", "item_id": mid, "output_index": 0, "content_index": 0, "part": part},
+    ]
+    events += [{"type": "response.output_text.delta", "item_id": mid, "output_index": 0, "content_index": 0,
+                "delta": t, "logprobs": []} for t in tokens]
+    events += [
+        {"type": "response.output_text.done", "item_id": mid, "output_index": 0, "content_index": 0,
+         "text": text, "logprobs": []},
+        {"type": "response.content_part.done", "item_id": mid, "output_index": 0, "content_index": 0,
+         "part": {**part, "text": text}},
+        {"type": "response.output_item.done", "output_index": 0,
+         "item": {"type": "message", "id": mid, "status": "completed", "role": "assistant",
+                  "content": [{**part, "text": text}]}},
+        {"type": "response.completed", "response": response_object(model, text, n_in, len(tokens), rid=rid)},
+    ]
+    for i, ev in enumerate(events):
+        ev["sequence_number"] = i
+    return events
+
+def chat_completion(model: str, text: str, n_in: int, n_out: int) -> dict:
+    return {"id": f"chatcmpl-mock{next(_ids)}", "object": "chat.completion", "created": int(time.time()),
+            "model": model, "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": n_in, "completion_tokens": n_out, "total_tokens": n_in + n_out}}
+
+def chat_stream_events(model: str, tokens: list, n_in: int) -> list:
+    cid = f"chatcmpl-mock{next(_ids)}"
+    base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": t}, "finish_reason": None}]}
+              for t in tokens]
+    events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    return events
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, opts: dict):
+        super().__init__(addr, MockHandler)
+        self.opts = opts
+        self.stats = {"requests": 0, "inputs": 0, "generations": 0, "connections": 0, "429": 0, "500": 0,
+                      "inflight": 0, "max_inflight": 0}
+        self._lock = threading.Lock()
+        self._allow = self._burst()                     # 요청 토큰 버킷 (초당 rpm/60 보충)
+        self._t_allow = time.monotonic()
+
+    def handle_error(self, request, client_address):
+        """클라이언트가 먼저 끊은 연결(스트림 중단, keep-alive 종료)은 조용히 무시"""
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def enter(self):
+        with self._lock:
+            self.stats["inflight"] += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self.stats["inflight"])
+
+    def leave(self):
+        with self._lock:
+            self.stats["inflight"] -= 1
+
+    def _burst(self) -> float:
+        return max(1.0, (self.opts.get("rpm") or 0) / 60 * RPM_BURST_S)
+
+    def take_request(self) -> float:
+        """분당 한도 버킷에서 1개 사용 → 0 (허용) 또는 다음 1개가 생길 때까지 초"""
+        rpm = self.opts.get("rpm") or 0
+        if rpm <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._allow = min(self._burst(), self._allow + (now - self._t_allow) * rpm / 60)
+            self._t_allow = now
+            if self._allow >= 1:
+                self._allow -= 1
+                return 0.0
+            return (1 - self._allow) * 60 / rpm
+
+def start_mock_server(port: int = 0, latency_ms: float = 0.0, rate_429: float = 0.0,
+                      rate_500: float = 0.0, dim: int = DEFAULT_DIM,
+                      ms_per_1k_tok: float = 0.0, ms_per_out_tok: float = 0.0,
+                      out_tokens: int = DEFAULT_OUT_TOKENS, rpm: float = 0.0) -> Tuple[MockServer, str]:
+    """백그라운드 스레드로 서버 시작 → (server, base_url). 종료는 server.shutdown()"""
+    opts = {"latency_ms": latency_ms, "rate_429": rate_429, "rate_500": rate_500, "dim": dim,
+            "ms_per_1k_tok": ms_per_1k_tok, "ms_per_out_tok": ms_per_out_tok, "out_tokens": out_tokens, "rpm": rpm}
+    server = MockServer(("127.0.0.1", port), opts)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    ap = argparse.ArgumentParser(description="로컬 가짜 OpenAI 서버")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rate-500", type=float, default=0.0)
+    ap.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    ap.add_argument("--ms-per-1k-tok", type=float, default=0.0)
+    ap.add_argument("--ms-per-out-tok", type=float, default=0.0, help="스트리밍 출력 토큰 사이 지연")
+    ap.add_argument("--out-tokens", type=int, default=DEFAULT_OUT_TOKENS)
+    ap.add_argument("--rpm", type=float, default=0.0, help="분당 요청 한도 (0: 무제한)")
+    args = ap.parse_args()
+    server, base_url = start_mock_server(args.port, args.latency_ms, args.rate_429, args.rate_500,
+                                         args.dim, args.ms_per_1k_tok, args.ms_per_out_tok, args.out_tokens,
+                                         args.rpm)
+    print(f"mock OpenAI server: {base_url}  (Ctrl+C 종료)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
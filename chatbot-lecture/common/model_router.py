@@ -0,0 +1,344 @@
+# model_router.py
+# 요청별 모델 자동 선택 (ch03 대시보드, ch05/diet_chatbot.py 의 "auto" 모델)
+# - 기존: 앱마다 모델 목록(GEN_MODELS, 사이드바 selectbox)을 하드코딩하고 사용자가 직접 고름
+#   → 짧은 인사에도 비싼/느린 모델, 모델 장애 시 그대로 실패
+# - ModelRouter
+#   · 모델별 최근 관측치(첫 토큰 대기, 생성 tok/s)를 롤링 창으로 유지 — 시작할 때 LogStore 기록에서 채우고
+#     이후 턴마다 observe(로그 행)로 갱신
+#   · 질문 난이도 분류(simple / medium / complex: 길이 + 키워드 + 프롬프트 토큰) → 필요한 최소 등급(MODEL_TIER)
+#   · 등급을 만족하는 모델 중 예상 비용이 싼 순서로, 예상 지연(대기 p90 + 예상 출력 / tok/s p50)이
+#     SLO 안에 드는 첫 모델 선택 (모두 넘으면 가장 빠른 모델) → 어려운 질문일 때만 상위 모델로 올라감
+#   · 실패 시 다음 후보로 자동 폴백, 연속 실패한 모델은 잠시(COOLDOWN_S) 후보에서 제외
+# 사용 예)
+#   router = get_router()
+#   route = router.route(prompt, prompt_tokens=n, slo_ms=8000)
+#   answer = router.run(route, lambda m: call_model(m))     # route.model = 실제로 답한 모델
+#   router.observe(log_row)                                  # {"model", "t_wait_ms", "tok_s", ...}
+# 측정 (가상 모델 지연 분포 + 장애 구간, 고정 모델 vs 라우터)
+#   python -m common.model_router --requests 2000
+import argparse, math, pathlib, random, sqlite3, statistics, threading, time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from openai import APIError, AuthenticationError
+
+from common.chat_memory import count_tokens
+from common.log_store import LOG_DB
+
+# 1M 토큰당 USD (입력, 출력) — 단가가 바뀌면 여기만 수정 (log_analytics 비용 추정도 같은 표 사용)
+PRICES_PER_1M: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+AUTO = "auto"                   # selectbox 에서 라우터 사용을 뜻하는 값
+ROUTE_MODELS = ["gpt-4o-mini", "gpt-4.1-mini", "gpt-4o", "gpt-4.1"]     # 라우터 기본 후보
+MODEL_TIER = {"gpt-4.1-nano": 0, "gpt-3.5-turbo": 0, "gpt-4o-mini": 0,  # 답변 품질 등급 (높을수록 어려운 질문 가능)
+              "gpt-4.1-mini": 1, "gpt-4o": 2, "gpt-4.1": 2}
+CLASS_TIER = {"simple": 0, "medium": 1, "complex": 2}
+EXPECTED_OUT_TOKENS = {"simple": 200, "medium": 500, "complex": 900}
+LATENCY_SLO_MS = 8000           # 예상 전체 응답 시간 목표
+WINDOW = 200                    # 모델별 롤링 관측치 수
+WINDOW_S = 3600.0               # 이보다 오래된 관측치는 무시
+MIN_SAMPLES = 5                 # 관측치가 이보다 적으면 사전값(PRIOR_*) 사용
+PRIOR_WAIT_MS = 800.0
+PRIOR_TOK_S = 50.0
+MAX_CHAIN = 3                   # 폴백까지 포함한 최대 시도 모델 수
+FAIL_LIMIT = 2                  # 연속 실패 횟수 → 쿨다운
+COOLDOWN_S = 60.0
+
+COMPLEX_HINTS = ("코드", "구현", "설계", "분석", "비교", "증명", "단계별", "이유", "왜 ", "최적화", "전략", "계획",
+                 "리팩터", "디버그", "code", "implement", "design", "analy", "compare", "prove", "step by step",
+                 "explain why", "optimi", "debug", "```")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1) 난이도 분류 / 비용 / 폴백 판단
+# ──────────────────────────────────────────────────────────────────────────────
+def classify(question: str, prompt_tokens: Optional[int] = None) -> Tuple[str, str]:
+    """(simple | medium | complex, 이유) — 질문 길이/키워드 + 컨텍스트 포함 프롬프트 토큰"""
+    q_tok = count_tokens(question)
+    low = question.lower()
+    hints = [h.strip() for h in COMPLEX_HINTS if h in low]
+    p_tok = prompt_tokens or q_tok
+    if len(hints) >= 2 or q_tok > 300 or p_tok > 6000:
+        return "complex", f"질문 {q_tok}tok · 프롬프트 {p_tok}tok · 키워드 {hints[:3]}"
+    if hints or q_tok > 80 or p_tok > 2000:
+        return "medium", f"질문 {q_tok}tok · 프롬프트 {p_tok}tok · 키워드 {hints[:3]}"
+    return "simple", f"질문 {q_tok}tok · 프롬프트 {p_tok}tok"
+
+def expected_cost(model: str, prompt_tokens: int, out_tokens: int) -> float:
+    """예상 비용(USD) — 단가표에 없는 모델은 inf (후보 맨 뒤)"""
+    if model not in PRICES_PER_1M:
+        return math.inf
+    p_in, p_out = PRICES_PER_1M[model]
+    return (prompt_tokens * p_in + out_tokens * p_out) / 1e6
+
+def is_fallback_error(e: Exception) -> bool:
+    """다른 모델로 바꾸면 나을 수 있는 오류만 (인증/크레딧 문제, 앱 오류는 그대로 올림)"""
+    if not isinstance(e, APIError) or isinstance(e, AuthenticationError):
+        return False
+    return getattr(e, "code", None) != "insufficient_quota"
+
+def with_fallback(models: Sequence[str], fn: Callable[[str], Any],
+                  on_error: Optional[Callable[[str, Exception], None]] = None) -> Tuple[str, Any]:
+    """models 순서대로 fn(model) — 폴백 가능한 오류면 다음 모델, 마지막 모델의 오류는 그대로 raise → (모델, 결과)"""
+    for i, model in enumerate(models):
+        try:
+            return model, fn(model)
+        except Exception as e:
+            if i == len(models) - 1 or not is_fallback_error(e):
+                raise
+            if on_error is not None:
+                on_error(model, e)
+
+def _quantile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2) 라우팅 결정 / 모델별 롤링 통계
+# ──────────────────────────────────────────────────────────────────────────────
+class Route:
+    """라우팅 결정 1건 (run 이 model / fallbacks 를 채움) — log_fields() 를 로그 행에 합침"""
+    __slots__ = ("model", "chain", "klass", "reason", "est_ms", "fallbacks")
+
+    def __init__(self, chain: List[str], klass: str, reason: str, est_ms: Dict[str, float]):
+        self.model = chain[0]
+        self.chain = chain
+        self.klass = klass
+        self.reason = reason
+        self.est_ms = est_ms                # 후보별 예상 지연 (결정 근거)
+        self.fallbacks: List[str] = []      # "모델: 오류" (폴백이 일어난 경우)
+
+    def log_fields(self) -> Dict[str, Any]:
+        return {"route_class": self.klass, "route_model": self.chain[0],
+                "route_est_ms": round(self.est_ms.get(self.chain[0], 0.0)), "route_reason": self.reason,
+                "fallbacks": " → ".join(self.fallbacks) or None}
+
+class ModelStats:
+    """모델 1개의 최근 관측치 (시각, 첫 토큰 대기 ms, tok/s) + 연속 실패 수"""
+    __slots__ = ("samples", "fails", "errors", "cooldown_until")
+
+    def __init__(self):
+        self.samples: Deque[Tuple[float, Optional[float], Optional[float]]] = deque(maxlen=WINDOW)
+        self.fails = 0
+        self.errors = 0
+        self.cooldown_until = 0.0
+
+    def recent(self, now: float) -> Tuple[List[float], List[float]]:
+        waits = [w for t, w, _ in self.samples if w is not None and now - t <= WINDOW_S]
+        speeds = [s for t, _, s in self.samples if s and now - t <= WINDOW_S]
+        return waits, speeds
+
+    def estimate_ms(self, out_tokens: int, now: float) -> float:
+        waits, speeds = self.recent(now)
+        wait = _quantile(waits, 0.9) if len(waits) >= MIN_SAMPLES else PRIOR_WAIT_MS
+        tok_s = statistics.median(speeds) if len(speeds) >= MIN_SAMPLES else PRIOR_TOK_S
+        return wait + out_tokens / tok_s * 1000
+
+class ModelRouter:
+    def __init__(self, models: Sequence[str] = ROUTE_MODELS, slo_ms: float = LATENCY_SLO_MS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.models = list(models)
+        self.slo_ms = slo_ms
+        self.clock = clock                  # 측정 시뮬레이션에서는 가상 시계
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> ModelStats:
+        s = self._stats.get(model)
+        if s is None:
+            s = self._stats[model] = ModelStats()
+        return s
+
+    # ── 관측치 (LogStore 기록 / 매 턴 로그 행)
+    def load_history(self, path: pathlib.Path = LOG_DB, limit: int = 5000) -> int:
+        """로그 DB 최근 기록으로 롤링 창 채우기 → 읽은 행 수 (DB 없으면 0)"""
+        path = pathlib.Path(path)
+        if not path.exists():
+            return 0
+        conn = sqlite3.connect(f"file:{path.as_posix()}?mode=ro", uri=True)
+        try:
+            # 스트리밍 턴만 (t_gen_ms 있음) — 이전 비스트리밍 행은 t_wait_ms 에 요청 전체 시간이 들어 있음
+            rows = conn.execute("SELECT ts, model, t_wait_ms, tok_s FROM turns WHERE ts >= ? AND model IS NOT NULL "
+                                "AND t_wait_ms IS NOT NULL AND t_gen_ms IS NOT NULL ORDER BY id DESC LIMIT ?",
+                                (time.time() - WINDOW_S, limit)).fetchall()
+        except sqlite3.Error:
+            return 0
+        finally:
+            conn.close()
+        offset = self.clock() - time.time()         # 저장 시각(epoch) → 라우터 시계
+        with self._lock:
+            for ts, model, wait, tok_s in reversed(rows):
+                self._model(model).samples.append((ts + offset, wait, tok_s))
+        return len(rows)
+
+    def observe(self, row: Dict[str, Any]):
+        """성공한 턴의 로그 행 (model, t_wait_ms, tok_s) — 캐시 적중/비스트리밍(t_wait_ms 없음) 턴은 건너뜀"""
+        if not row.get("model") or row.get("t_wait_ms") is None:
+            return
+        with self._lock:
+            self._model(row["model"]).samples.append((self.clock(), row["t_wait_ms"], row.get("tok_s")))
+
+    def _succeeded(self, model: str):
+        with self._lock:
+            self._model(model).fails = 0
+
+    def _failed(self, model: str):
+        with self._lock:
+            s = self._model(model)
+            s.fails += 1
+            s.errors += 1
+            if s.fails >= FAIL_LIMIT:
+                s.cooldown_until = self.clock() + COOLDOWN_S
+
+    # ── 결정
+    def route(self, question: str, prompt_tokens: Optional[int] = None, candidates: Optional[Sequence[str]] = None,
+              slo_ms: Optional[float] = None, max_output_tokens: Optional[int] = None) -> Route:
+        klass, why = classify(question, prompt_tokens)
+        slo = slo_ms or self.slo_ms
+        out = max_output_tokens or EXPECTED_OUT_TOKENS[klass]
+        p_tok = prompt_tokens or count_tokens(question)
+        now = self.clock()
+        candidates = list(candidates or self.models)
+        with self._lock:
+            est = {m: round(self._model(m).estimate_ms(out, now), 1) for m in candidates}
+            ready = [m for m in candidates if self._model(m).cooldown_until <= now] or candidates
+        need = CLASS_TIER[klass]
+        able = [m for m in ready if MODEL_TIER.get(m, 0) >= need]
+        able.sort(key=lambda m: (expected_cost(m, p_tok, out), est[m]))
+        within = [m for m in able if est[m] <= slo]
+        if within:
+            first, reason = within[0], f"{klass}: SLO {slo / 1000:.0f}s 안에서 가장 싼 모델"
+        elif able:
+            first, reason = min(able, key=est.get), f"{klass}: SLO 초과 예상 → 가장 빠른 모델"
+        else:                                       # 등급을 만족하는 모델이 없음 → 가장 높은 등급
+            first = max(ready, key=lambda m: (MODEL_TIER.get(m, 0), -est[m]))
+            reason = f"{klass}: 등급 맞는 후보 없음 → 최상위 등급"
+        # 폴백 순서: 같은 등급 이상 예상 지연 순 → 그래도 안 되면 낮은 등급으로 (실패보다 낮은 품질이 나음)
+        rest = sorted((m for m in able if m != first), key=est.get)
+        rest += sorted((m for m in ready if m not in able and m != first), key=est.get)
+        return Route([first] + rest[:MAX_CHAIN - 1], klass, f"{reason} ({why})", est)
+
+    def run(self, route: Route, fn: Callable[[str], Any]) -> Any:
+        """route.chain 순서대로 fn(model) — 실패하면 다음 모델로 폴백, route.model 은 실제로 답한 모델"""
+        def failed(model: str, e: Exception):
+            self._failed(model)
+            route.fallbacks.append(f"{model}: {type(e).__name__}")
+        try:
+            route.model, result = with_fallback(route.chain, fn, on_error=failed)
+        except Exception as e:
+            if is_fallback_error(e):
+                failed(route.chain[-1], e)
+            raise
+        self._succeeded(route.model)
+        return result
+
+    # ── Charts 탭용
+    def snapshot(self, out_tokens: int = EXPECTED_OUT_TOKENS["medium"]) -> List[Dict[str, Any]]:
+        """모델별 롤링 통계 (관측 수, 대기 p50/p90, tok/s p50, 예상 지연, 오류, 쿨다운 남은 초)"""
+        now = self.clock()
+        rows = []
+        with self._lock:
+            for m in sorted(set(self.models) | set(self._stats)):
+                s = self._model(m)
+                waits, speeds = s.recent(now)
+                rows.append({
+                    "model": m, "tier": MODEL_TIER.get(m), "samples": len(waits),
+                    "wait p50": round(statistics.median(waits)) if waits else None,
+                    "wait p90": round(_quantile(waits, 0.9)) if waits else None,
+                    "tok/s p50": round(statistics.median(speeds), 1) if speeds else None,
+                    f"est ms ({out_tokens}tok)": round(s.estimate_ms(out_tokens, now)),
+                    "errors": s.errors, "cooldown s": max(0, round(s.cooldown_until - now)),
+                })
+        return rows
+
+_ROUTERS: Dict[str, ModelRouter] = {}
+_LOCK = threading.Lock()
+
+def get_router(path: pathlib.Path = LOG_DB) -> ModelRouter:
+    """프로세스 전역 라우터 (모든 세션/앱이 관측치를 공유) — 처음 만들 때 로그 DB 기록으로 채움"""
+    key = str(path)
+    with _LOCK:
+        router = _ROUTERS.get(key)
+        if router is None:
+            router = _ROUTERS[key] = ModelRouter()
+            router.load_history(path)
+        return router
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 측정: 가상 모델(지연/속도 분포) 상대로 고정 모델 vs 라우터 — 지연, SLO 위반, 비용, 실패
+#   (네트워크 없이 결정/관측 루프만 시뮬레이션, 중간에 기본 모델 장애 구간 포함)
+# ──────────────────────────────────────────────────────────────────────────────
+SIM_MODELS = {  # 모델: (첫 토큰 대기 ms 중앙값, tok/s 평균)
+    "gpt-4o-mini": (450, 90), "gpt-4.1-mini": (550, 75), "gpt-4o": (700, 55), "gpt-4.1": (900, 45),
+}
+SIM_QUESTIONS = [
+    ("안녕하세요!", 20), ("오늘 날씨 어때?", 30), ("점심 메뉴 추천해줘", 40),
+    ("파이썬 리스트와 튜플 차이를 간단히 알려줘", 80), ("REST API 설계할 때 주의할 점을 알려줘", 250),
+    ("이 코드의 성능 병목을 분석하고 최적화 방법을 단계별로 설명해줘", 300),
+    ("마이크로서비스와 모놀리식 아키텍처를 비교하고 우리 팀에 맞는 설계 전략을 제안해줘", 400),
+]
+
+def bench(args):
+    from openai import APIConnectionError
+    from common.openai_client import httpx
+
+    outage = (args.requests // 3, args.requests // 3 + args.requests // 10)   # 이 구간 동안 gpt-4o-mini 장애
+
+    def run(name, pick):
+        rng = random.Random(args.seed)      # 모든 실행이 같은 질문 순서/지연 분포
+        now = [0.0]                         # 가상 시계 (요청 간격 args.interval_s)
+        router = ModelRouter(list(SIM_MODELS), slo_ms=args.slo_ms, clock=lambda: now[0])
+
+        def simulate(model: str, out_tokens: int, i: int) -> Dict[str, Any]:
+            if model == "gpt-4o-mini" and outage[0] <= i < outage[1]:
+                raise APIConnectionError(request=httpx.Request("POST", "http://sim/v1/responses"))
+            wait_p50, tok_s = SIM_MODELS[model]
+            wait = rng.lognormvariate(math.log(wait_p50), 0.35)
+            speed = max(5.0, rng.gauss(tok_s, tok_s * 0.15))
+            return {"model": model, "t_wait_ms": wait, "tok_s": speed, "t_ms": wait + out_tokens / speed * 1000}
+
+        lat, cost, failed, under, used = [], 0.0, 0, 0, {}
+        for i in range(args.requests):
+            now[0] = i * args.interval_s
+            q, out = SIM_QUESTIONS[rng.randrange(len(SIM_QUESTIONS))]
+            route = router.route(q, slo_ms=args.slo_ms)
+            if pick:                        # 고정 모델: 폴백 없음
+                route = Route([pick], route.klass, "fixed", route.est_ms)
+            try:
+                row = router.run(route, lambda m: simulate(m, out, i))
+            except APIError:
+                failed += 1
+                continue
+            router.observe(row)
+            lat.append(row["t_ms"])
+            cost += expected_cost(row["model"], 300, out)
+            under += MODEL_TIER[row["model"]] < CLASS_TIER[route.klass]    # 난이도보다 낮은 등급이 답함
+            used[row["model"]] = used.get(row["model"], 0) + 1
+        lat.sort()
+        p95 = lat[int(0.95 * (len(lat) - 1))]
+        slo_miss = sum(t > args.slo_ms for t in lat) / len(lat)
+        print(f"{name:<20}{statistics.mean(lat):>9.0f}{p95:>9.0f}{slo_miss:>8.1%}{cost * 1000:>10.1f}"
+              f"{under:>8}{failed:>8}  {used}")
+
+    print(f"requests={args.requests} every {args.interval_s}s slo={args.slo_ms}ms outage(gpt-4o-mini)={outage}")
+    print(f"{'model':<20}{'mean ms':>9}{'p95 ms':>9}{'>SLO':>8}{'cost m$':>10}{'under':>8}{'failed':>8}  used")
+    for m in SIM_MODELS:
+        run(f"fixed {m}", m)
+    run("router", None)
+
+def main():
+    ap = argparse.ArgumentParser(description="모델 라우터 시뮬레이션 (가상 지연 분포 + 장애 구간)")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--slo-ms", type=float, default=LATENCY_SLO_MS)
+    ap.add_argument("--interval-s", type=float, default=1.0, help="요청 간격(가상 시계)")
+    ap.add_argument("--seed", type=int, default=0)
+    bench(ap.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# openai_client.py
+# 프로세스 전역 OpenAI 클라이언트 (ch03~ch05 앱 공용)
+# - Streamlit은 위젯 조작마다 스크립트를 다시 실행 → 앱 최상단의 OpenAI(...)가 매번 새 HTTP 연결 풀을 만듦
+#   (TCP/TLS 연결을 매 턴 새로 맺고, 이전 풀은 GC될 때까지 방치)
+# - get_client: (API 키, base_url, 재시도 횟수)별로 1개만 만들어 재사용 — 임포트된 모듈은 재실행돼도 유지되므로
+#   Streamlit 세션/재실행과 무관하게 keep-alive 연결을 계속 씀
+# - 연결 풀: 동시 세션 수를 고려해 keep-alive 연결 수/유지 시간을 늘림, h2 패키지가 있으면 HTTP/2
+# 사용 예)
+#   from common.openai_client import get_client
+#   client = get_client(OPENAI_API_KEY)
+# 측정)
+#   python -m common.openai_client --turns 50 --latency-ms 20
+import argparse, os, statistics, threading, time
+from typing import Dict, Optional, Tuple
+
+from openai import DefaultHttpxClient, OpenAI
+
+try:
+    import httpx
+except ImportError:         # openai 3.x 는 httpx2 패키지 사용
+    import httpx2 as httpx
+
+try:
+    import h2  # noqa: F401  (HTTP/2 지원: pip install h2)
+    HTTP2 = True
+except Exception:
+    HTTP2 = False
+
+MAX_CONNECTIONS = 50            # 동시 요청 상한 (세션 여러 개 + 임베딩 병렬 워커)
+MAX_KEEPALIVE = 20              # 유휴 상태로 열어 둘 연결 수
+KEEPALIVE_EXPIRY_S = 120.0      # 유휴 연결 유지 시간 (사용자가 다음 질문을 입력하는 동안 끊기지 않게)
+CONNECT_TIMEOUT_S = 5.0
+READ_TIMEOUT_S = 120.0          # 긴 생성/스트리밍 응답
+
+_CLIENTS: Dict[Tuple[str, Optional[str], int], OpenAI] = {}
+_LOCK = threading.Lock()
+
+def pool_limits():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_EXPIRY_S)
+
+def get_client(api_key: Optional[str] = None, base_url: Optional[str] = None, max_retries: int = 2) -> OpenAI:
+    """(api_key, base_url, max_retries)별 공유 클라이언트 — 없으면 만들고, 있으면 그대로 반환 (스레드 안전)"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    key = (api_key, base_url, max_retries)
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                limits=pool_limits(), http2=HTTP2,
+                timeout=httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S))
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries, http_client=http_client)
+            _CLIENTS[key] = client
+        return client
+
+def close_clients():
+    """테스트/종료용: 공유 클라이언트와 연결 풀 정리"""
+    with _LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 측정: 로컬 가짜 서버 상대로 "턴마다 새 클라이언트"(기존 앱) vs get_client 공유 — 턴당 지연 / 새 연결 수
+#   (로컬 평문 HTTP라 TLS 핸드셰이크 비용은 빠져 있음 → 실제 api.openai.com에서는 차이가 더 큼)
+# ──────────────────────────────────────────────────────────────────────────────
+def bench(args):
+    from common.mock_openai_server import start_mock_server
+    server, base_url = start_mock_server(latency_ms=args.latency_ms, out_tokens=args.out_tokens)
+
+    def turn(client: OpenAI):
+        if args.stream:
+            with client.responses.stream(model="mock", input="안녕하세요, 질문입니다.") as stream:
+                for _ in stream:
+                    pass
+        else:
+            client.responses.create(model="mock", input="안녕하세요, 질문입니다.")
+
+    def run(name, make_client):
+        turn(make_client())                     # 워밍업 (임포트/첫 연결)
+        conn0 = server.stats["connections"]
+        lat = []
+        for _ in range(args.turns):
+            t0 = time.perf_counter()
+            turn(make_client())                 # 재실행 1번 = 클라이언트 준비 + 요청 1번
+            lat.append((time.perf_counter() - t0) * 1000)
+        lat.sort()
+        p95 = lat[int(0.95 * (len(lat) - 1))]
+        print(f"{name:<22}{statistics.mean(lat):>10.2f}{statistics.median(lat):>10.2f}{p95:>10.2f}"
+              f"{server.stats['connections'] - conn0:>10}")
+        return statistics.mean(lat)
+
+    print(f"turns={args.turns} latency={args.latency_ms}ms stream={args.stream} http2={HTTP2}")
+    print(f"{'client':<22}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'new conns':>10}")
+    fresh = run("new OpenAI() per turn", lambda: OpenAI(api_key="sk-mock", base_url=base_url))
+    shared = run("get_client (shared)", lambda: get_client("sk-mock", base_url))
+    print(f"saved per turn: {fresh - shared:.2f} ms")
+    close_clients()
+    server.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser(description="공유 OpenAI 클라이언트 턴당 지연 측정 (로컬 가짜 서버)")
+    ap.add_argument("--turns", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--out-tokens", type=int, default=40)
+    ap.add_argument("--stream", action="store_true")
+    bench(ap.parse_args())
+
+if __name__ == "__main__":
+    main()
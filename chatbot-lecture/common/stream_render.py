@@ -0,0 +1,157 @@
+# stream_render.py
+# 스트리밍 응답 점진 렌더러 (ch03~ch05 스트리밍 앱 공용)
+# - 기존 방식: 델타마다 placeholder.markdown("".join(chunks)) → 매 토큰 전체 문자열 재결합 + 브라우저 재전송
+#   (문자 수 기준 O(n²), 긴 답변에서 웹소켓 메시지 폭주)
+# - StreamRenderer: 델타는 버퍼에 모았다가 "시간 간격" 또는 "버퍼 크기" 기준으로만 화면 갱신
+#   누적 문자열은 flush 때 한 번만 이어붙임, 첫 델타는 즉시 표시 (체감 첫 토큰 지연 유지)
+# - 첫 토큰 시간(TTFT), 초당 토큰(델타 수 기준) 측정, 마지막 이벤트(response.completed)의 토큰 사용량 보관
+# 사용 예)
+#   renderer = StreamRenderer(st.empty())
+#   with client.responses.stream(model=..., input=...) as stream:
+#       renderer.consume(stream)
+#   answer = renderer.text or "(응답 없음)"
+# 측정)
+#   python -m common.stream_render --tokens 2000
+import argparse, time
+from typing import Any, List, Optional
+
+FLUSH_INTERVAL_S = 0.08     # 화면 갱신 최소 간격 (약 12fps — 눈으로는 충분히 연속적)
+FLUSH_CHARS = 400           # 간격 전이라도 버퍼가 이만큼 쌓이면 갱신
+CURSOR = "▌"                # 생성 중 표시 (마지막 flush에서 제거)
+
+class StreamRenderer:
+    def __init__(self, placeholder: Any, interval_s: float = FLUSH_INTERVAL_S,
+                 flush_chars: int = FLUSH_CHARS, cursor: str = CURSOR):
+        self.placeholder = placeholder      # st.empty() (markdown(str) 메서드만 있으면 됨)
+        self.interval_s = interval_s
+        self.flush_chars = flush_chars
+        self.cursor = cursor
+        self.text = ""                      # 화면에 반영된 누적 문자열
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self.n_deltas = 0
+        self.n_flushes = 0
+        self.t_start = time.perf_counter()  # 요청 직전에 만들면 요청 시작 시점
+        self.t_first: Optional[float] = None
+        self.t_last: Optional[float] = None
+        self.t_close: Optional[float] = None
+        self.usage: Any = None              # response.completed 이벤트의 usage (input/output_tokens)
+        self._t_flush = 0.0
+
+    # ── 델타 입력
+    def feed(self, delta: str):
+        if not delta:
+            return
+        now = time.perf_counter()
+        if self.t_first is None:
+            self.t_first = now
+        self.t_last = now
+        self.n_deltas += 1
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        if (self.n_flushes == 0 or now - self._t_flush >= self.interval_s
+                or self._pending_chars >= self.flush_chars):
+            self.flush(now)
+
+    def flush(self, now: Optional[float] = None, final: bool = False):
+        if self._pending:
+            self.text += "".join(self._pending)
+            self._pending.clear()
+            self._pending_chars = 0
+        elif not final:
+            return
+        self.placeholder.markdown(self.text if final else self.text + self.cursor)
+        self.n_flushes += 1
+        self._t_flush = now or time.perf_counter()
+
+    def close(self) -> str:
+        """남은 버퍼 반영 + 커서 제거, 최종 문자열 반환"""
+        if self.n_flushes or self._pending:
+            self.flush(final=True)
+        self.t_close = time.perf_counter()
+        return self.text
+
+    def consume(self, stream) -> str:
+        """Responses 스트림 이벤트를 끝까지 읽으며 텍스트 델타만 렌더 (완료 이벤트에서 usage 보관)"""
+        try:
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    self.feed(event.delta)
+                elif event.type == "response.completed":
+                    self.usage = getattr(event.response, "usage", None)
+        finally:
+            self.close()
+        return self.text
+
+    # ── 지표
+    @property
+    def ttft_ms(self) -> Optional[int]:
+        return None if self.t_first is None else int((self.t_first - self.t_start) * 1000)
+
+    @property
+    def tok_per_s(self) -> Optional[float]:
+        """첫 델타 이후 초당 델타 수 (Responses 델타 ≈ 토큰 1개)"""
+        if self.t_first is None or self.n_deltas < 2 or self.t_last == self.t_first:
+            return None
+        return round((self.n_deltas - 1) / (self.t_last - self.t_first), 1)
+
+    def summary(self) -> str:
+        tps = self.tok_per_s
+        return (f"첫 토큰 {self.ttft_ms} ms · {tps if tps is not None else '-'} tok/s · "
+                f"델타 {self.n_deltas}개 / 화면 갱신 {self.n_flushes}회")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 측정: 델타마다 전체 재결합·재전송(기존) vs StreamRenderer — 갱신 횟수 / 전송 문자 수 / CPU 시간
+#   (브라우저 렌더 비용은 빠져 있음 → 실제로는 전송량에 비례해 차이가 더 큼)
+# ──────────────────────────────────────────────────────────────────────────────
+class _CountingPlaceholder:
+    def __init__(self, render_cost_per_char_s: float = 0.0):
+        self.calls = 0
+        self.chars = 0
+        self.cost = render_cost_per_char_s
+
+    def markdown(self, text: str):
+        self.calls += 1
+        self.chars += len(text)
+        if self.cost:
+            time.sleep(len(text) * self.cost)
+
+def bench(args):
+    deltas = [f"토큰{i % 10} " for i in range(args.tokens)]
+    gap = args.ms_per_tok / 1000
+
+    def naive():
+        ph, chunks = _CountingPlaceholder(args.render_ns_per_char * 1e-9), []
+        for d in deltas:
+            chunks.append(d)
+            ph.markdown("".join(chunks))
+            if gap:
+                time.sleep(gap)
+        return ph, "".join(chunks)
+
+    def throttled():
+        ph = _CountingPlaceholder(args.render_ns_per_char * 1e-9)
+        r = StreamRenderer(ph)
+        for d in deltas:
+            r.feed(d)
+            if gap:
+                time.sleep(gap)
+        return ph, r.close()
+
+    print(f"tokens={args.tokens} ms/tok={args.ms_per_tok} render={args.render_ns_per_char}ns/char")
+    print(f"{'renderer':<14}{'wall ms':>10}{'updates':>10}{'chars sent':>14}")
+    for name, fn in (("naive", naive), ("StreamRenderer", throttled)):
+        t0 = time.perf_counter()
+        ph, text = fn()
+        print(f"{name:<14}{(time.perf_counter() - t0) * 1000:>10.1f}{ph.calls:>10}{ph.chars:>14}")
+        assert text == "".join(deltas)
+
+def main():
+    ap = argparse.ArgumentParser(description="스트리밍 렌더러 갱신 횟수/전송량 측정")
+    ap.add_argument("--tokens", type=int, default=2000)
+    ap.add_argument("--ms-per-tok", type=float, default=2.0, help="델타 간격 (모델 생성 속도)")
+    ap.add_argument("--render-ns-per-char", type=float, default=5.0, help="문자당 직렬화/전송 비용 가정")
+    bench(ap.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# turn_metrics.py
+# 턴별 지연 분해 / 처리량 계측 (ch03 대시보드 공용: Logs 컬럼 + Charts 그래프)
+# - 기존 로그는 전체 t_ms, chars_out 뿐 → 네트워크 대기와 생성 속도를 구분할 수 없음
+# - 한 턴을 단계별로 나눠 기록 (없는 단계는 None)
+#     t_retrieve_ms : 검색 (RAG)
+#     t_prompt_ms   : 프롬프트 조립 (섹션 패킹/컨텍스트 절단/토큰 계산, RAG)
+#     t_call_ms     : 요청 전송 → 응답 수신 (비스트리밍 전용 — 첫 토큰 시점을 알 수 없음)
+#     t_wait_ms     : 요청 전송 → 첫 델타 (네트워크 + 대기열 + 프롬프트 처리, 스트리밍 전용)
+#     t_gen_ms      : 첫 델타 → 마지막 델타 (생성)
+#     t_close_ms    : 마지막 델타 → 스트림 종료 (완료 이벤트/usage 수신)
+#   + tok_in / tok_out (usage), tok_s (생성 구간 초당 출력 토큰)
+# - 모델 라우터(auto) 결정 기록(route_*)도 Charts 탭에서 표/그래프로 표시
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+import plotly.graph_objects as go
+
+STAGES = [                      # (로그 컬럼, 표시 이름) — 그래프에서 이 순서로 쌓음
+    ("t_retrieve_ms", "검색"),
+    ("t_prompt_ms", "프롬프트 조립"),
+    ("t_call_ms", "응답 대기(비스트리밍)"),
+    ("t_wait_ms", "첫 토큰 대기"),
+    ("t_gen_ms", "생성"),
+    ("t_close_ms", "스트림 종료"),
+]
+PCT_COLUMNS = ["ttft_ms", "t_call_ms", "t_wait_ms", "t_gen_ms", "t_ms"]     # p50/p95 표 대상
+
+def _ms(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return None if a is None or b is None else round((b - a) * 1000, 1)
+
+def usage_tokens(usage: Any) -> Tuple[Optional[int], Optional[int]]:
+    """Responses usage(객체/딕셔너리) → (input_tokens, output_tokens)"""
+    if usage is None:
+        return None, None
+    if isinstance(usage, dict):
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    return getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None)
+
+def stream_fields(renderer) -> Dict[str, Any]:
+    """StreamRenderer 시각 기록 → 로그 필드 (요청 시작 = renderer.t_start)"""
+    tok_in, tok_out = usage_tokens(renderer.usage)
+    gen_ms = _ms(renderer.t_first, renderer.t_last)
+    n_out = tok_out if tok_out is not None else renderer.n_deltas   # usage가 없으면 델타 수로 근사
+    return {
+        "t_wait_ms": _ms(renderer.t_start, renderer.t_first),
+        "t_gen_ms": gen_ms,
+        "t_close_ms": _ms(renderer.t_last, renderer.t_close),
+        "tok_in": tok_in,
+        "tok_out": tok_out,
+        "tok_s": round((n_out - 1) / (gen_ms / 1000), 1) if gen_ms and n_out > 1 else None,
+    }
+
+def response_fields(resp: Any, t_request: float, t_done: float) -> Dict[str, Any]:
+    """
+    비스트리밍 응답 → 로그 필드
+    - 첫 토큰 대기/생성 구간을 나눌 수 없으므로 t_wait_ms 는 비우고 요청 전체 시간은 t_call_ms 로
+      (모델 라우터는 t_wait_ms 를 첫 토큰 대기로 보고 생성 시간을 더하므로 여기에 전체 시간을 넣으면 이중 계산)
+    - tok_s 는 요청 전체 시간 기준 (실제 생성 속도보다 낮음)
+    """
+    tok_in, tok_out = usage_tokens(getattr(resp, "usage", None))
+    call_ms = _ms(t_request, t_done)
+    return {
+        "t_call_ms": call_ms,
+        "t_wait_ms": None,
+        "t_gen_ms": None,
+        "t_close_ms": None,
+        "tok_in": tok_in,
+        "tok_out": tok_out,
+        "tok_s": round(tok_out / (call_ms / 1000), 1) if tok_out and call_ms else None,
+    }
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Charts 탭용
+# ──────────────────────────────────────────────────────────────────────────────
+def percentile_table(df: pd.DataFrame) -> pd.DataFrame:
+    """단계별 p50 / p95 / 평균 (ms) — 값이 있는 컬럼만"""
+    cols = [c for c in PCT_COLUMNS + [c for c, _ in STAGES[:2]] if c in df and df[c].notna().any()]
+    if not cols:
+        return pd.DataFrame()
+    v = df[cols].apply(pd.to_numeric, errors="coerce")
+    out = pd.DataFrame({"p50": v.quantile(0.5), "p95": v.quantile(0.95), "mean": v.mean(), "n": v.count()})
+    return out.round(1)
+
+def breakdown_figure(df: pd.DataFrame) -> Optional[go.Figure]:
+    """턴별 지연 분해 누적 막대"""
+    stages = [(c, name) for c, name in STAGES if c in df and df[c].notna().any()]
+    if not stages:
+        return None
+    x = list(range(1, len(df) + 1))
+    fig = go.Figure([go.Bar(name=name, x=x, y=pd.to_numeric(df[c], errors="coerce")) for c, name in stages])
+    fig.update_layout(title="턴별 지연 분해(ms)", barmode="stack", xaxis_title="Turn", yaxis_title="ms")
+    return fig
+
+def throughput_figure(df: pd.DataFrame) -> Optional[go.Figure]:
+    """턴별 초당 출력 토큰 (모델별 색)"""
+    if "tok_s" not in df or not df["tok_s"].notna().any():
+        return None
+    d = df.assign(turn=range(1, len(df) + 1)).dropna(subset=["tok_s"])
+    fig = go.Figure([go.Scatter(name=str(m), x=g["turn"], y=g["tok_s"], mode="lines+markers")
+                     for m, g in d.groupby("model")])
+    fig.update_layout(title="처리량(출력 tok/s)", xaxis_title="Turn", yaxis_title="tok/s")
+    return fig
+
+ROUTE_COLUMNS = ["route_class", "route_model", "model", "route_est_ms", "t_ms", "fallbacks", "route_reason"]
+
+def routing_table(df: pd.DataFrame) -> pd.DataFrame:
+    """라우터(auto)가 고른 턴만: 난이도 / 처음 고른 모델 / 실제 답한 모델 / 예상 vs 실제 지연 / 폴백"""
+    if "route_class" not in df or not df["route_class"].notna().any():
+        return pd.DataFrame()
+    d = df.assign(turn=range(1, len(df) + 1)).dropna(subset=["route_class"])
+    return d.set_index("turn")[[c for c in ROUTE_COLUMNS if c in d]]
+
+def routing_figure(df: pd.DataFrame) -> Optional[go.Figure]:
+    """난이도별로 어떤 모델이 답했는지 (누적 막대)"""
+    routed = routing_table(df)
+    if routed.empty:
+        return None
+    counts = routed.groupby(["route_class", "model"]).size().unstack(fill_value=0)
+    fig = go.Figure([go.Bar(name=str(m), x=counts.index, y=counts[m]) for m in counts.columns])
+    fig.update_layout(title="라우팅 결정: 난이도별 답변 모델", barmode="stack", xaxis_title="난이도", yaxis_title="turns")
+    return fig